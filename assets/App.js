@@ -29,20 +29,24 @@ const App = () => {
     const [checklist, setChecklist] = useState(defaultChecklist)
     const [isLoading, setIsLoading] = useState(false);
     const [uploadCount, setUploadCount] = useState(null);
+    const [earlierUploads, setEarlierUploads] = useState([]);
     const [status, setStatus] = useState('Waiting for file upload. Upload files in the dropzone above.');
     const [downloadReady, setDownloadReady] = useState(false);
+    const [runningRunId, setRunningRunId] = useState(null);
     const [month, setMonth] = useState(getNextMonth());
     const [year, setYear] = useState(getYear());
     const monthOptions = [ "January", "February", "March", "April", "May", "June",
         "July", "August", "September", "October", "November", "December" ];
     const yearOptions = [getYear() - 1, getYear(), getYear() + 1];
     const csrftoken = getCookie('csrftoken');
+    const progressPollInterval = 1000;
 
     const onDrop = useCallback(acceptedFiles => {
         setIsLoading(true);
         setDownloadReady(false);
         setChecklist(defaultChecklist);
         setUploadCount(null);
+        setEarlierUploads([]);
         setStatus(
             <span className="text-blue-700">
                 Processing files... (this may take up to 2 minutes)
@@ -54,15 +58,61 @@ const App = () => {
         });
         formData.append('month', month);
         formData.append('year', year);
-        fetch('/user_verification/run_reports', {
+        const runId = Math.random().toString(36).slice(2) + Date.now().toString(36);
+        formData.append('run_id', runId);
+        setRunningRunId(runId);
+        const runProgress = watchRunProgress(month, year, runId);
+        // month, year and run_id in the query string let the server process each file as soon as it is uploaded
+        fetch(`/user_verification/run_reports?month=${month}&year=${year}&run_id=${runId}`, {
             method: 'POST',
             body: formData,
             headers: { "X-CSRFToken": csrftoken }
         })
-        .then(response => response.json())
-        .then(response => {
+        .then(response => response.json().then(checklist => [response.status, checklist]))
+        .then(([responseStatus, response]) => {
+            if (responseStatus === 400 || responseStatus === 409) {
+                // rejected, a resubmitted run, or cancelled or stopped at the deadline
+                runProgress.close();
+                setRunningRunId(null);
+                setStatus(<span className="text-red-600">{response.error}</span>);
+                setIsLoading(false);
+                return;
+            }
+            // files stored by earlier uploads for the month that this run uses as well
+            setEarlierUploads(response.earlier_uploads || []);
+            delete response.earlier_uploads;
             setChecklist(response);
             setUploadCount(Object.values(response).filter(fileUploaded => fileUploaded).length);
+            if (responseStatus === 202) {
+                // queued for a worker, the progress events report when the reports are ready
+                setStatus(
+                    <span className="text-blue-700">
+                        Files uploaded, waiting for a worker to process them...
+                    </span>
+                );
+                runProgress.addEventListener('run_finished', () => {
+                    setRunningRunId(null);
+                    setDownloadReady(true);
+                    setStatus(
+                        <span className="text-green-600">
+                            All reports were processed successfully. Download the files below.
+                        </span>
+                    );
+                    setIsLoading(false);
+                });
+                runProgress.addEventListener('run_failed', event => {
+                    setRunningRunId(null);
+                    setStatus(
+                        <span className="text-red-600">
+                            Processing failed: {event.error}
+                        </span>
+                    );
+                    setIsLoading(false);
+                });
+                return;
+            }
+            runProgress.close();
+            setRunningRunId(null);
             let everyFileUploaded = Object.values(response).every(fileUploaded => fileUploaded);
             setDownloadReady(everyFileUploaded);
             if (everyFileUploaded) {
@@ -82,6 +132,8 @@ const App = () => {
         })
         .catch(error => {
             console.log(error);
+            runProgress.close();
+            setRunningRunId(null);
             setStatus(
                 <span className="text-red-600">
                     There was an error. Wait a moment and try again or if the problem persists report the error.
@@ -92,12 +144,92 @@ const App = () => {
       }, [month, year]);
     const {getRootProps, getInputProps} = useDropzone({onDrop});
 
+    const watchRunProgress = (month, year, runId) => {
+        // polls get_run_progress, or with UVR_PROGRESS_STREAM on (async workers) follows the run_progress stream
+        const listeners = {};
+        const progressWatcher = {
+            closed: false,
+            addEventListener: (eventName, listener) => {
+                listeners[eventName] = (listeners[eventName] || []).concat([listener]);
+            },
+            close: () => {
+                progressWatcher.closed = true;
+                if (progressSource)
+                    progressSource.close();
+            }
+        };
+        const dispatchEvent = event => {
+            if (progressWatcher.closed)
+                return;
+            (listeners[event.event] || []).forEach(listener => listener(event));
+            if (['run_finished', 'run_failed'].includes(event.event))
+                progressWatcher.close();
+        };
+        let progressSource = null;
+        if (document.getElementById('root').dataset.progressStream === '1') {
+            progressSource = new EventSource(`/user_verification/run_progress/${year}/${month}?run_id=${runId}`);
+            ['report_finished', 'stage_failed', 'run_finished', 'run_failed'].forEach(eventName => {
+                progressSource.addEventListener(eventName, e => dispatchEvent(JSON.parse(e.data)));
+            });
+        } else {
+            const pollProgress = offset => {
+                if (progressWatcher.closed)
+                    return;
+                fetch(`/user_verification/get_run_progress/${year}/${month}?run_id=${runId}&offset=${offset}&timeout=0`)
+                    .then(response => response.json())
+                    .then(response => {
+                        response.events.forEach(dispatchEvent);
+                        setTimeout(() => pollProgress(response.offset), progressPollInterval);
+                    })
+                    .catch(() => setTimeout(() => pollProgress(offset), progressPollInterval));
+            };
+            pollProgress(0);
+        }
+        let reportsFinished = 0;
+        progressWatcher.addEventListener('report_finished', event => {
+            reportsFinished += 1;
+            setStatus(
+                <span className="text-blue-700">
+                    Processing files... {event.report} finished ({event.rows} rows, {reportsFinished} reports done)
+                </span>
+            );
+        });
+        progressWatcher.addEventListener('stage_failed', event => {
+            setStatus(
+                <span className="text-red-600">
+                    Processing failed during the {event.stage} stage: {event.error}
+                </span>
+            );
+        });
+        return progressWatcher;
+    }
+
+    const cancelRun = () => {
+        fetch(`/user_verification/cancel_run/${runningRunId}`, {
+            method: 'POST',
+            headers: { "X-CSRFToken": csrftoken }
+        })
+        .then(() => setStatus(<span className="text-blue-700">Cancelling the run...</span>));
+    }
+
     const getDownloadStatus = (month, year) => {
         setDownloadReady(false);
         fetch(`/user_verification/get_download_status/${year}/${month}`, {method: 'GET'})
             .then(response => response.json())
             .then(response => {
-                if (response.download_available) {
+                if (response.run_status.status === 'queued') {
+                    setStatus(
+                        <span className="text-blue-700">
+                            {month} {year} reports are waiting for a worker to process them.
+                        </span>
+                    );
+                } else if (response.run_status.status === 'running') {
+                    setStatus(
+                        <span className="text-blue-700">
+                            {month} {year} reports are currently being processed ({response.run_status.stage} stage).
+                        </span>
+                    );
+                } else if (response.download_available) {
                     setDownloadReady(true);
                     setStatus(
                         <span className="text-green-600">
@@ -120,12 +252,15 @@ const App = () => {
 
             <h2 className="text-2xl font-semibold mb-3" style={{color: '#264a64'}}>Run User Verification Reports (UVR)</h2>
             <ul className="list-disc list-inside leading-relaxed mt-0">
-                <li>Upload all 20 required UVR files to run reports ({uploadCount === null ? '-' : uploadCount}/{Object.keys(checklist).length} uploaded)</li>
+                <li>Upload all {Object.keys(checklist).length} required UVR files to run reports ({uploadCount === null ? '-' : uploadCount}/{Object.keys(checklist).length} uploaded)</li>
                 <li>If you are unsure of which files to upload, refer to the checklist at the bottom of the page</li>
             </ul>
             {isLoading ?
                 <div className="border-dashed border-3 max-w-4xl h-60 rounded justify-center items-center border-gray-400 flex flex-col" style={{backgroundColor: '#ECF0F1'}}>
                     <img src={loadingGif} alt="loading" className="max-w-4xl h-60" />
+                    {runningRunId &&
+                        <button onClick={cancelRun} className="bg-gray-300 hover:bg-gray-400 font-bold py-1 px-4 rounded mt-2">Cancel run</button>
+                    }
                 </div>
                 :
                 <div className="border-dashed border-3 max-w-4xl h-60 rounded justify-center items-center border-gray-400 bg-gray-50 cursor-pointer flex flex-col" {...getRootProps()}>
@@ -149,6 +284,7 @@ const App = () => {
                         setMonth(selectedMonth);
                         setChecklist(defaultChecklist);
                         setUploadCount(null);
+                        setEarlierUploads([]);
                         getDownloadStatus(selectedMonth, year);
                     }}
                 >
@@ -170,6 +306,7 @@ const App = () => {
                         setYear(selectedYear);
                         setChecklist(defaultChecklist);
                         setUploadCount(null);
+                        setEarlierUploads([]);
                         getDownloadStatus(month, selectedYear);
                     }}
                 >
@@ -181,6 +318,11 @@ const App = () => {
                 <span className="font-bold" style={{color: '#264a64'}}>Status: </span>
                 {status}
             </p>
+            {earlierUploads.length > 0 &&
+                <p style={{color: '#757575'}}>
+                    Also used, uploaded earlier for {month} {year}: {earlierUploads.join(', ')}. Upload a newer version of any of them to replace it.
+                </p>
+            }
 
             {downloadReady ? 
                 <a href={`/user_verification/get_processed_files/${year}/${month}`} className="bg-blue-500 hover:bg-blue-700 text-white font-bold py-2 px-4 rounded no-underline">
@@ -50,6 +50,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'user_verification.middleware.MetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'hses_automation_app.urls'
@@ -76,12 +77,20 @@ WSGI_APPLICATION = 'hses_automation_app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.sqlite3',
-#         'NAME': BASE_DIR / 'db.sqlite3',
-#     }
-# }
+# Run state (progress events, caches, registries) lives outside MEDIA_ROOT so it is never served publicly. It is not
+# in git either, so the database (run history, job queue, account index) lives there too and a git pull leaves it alone
+UVR_STATE_DIR = os.path.join(BASE_DIR, 'var')
+os.makedirs(UVR_STATE_DIR, exist_ok=True)
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(UVR_STATE_DIR, 'db.sqlite3'),
+        'OPTIONS': {
+            'timeout': 20, # several uwsgi processes write run records concurrently
+        },
+    }
+}
 
 
 # Password validation
@@ -128,10 +137,48 @@ STATICFILES_DIRS = [
 
 STATIC_ROOT = 'staticfiles'
 
+# collectstatic fingerprints file names and writes gzip/brotli variants so static files can be cached forever
+STATICFILES_STORAGE = 'hses_automation_app.storage.CompressedManifestStaticFilesStorage'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-MEDIA_URL = '/media/'
\ No newline at end of file
+MEDIA_URL = '/media/'
+
+# Maximum total size of the cached output archives of previous runs, least recently used archives are evicted first
+UVR_RUN_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+# Disk budget for the archived output of previous runs, the most recent run of every month is always kept
+UVR_RUN_ARCHIVE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Set to True to have run_reports only store the uploads and queue the report runs for `python manage.py uvr_worker`
+# processes, see user_verification/job_queue.py. The workers run on this host: SQLite's file locks aren't reliable on
+# NFS, so the queue is single-host unless DATABASES points at a database server and media/ and var/ are shared
+UVR_JOB_QUEUE = False
+
+# A worker that has not sent a heartbeat for this long is considered dead and its job is handed to another worker
+UVR_JOB_LEASE_SECONDS = 60
+
+# Number of workers that may take up a job before it is given up (a run that keeps killing its worker)
+UVR_JOB_MAX_ATTEMPTS = 3
+
+# A report run is stopped after this many seconds, and the report script may use at most this much CPU time and
+# memory (heap and other private memory), so a huge or corrupt upload can't hold a worker and a core indefinitely
+UVR_RUN_TIMEOUT_SECONDS = 15 * 60
+UVR_RUN_CPU_SECONDS = 15 * 60
+UVR_RUN_MEMORY_BYTES = 4 * 1024 * 1024 * 1024
+
+# A month's uploaded files are kept so a single corrected file can be uploaded on its own, and removed once the month
+# had no uploads or runs for this many days
+UVR_WORKSPACE_RETENTION_DAYS = 45
+
+# Set to True to derive the Rgn01-Rgn12 reports from RgnAll HSES Accounts.xlsx. The regional files are then optional,
+# the ones that are uploaded anyway are cross-checked against RgnAll (see UVR_REGIONAL_FROM_RGNALL in the README)
+UVR_REGIONAL_FROM_RGNALL = False
+
+# Set to True to stream run progress to the browser as server-sent events (run_progress) instead of having it poll
+# get_run_progress. A stream holds its worker until the run ends, only turn this on with async workers (uwsgi --gevent)
+UVR_PROGRESS_STREAM = False
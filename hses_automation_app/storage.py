@@ -0,0 +1,45 @@
+import os
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ['.js', '.css', '.svg', '.txt', '.json', '.html', '.map']
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # fingerprints file names (e.g. index-bundle.js -> index-bundle.<hash>.js) and writes .gz and .br variants
+    # of every compressible file next to it during collectstatic, so nothing is compressed per request
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # collectstatic has not run (a fresh checkout, the tests), the file is served under its own name by
+            # serve_static
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name, hashed_name in self.hashed_files.items():
+            for filename in [name, hashed_name]:
+                if os.path.splitext(filename)[1] in COMPRESSIBLE_EXTENSIONS and self.exists(filename):
+                    self.write_compressed_variants(self.path(filename))
+
+    def write_compressed_variants(self, filepath):
+        with open(filepath, 'rb') as f:
+            content = f.read()
+        variants = [['.gz', gzip.compress(content, compresslevel=9, mtime=0)]]
+        if brotli is not None:
+            variants.append(['.br', brotli.compress(content)])
+        for suffix, compressed in variants:
+            # small files can come out bigger once compressed, those are served as they are
+            if len(compressed) < len(content):
+                with open(filepath + suffix, 'wb') as f:
+                    f.write(compressed)
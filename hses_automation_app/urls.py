@@ -17,12 +17,14 @@ from django.contrib import admin
 from django.urls import include, path
 from django.shortcuts import redirect
 from django.views.static import serve 
-from . import settings
+from user_verification.views import get_metrics
+from . import settings, views
 
 urlpatterns = [
     path('user_verification/', include('user_verification.urls')),
     path('admin/', admin.site.urls),
+    path('metrics', get_metrics),
     path('media/<path:path>', serve,{'document_root': settings.MEDIA_ROOT}), 
-    path('static/<path:path>', serve,{'document_root': settings.STATIC_ROOT}), 
+    path('static/<path:path>', views.serve_static), 
     path('', lambda req: redirect('user_verification/'))
 ]
\ No newline at end of file
@@ -0,0 +1,58 @@
+import os
+import re
+import mimetypes
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+# precompressed variants written by CompressedManifestStaticFilesStorage, in order of preference
+PRECOMPRESSED_VARIANTS = [['br', '.br'], ['gzip', '.gz']]
+# fingerprinted files (12 hex digit content hash from collectstatic or webpack) never change under the same name,
+# everything else has to be revalidated now and then
+HASHED_NAME_PATTERN = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+
+
+def serve_static(request, path):
+    # fallback for deployments without nginx in front, nginx serves /static directly otherwise
+    path = posixpath.normpath(path).lstrip('/')
+    fullpath = safe_join(settings.STATIC_ROOT, path)
+    if not os.path.isfile(fullpath):
+        # not collected yet, e.g. a development checkout before collectstatic
+        fullpath = finders.find(path)
+    if not fullpath or not os.path.isfile(fullpath):
+        raise Http404(f'"{path}" does not exist')
+    statobj = os.stat(fullpath)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), statobj.st_mtime, statobj.st_size):
+        response = HttpResponseNotModified()
+    else:
+        content_type = mimetypes.guess_type(fullpath)[0] or 'application/octet-stream'
+        accepted_encodings = get_accepted_encodings(request)
+        for encoding, suffix in PRECOMPRESSED_VARIANTS:
+            if encoding in accepted_encodings and os.path.isfile(fullpath + suffix):
+                response = FileResponse(open(fullpath + suffix, 'rb'), content_type=content_type)
+                response['Content-Encoding'] = encoding
+                break
+        else:
+            response = FileResponse(open(fullpath, 'rb'), content_type=content_type)
+        response['Last-Modified'] = http_date(statobj.st_mtime)
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if HASHED_NAME_PATTERN.search(path) else DEFAULT_CACHE_CONTROL
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def get_accepted_encodings(request):
+    accepted_encodings = []
+    for value in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        encoding, _, params = value.strip().partition(';')
+        if params.replace(' ', '') not in ['q=0', 'q=0.0', 'q=0.00', 'q=0.000']:
+            accepted_encodings.append(encoding.strip().lower())
+    return accepted_encodings
+
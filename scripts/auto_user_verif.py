@@ -1,18 +1,32 @@
 #!/usr/bin/env python
+import io
 import os
 import sys
+import csv
 import glob
+import json
+import time
 import shutil
+import hashlib
+import tempfile
+import importlib.util
 from re import sub
+from itertools import islice
 from datetime import date, datetime
 from copy import copy
+from contextlib import contextmanager
 import warnings
 
 
 def main():
+    args = [arg for arg in sys.argv[1:] if arg not in ['--profile', '--summary']]
+    if len(args) > 0 and args[0] == '--batch':
+        run_batch(args[1:])
+        return
+
     try:
         #provide the folder that contains all the unprocessed, input files needed for the script
-        folder = os.path.normpath(sys.argv[1])
+        folder = os.path.normpath(args[0])
         if os.path.isfile(folder):
             folder = os.path.dirname(folder)
             print(f'INFO: A path to a file was provided. Will attempt to use the following folder path instead: {folder}')
@@ -23,83 +37,454 @@ def main():
     if not os.path.isdir(folder):
         sys.exit(f'ERROR: There is no folder named "{folder}" to read from. Program will exit.')
 
-    import_required_modules()
+    check_required_modules()
+
+    monthyear = get_month_and_year(*args[1:3])
+    if SUMMARY:
+        print(json.dumps(summarize_reports(folder, monthyear)))
+        return
+    print('INFO: File processing may take up to 2 minutes...')
+    run_pipeline_with_profiling(folder, monthyear)
+    print('FINISHED')
+
 
+def run_pipeline(folder, monthyear):
     output_folder = os.path.join(folder, 'processed_files')
-    if os.path.isdir(output_folder):
-        shutil.rmtree(output_folder)
-        os.makedirs(output_folder)
+    if INCREMENTAL or SELECTED_STAGES:
+        os.makedirs(output_folder, exist_ok=True)
+        manifest = read_stage_manifest(output_folder)
     else:
-        os.makedirs(output_folder)
+        if os.path.isdir(output_folder):
+            shutil.rmtree(output_folder)
+            os.makedirs(output_folder)
+        else:
+            os.makedirs(output_folder)
+        manifest = {}
+    excel_cache.clear()
+    rgnall_stream_cache.clear()
+
+    stages = [
+        ('it_ams', process_it_ams_access_file),
+        ('ogm', process_ogm_file),
+        ('regional', process_regional_files),
+        ('pod', process_pod_file),
+        ('tta', process_tta_file),
+        ('monitoring', process_monitoring_file),
+    ]
+    stage_keys = {}
+    for stage, process in stages:
+        unit_keys = get_stage_unit_keys(folder, stage, monthyear, stage_keys)
+        stage_keys[stage] = get_key(unit_keys)
+        if SELECTED_STAGES and stage not in SELECTED_STAGES:
+            continue
+        # units of an earlier run that are gone, e.g. a removed regional file or the other regional mode
+        for unit in [unit for unit in manifest if unit.split('/', 1)[0] == stage and unit not in unit_keys]:
+            manifest.pop(unit)
+        unchanged_units = [unit for unit, key in unit_keys.items() if is_unit_unchanged(manifest.get(unit), key, output_folder)]
+        if len(unchanged_units) == len(unit_keys):
+            print(f'INFO: The inputs of the {stage} stage are unchanged since the last run, its reports are reused.')
+            report_progress('stage_skipped', stage=stage)
+            continue
+        # forget the units that are rerun first, so a failed run can't leave their new outputs behind under the old keys
+        for unit in unit_keys:
+            if unit not in unchanged_units:
+                manifest.pop(unit, None)
+        write_stage_manifest(output_folder, manifest)
+
+        import_required_modules()
+        report_progress('stage_started', stage=stage)
+        start = time.monotonic()
+        output_mtimes = get_output_mtimes(output_folder)
+        try:
+            if stage == 'regional':
+                process(folder, output_folder, monthyear, skip_regional_files=[unit.split('/', 1)[1] for unit in unchanged_units])
+            else:
+                process(folder, output_folder, monthyear)
+        except Exception as e:
+            report_progress('stage_failed', stage=stage, error=f'{type(e).__name__}: {e}')
+            raise
+        written_outputs = [filename for filename, mtime in get_output_mtimes(output_folder).items() if output_mtimes.get(filename) != mtime]
+        for unit, key in unit_keys.items():
+            if unit in unchanged_units:
+                continue
+            if unit.startswith('regional/'):
+                unit_outputs = [filename for filename in written_outputs if filename == get_regional_output_filename(unit.split('/', 1)[1], monthyear)]
+            else:
+                unit_outputs = written_outputs
+            # units without reports (missing inputs) are not recorded, so they are retried and their errors reported again
+            if unit_outputs:
+                manifest[unit] = {'key': key, 'outputs': {filename: hash_file(os.path.join(output_folder, filename)) for filename in unit_outputs}}
+        write_stage_manifest(output_folder, manifest)
+        report_progress('stage_finished', stage=stage, duration=round(time.monotonic() - start, 3))
+
+    if not SELECTED_STAGES:
+        remove_stale_outputs(output_folder, manifest)
+    return output_folder
+
+
+# incremental mode: processed_files is kept between runs and every stage whose input files and upstream stages are
+# unchanged according to the stage manifest (written by every run) is skipped, make-style. The regional stage is
+# tracked per Rgn<##> file, so fixing one regional file only reprocesses that file (a single unit when the regional
+# reports are derived from RgnAll)
+INCREMENTAL = os.environ.get('UVR_INCREMENTAL') == '1'
+STAGE_MANIFEST_FILENAME = '.stage_manifest.json'
+PIPELINE_VERSION_FILEPATHS = glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))
+# stage: [input file patterns, upstream stages]
+STAGE_DEPENDENCIES = {
+    'it_ams': [['RgnAll HSES Accounts*.xlsx', 'Rgn0 OGM Accounts*.xlsx', 'Rgn0 HSES POD Accounts*.xlsx', 'IT-AMS Access_{monthyear}.xlsx'], []],
+    'ogm': [['RgnAll HSES Accounts*.xlsx', 'Rgn0 OGM Accounts*.xlsx', 'UserRoleListingReport*.xlsx', 'HSES OGM Accounts_{monthyear}.xlsx'], ['it_ams']],
+    'regional': [['Rgn[0-9][0-9]*'], ['it_ams', 'ogm']],
+    'pod': [['Rgn0 HSES POD Accounts*.xlsx'], ['it_ams', 'ogm']],
+    'tta': [['Rgn0 HSES T&TA Accounts*.xlsx'], ['ogm']],
+    'monitoring': [['Danya User HSES Accounts*.xlsx', 'Lewin Accounts*.xlsx', 'Monitoring_Network_Users*.xlsx'], []],
+}
+# UVR_STAGES=it_ams,monitoring runs only those stages and leaves the other reports in processed_files as they are,
+# the web app uses it to start stages while the rest of the files are still uploading
+SELECTED_STAGES = [stage for stage in os.environ.get('UVR_STAGES', '').split(',') if stage]
+file_hash_cache = {}
+
+
+def hash_file(filepath):
+    stat = os.stat(filepath)
+    key = (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+    if key not in file_hash_cache:
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        file_hash_cache[key] = digest.hexdigest()
+    return file_hash_cache[key]
+
+
+def get_key(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def get_stage_unit_keys(input_folder, stage, monthyear, stage_keys):
+    # returns {unit: key}, the key changes whenever the unit's input files, upstream stages or the scripts change
+    [patterns, upstream_stages] = STAGE_DEPENDENCIES[stage]
+    input_filepaths = sorted(set(filepath for pattern in patterns for filepath in glob.glob(os.path.join(input_folder, pattern.format(monthyear=monthyear)))))
+    key_data = {
+        'pipeline_version': [hash_file(filepath) for filepath in sorted(PIPELINE_VERSION_FILEPATHS)],
+        'monthyear': monthyear,
+        'upstream': {upstream_stage: stage_keys[upstream_stage] for upstream_stage in upstream_stages},
+    }
+    if stage == 'regional' and REGIONAL_FROM_RGNALL:
+        # a single unit, every regional report is derived from RgnAll (and cross-checked with the regional files)
+        input_filepaths += glob.glob(os.path.join(input_folder, 'RgnAll HSES Accounts*.xlsx'))
+        key_data['regional_from_rgnall'] = True
+    elif stage == 'regional' and input_filepaths:
+        return {f'regional/{os.path.basename(filepath)}': get_key({**key_data, 'inputs': {os.path.basename(filepath): hash_file(filepath)}}) for filepath in input_filepaths}
+    return {stage: get_key({**key_data, 'inputs': {os.path.basename(filepath): hash_file(filepath) for filepath in input_filepaths}})}
+
+
+def is_unit_unchanged(manifest_entry, key, output_folder):
+    if not INCREMENTAL or manifest_entry is None or manifest_entry['key'] != key:
+        return False
+    for filename, output_hash in manifest_entry['outputs'].items():
+        output_filepath = os.path.join(output_folder, filename)
+        if not os.path.isfile(output_filepath) or hash_file(output_filepath) != output_hash:
+            return False
+    return True
+
+
+def read_stage_manifest(output_folder):
+    try:
+        with open(os.path.join(output_folder, STAGE_MANIFEST_FILENAME)) as manifest_file:
+            return json.load(manifest_file)
+    except (FileNotFoundError, ValueError):
+        return {}
 
-    monthyear = get_month_and_year()
-    print('INFO: File processing may take up to 2 minutes...')
 
-    process_it_ams_access_file(folder, output_folder, monthyear)
-    process_ogm_file(folder, output_folder, monthyear)
-    process_regional_files(folder, output_folder, monthyear)
-    process_pod_file(folder, output_folder, monthyear)
-    process_tta_file(folder, output_folder, monthyear)
-    process_monitoring_file(folder, output_folder, monthyear)
-    print('FINISHED')
+def write_stage_manifest(output_folder, manifest):
+    manifest_filepath = os.path.join(output_folder, STAGE_MANIFEST_FILENAME)
+    with open(manifest_filepath + '.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(manifest_filepath + '.tmp', manifest_filepath)
 
 
-def import_required_modules():
-    from subprocess import check_call
-    global pd, np, Font, PatternFill, Border, Side, Alignment, DataValidation, load_workbook, relativedelta
+def get_output_mtimes(output_folder):
+    return {filename: os.stat(os.path.join(output_folder, filename)).st_mtime_ns for filename in get_output_filenames(output_folder)}
+
+
+def get_output_filenames(output_folder):
+    return sorted(filename for filename in os.listdir(output_folder) if not filename.startswith('.'))
+
+
+def remove_stale_outputs(output_folder, manifest):
+    # reports of an earlier run that this run did not produce or reuse, e.g. of another month or a removed regional file
+    current_outputs = set(filename for entry in manifest.values() for filename in entry['outputs'])
+    for filename in get_output_filenames(output_folder):
+        if filename not in current_outputs:
+            os.remove(os.path.join(output_folder, filename))
+
+
+# --profile anywhere on the command line profiles each run into a profile folder next to processed_files,
+# see run_profiler.py
+PROFILE = '--profile' in sys.argv[1:]
+
+
+def run_pipeline_with_profiling(folder, monthyear):
+    if not PROFILE:
+        return run_pipeline(folder, monthyear)
+    from run_profiler import run_profiled
+    profile_folder = os.path.join(folder, 'profile')
+    if os.path.isdir(profile_folder):
+        shutil.rmtree(profile_folder)
+    return run_profiled(profile_folder, run_pipeline, folder, monthyear)
+
+
+# --summary only runs the data transformations of the reports, without writing and styling the workbooks, and
+# prints their row counts, accounts per region, IT-AMS Access distribution and missing ids as json. It takes a second
+# or two instead of minutes, so obvious input mistakes show up before the reports are generated
+SUMMARY = '--summary' in sys.argv[1:]
+IT_AMS_ROLE_COLUMN = 'IT-AMS Role\n(please specify using dropdown)'
+SUMMARY_INPUT_PATTERNS = {
+    'rgnall': 'RgnAll HSES Accounts*.xlsx',
+    'rgn0': 'Rgn0 OGM Accounts*.xlsx',
+    'rgn0_pod': 'Rgn0 HSES POD Accounts*.xlsx',
+    'rgn0_tta': 'Rgn0 HSES T&TA Accounts*.xlsx',
+    'role': 'UserRoleListingReport*.xlsx',
+    'danya': 'Danya User HSES Accounts*.xlsx',
+    'lewin': 'Lewin Accounts*.xlsx',
+    'network_users': 'Monitoring_Network_Users*.xlsx',
+}
+
+
+def summarize_reports(input_folder, monthyear):
+    start = time.monotonic()
+    import_required_modules()
+    inputs = {name: (glob.glob(os.path.join(input_folder, pattern)) or [None])[0] for name, pattern in SUMMARY_INPUT_PATTERNS.items()}
+    summary = {
+        'monthyear': monthyear,
+        'reports': {},
+        'missing_files': [SUMMARY_INPUT_PATTERNS[name].replace('*', '') for name, filepath in inputs.items() if filepath is None],
+    }
+    reports = summary['reports']
+    with warnings.catch_warnings(record=True):
+        warnings.simplefilter("always")
+        # like the pipeline, an IT-AMS Access or OGM report in the input folder is used as is
+        it_ams_df = ogm_df = None
+        provided_it_ams_filepath = os.path.join(input_folder, f'IT-AMS Access_{monthyear}.xlsx')
+        if os.path.isfile(provided_it_ams_filepath):
+            it_ams_df = pd.read_excel(provided_it_ams_filepath)
+        elif inputs['rgnall'] and inputs['rgn0'] and inputs['rgn0_pod']:
+            it_ams_df = transform_it_ams_accounts(inputs['rgnall'], inputs['rgn0'], inputs['rgn0_pod'])
+        if it_ams_df is not None:
+            reports[f'IT-AMS Access_{monthyear}.xlsx'] = summarize_accounts(it_ams_df, 'IT-AMS Access')
+
+        provided_ogm_filepath = os.path.join(input_folder, f'HSES OGM Accounts_{monthyear}.xlsx')
+        if os.path.isfile(provided_ogm_filepath):
+            ogm_df = pd.read_excel(provided_ogm_filepath)
+        elif inputs['rgnall'] and inputs['rgn0'] and inputs['role'] and it_ams_df is not None:
+            ogm_df = transform_ogm_accounts(inputs['rgnall'], inputs['rgn0'], inputs['role'], it_ams_df)
+        if ogm_df is not None:
+            reports[f'HSES OGM Accounts_{monthyear}.xlsx'] = summarize_accounts(ogm_df, IT_AMS_ROLE_COLUMN)
+            reports[f'HSES OGM Accounts_{monthyear}.xlsx']['missing_user_location'] = int((ogm_df['User Location'] == 0).sum())
+
+        if ogm_df is not None and it_ams_df is not None:
+            # converted once for all the reports joined with them
+            [ogm_df, it_ams_df] = [backend.from_pandas(ogm_df), backend.from_pandas(it_ams_df)]
+        if ogm_df is not None and it_ams_df is not None and REGIONAL_FROM_RGNALL and inputs['rgnall']:
+            for region, region_df in partition_accounts_by_region(read_excel_cached(inputs['rgnall'])).items():
+                region_df = backend.build_regional_accounts(region_df, ogm_df, it_ams_df)
+                reports[f'Rgn{region:02d} HSES Accounts_{monthyear}.xlsx'] = summarize_accounts(region_df, IT_AMS_ROLE_COLUMN)
+        elif ogm_df is not None and it_ams_df is not None:
+            for region_filepath in sorted(glob.glob(os.path.join(input_folder, 'Rgn[0-9][0-9]*'))):
+                region_df = transform_regional_accounts(region_filepath, ogm_df, it_ams_df)
+                reports[get_regional_output_filename(os.path.basename(region_filepath), monthyear)] = summarize_accounts(region_df, IT_AMS_ROLE_COLUMN)
+        if ogm_df is not None and it_ams_df is not None:
+            if inputs['rgn0_pod']:
+                pod_df = transform_regional_accounts(inputs['rgn0_pod'], ogm_df, it_ams_df)
+                reports[f'Rgn0 HSES POD Accounts_{monthyear}.xlsx'] = summarize_accounts(pod_df, IT_AMS_ROLE_COLUMN)
+        if ogm_df is not None and inputs['rgn0_tta']:
+            tta_df = backend.build_tta_accounts(pd.read_excel(inputs['rgn0_tta']), ogm_df)
+            reports[f'Rgn0 HSES T&TA Accounts_{monthyear}.xlsx'] = {'rows': len(tta_df), 'regions': count_values(tta_df['Region'])}
+
+        if inputs['danya'] and inputs['lewin'] and inputs['network_users']:
+            [support_accounts_df, reviewer_accounts_df, lewin_df] = transform_monitoring_accounts(inputs['danya'], inputs['lewin'], inputs['network_users'])
+            reports[f'HSES Monitoring Network Accounts_{monthyear}.xlsx'] = {
+                'rows': len(support_accounts_df) + len(reviewer_accounts_df) + len(lewin_df),
+                'sheets': {
+                    'Verify Planner-Support Accounts': len(support_accounts_df),
+                    'Verify Reviewer Accounts': len(reviewer_accounts_df),
+                    'Verify Lewin Accounts': len(lewin_df),
+                },
+                'missing_monitoring_id': int(reviewer_accounts_df['Monitoring System ID Linked for Reviews'].isna().sum()),
+            }
+    summary['duration'] = round(time.monotonic() - start, 3)
+    return summary
+
+
+def summarize_accounts(accounts_df, it_ams_access_column):
+    return {
+        'rows': len(accounts_df),
+        'regions': count_values(accounts_df['Region']),
+        'it_ams_access': count_values(accounts_df[it_ams_access_column]),
+        'missing_it_ams_access': int(accounts_df[it_ams_access_column].isna().sum()),
+    }
+
+
+def count_values(series):
+    # most common first, blank cells are counted as "(blank)"
+    return {str(value): int(count) for value, count in series.fillna('(blank)').astype(str).value_counts().items()}
+
+
+def run_batch(args):
+    # processes every folder/month/year entry of a manifest in one invocation, so the libraries are only imported once:
+    #   python auto_user_verif.py --batch <manifest.csv or manifest.json> [number of worker processes]
+    # a csv manifest has a folder,month,year header row, a json manifest is a list of {"folder", "month", "year"} objects
     try:
-        import pandas as pd
-    except ImportError:
-        print('INFO: The script requires the python library "pandas" to be installed. Attempting to install now:')
-        try:
-            check_call([sys.executable, '-m', 'pip', 'install', 'pandas'])
-            import pandas as pd
-            print('INFO: Successfully installed and imported "pandas"')
-        except:
-            try:
-                check_call([sys.executable, '-m', 'ensurepip', '--upgrade'])
-                check_call([sys.executable, '-m', 'pip', 'install', 'pandas'])
-                import pandas as pd
-                print('INFO: Successfully installed and imported "pandas"')
-            except:
-                sys.exit('ERROR: Failed to install "pandas". Program will exit. Please ensure you have pip installed and install the library yourself manually in the terminal: enter "pip3 install pandas" or "pip install pandas"')
-    
+        manifest_filepath = args[0]
+    except IndexError:
+        sys.exit('ERROR: No batch manifest provided. Usage: auto_user_verif.py --batch <manifest.csv|manifest.json> [workers]')
     try:
-        import numpy as np
-    except ImportError:
-        print('INFO: The script requires the python library "numpy" to be installed. Attempting to install now:')
-        try:
-            check_call([sys.executable, '-m', 'pip', 'install', 'numpy'])
-            import numpy as np
-            print('INFO: Successfully installed and imported "numpy"')
-        except:
-            sys.exit('ERROR: Failed to install "numpy". Program will exit. Please ensure you have pip installed and install the library yourself manually in the terminal: enter "pip3 install numpy" or "pip install numpy"')
-    
+        workers = int(args[1]) if len(args) > 1 else 1
+    except ValueError:
+        sys.exit(f'ERROR: Invalid number of workers "{args[1]}". Program will exit.')
     try:
-        from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
-        from openpyxl.worksheet.datavalidation import DataValidation
-        from openpyxl import load_workbook
-    except ImportError:
-        print('INFO: The script requires the python library "openpyxl" to be installed. Attempting to install now:')
-        try:
-            check_call([sys.executable, '-m', 'pip', 'install', 'openpyxl'])
-            from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
-            from openpyxl.worksheet.datavalidation import DataValidation
-            from openpyxl import load_workbook
-            print('INFO: Successfully installed and imported "openpyxl"')
-        except:
-            sys.exit('ERROR: Failed to install "openpyxl". Program will exit. Please ensure you have pip installed and install the library yourself manually in the terminal: enter "pip3 install openpyxl" or "pip install openpyxl"')
+        entries = read_batch_manifest(manifest_filepath)
+    except (OSError, ValueError, KeyError) as e:
+        sys.exit(f'ERROR: Could not read the batch manifest "{manifest_filepath}": {e}. Program will exit.')
+
+    check_required_modules()
+    import_required_modules()
+    print(f'INFO: Processing {len(entries)} batch entries with {workers} worker(s)...')
+    start = time.monotonic()
+    if workers > 1:
+        from multiprocessing import Pool
+        # forked workers inherit the imported libraries, the initializer covers platforms that spawn instead
+        with Pool(workers, initializer=import_required_modules) as pool:
+            results = pool.map(run_batch_entry, entries)
+    else:
+        results = [run_batch_entry(entry) for entry in entries]
+
+    summary = {
+        'manifest': manifest_filepath,
+        'duration': round(time.monotonic() - start, 3),
+        'succeeded': len([result for result in results if result['status'] == 'finished']),
+        'failed': len([result for result in results if result['status'] == 'failed']),
+        'runs': results,
+    }
+    summary_filepath = os.path.splitext(manifest_filepath)[0] + '_summary.json'
+    with open(summary_filepath, 'w') as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    for result in results:
+        print(f'{result["status"].upper()}: {result["folder"]} ({result["monthyear"]}) {len(result["reports"])} reports in {result["duration"]}s' + (f' - {result["error"]}' if result['error'] else ''))
+    print(f'Batch summary written to: {summary_filepath}')
+    print('FINISHED')
+
 
+def read_batch_manifest(manifest_filepath):
+    with open(manifest_filepath, newline='') as manifest_file:
+        if manifest_filepath.endswith('.json'):
+            rows = json.load(manifest_file)
+        else:
+            rows = list(csv.DictReader(manifest_file))
+    return [[os.path.normpath(row['folder']), row.get('month') or None, str(row.get('year') or '') or None] for row in rows]
+
+
+def run_batch_entry(entry):
+    folder, month, year = entry
+    monthyear = get_month_and_year(month, year)
+    result = {'folder': folder, 'monthyear': monthyear, 'status': 'finished', 'duration': 0, 'reports': [], 'error': None}
+    start = time.monotonic()
     try:
-        from dateutil.relativedelta import relativedelta
-    except ImportError:
-        print('INFO: The script requires the python library "dateutil" to be installed. Attempting to install now:')
+        if not os.path.isdir(folder):
+            raise FileNotFoundError(f'There is no folder named "{folder}" to read from')
+        output_folder = run_pipeline_with_profiling(folder, monthyear)
+        result['reports'] = get_output_filenames(output_folder)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f'{type(e).__name__}: {e}'
+    result['duration'] = round(time.monotonic() - start, 3)
+    return result
+
+
+def report_progress(event, **data):
+    # the web app sets UVR_PROGRESS_FILE so it can stream stage-level events to the browser while the script runs
+    progress_filepath = os.environ.get('UVR_PROGRESS_FILE')
+    if not progress_filepath:
+        return
+    with open(progress_filepath, 'a') as progress_file:
+        progress_file.write(json.dumps({'event': event, 'time': time.time(), **data}) + '\n')
+
+
+# the libraries the reports need ({module: package}). They are checked when the script starts, but only imported by
+# import_required_modules once a stage actually runs, so usage errors and runs whose stages are all unchanged don't
+# pay for importing pandas and openpyxl
+REQUIRED_MODULES = {'pandas': 'pandas', 'numpy': 'numpy', 'openpyxl': 'openpyxl', 'dateutil': 'python-dateutil'}
+
+
+# the report transformations run on pandas_backend.py, or on polars_backend.py with UVR_DATAFRAME_BACKEND=polars
+DATAFRAME_BACKEND = os.environ.get('UVR_DATAFRAME_BACKEND', 'pandas')
+
+
+# UVR_REGIONAL_FROM_RGNALL=1 derives the Rgn01-Rgn12 reports from RgnAll HSES Accounts.xlsx, which has the accounts of
+# every region, in one grouped pass instead of parsing the 12 uploaded regional workbooks. Accounts of several regions
+# ('0,3,4') are in each of their regional reports. Regional files that are uploaded anyway are only cross-checked
+# against RgnAll (their other sheets are copied over), the differences go to Regional File Discrepancies_<date>.xlsx
+REGIONAL_FROM_RGNALL = os.environ.get('UVR_REGIONAL_FROM_RGNALL') == '1'
+REGIONAL_SHEET_NAME = 'HSES Accounts'
+
+
+# streaming mode for the national RgnAll export: the sheet is parsed once, row by row in chunks of
+# UVR_STREAM_CHUNK_ROWS, for both the IT-AMS and OGM stages, which classify/filter each chunk. The parsed sheet is
+# never held whole next to their results, but the IT-AMS report has every account, so memory still grows with RgnAll
+STREAM_RGNALL = os.environ.get('UVR_STREAM_RGNALL') == '1'
+STREAM_CHUNK_ROWS = int(os.environ.get('UVR_STREAM_CHUNK_ROWS', 5000))
+rgnall_stream_cache = {}
+
+
+# processed reports are read back by several later stages (the OGM and IT-AMS reports by every regional file) and
+# RgnAll by the IT-AMS, OGM and derived regional stages, so parsed sheets are kept until the file changes
+excel_cache = {}
+
+
+def read_excel_cached(filepath, sheet_name=0):
+    stat = os.stat(filepath)
+    key = (os.path.abspath(filepath), sheet_name, stat.st_mtime_ns, stat.st_size)
+    if key not in excel_cache:
+        excel_cache[key] = pd.read_excel(filepath, sheet_name)
+    return excel_cache[key].copy()
+
+
+def read_report_cached(filepath):
+    # a processed report that other reports are joined with (the OGM and IT-AMS reports), in the backend's frame type.
+    # Every regional report shares the same frame, so it is only converted once
+    stat = os.stat(filepath)
+    key = (os.path.abspath(filepath), backend.name, stat.st_mtime_ns, stat.st_size)
+    if key not in excel_cache:
+        excel_cache[key] = backend.from_pandas(read_excel_cached(filepath))
+    return excel_cache[key]
+
+
+def check_required_modules():
+    # only looks the libraries up, importing them takes most of a short run
+    missing_packages = [package for module, package in REQUIRED_MODULES.items() if importlib.util.find_spec(module) is None]
+    if missing_packages:
+        sys.exit(f'ERROR: The script requires the python libraries {", ".join(missing_packages)}. Program will exit. Please install them in the terminal: enter "pip3 install {" ".join(missing_packages)}" or "pip install -r requirements.txt"')
+
+
+def import_required_modules():
+    global pd, openpyxl, Font, PatternFill, Border, Side, Alignment, NamedStyle, DataValidation, Workbook, load_workbook, backend
+    if 'backend' in globals():
+        return
+    import pandas as pd
+    import openpyxl
+    from openpyxl.styles import Font, PatternFill, Border, Side, Alignment, NamedStyle
+    from openpyxl.worksheet.datavalidation import DataValidation
+    from openpyxl import Workbook, load_workbook
+
+    import pandas_backend as backend
+    if DATAFRAME_BACKEND == 'polars':
+        # optional, so it is not one of the required modules
         try:
-            check_call([sys.executable, '-m', 'pip', 'install', 'python-dateutil'])
-            from dateutil.relativedelta import relativedelta
-            print('INFO: Successfully installed and imported "dateutil"')
-        except:
-            sys.exit('ERROR: Failed to install "dateutil". Program will exit. Please ensure you have pip installed and install the library yourself manually in the terminal: enter "pip3 install python-dateutil" or "pip install python-dateutil"')
+            import polars_backend as backend
+        except ImportError as e:
+            print(f'WARNING: The polars backend is not available ({e}), the reports will be processed with pandas instead. Enter "pip install polars pyarrow" to use it.')
+    elif DATAFRAME_BACKEND != 'pandas':
+        print(f'WARNING: Unknown UVR_DATAFRAME_BACKEND "{DATAFRAME_BACKEND}", the reports will be processed with pandas instead.')
 
 
 def process_ogm_file(input_folder, output_folder, monthyear):
@@ -122,56 +507,27 @@ def process_ogm_file(input_folder, output_folder, monthyear):
         role_filepath = role[0]
         # copy file over to the processed_files folder, this will be our ogm file after it has been processed
         shutil.copy(rgnall_filepath, final_ogm_filepath)
+        report_progress('report_started', report=os.path.basename(final_ogm_filepath))
 
         # this will get rid of the unnessecary warnings in the log
         with warnings.catch_warnings(record=True):
             warnings.simplefilter("always")
 
-            ogm_df = pd.read_excel(final_ogm_filepath)
-            ogm_df = ogm_df[
-                (ogm_df['Roles'].str.lower().str.contains('user verification contact-program') == False) &
-                (
-                    (ogm_df['Roles'].str.lower().str.contains('grants management officer')) |
-                    (ogm_df['Roles'].str.lower().str.contains('grants specialist')) |
-                    (ogm_df['Roles'].str.lower().str.contains('grants admin support'))
-                )
-            ]
-
-            central_office_df = pd.read_excel(rgn0_filepath)
-            central_office_df['Region'] = central_office_df['Region'].str.replace('Central Office', '0')
-            ogm_df = pd.concat([ogm_df, central_office_df], axis=0)
-
-            it_ams_df = pd.read_excel(processed_it_ams_filepath)
-            # drop and re-add IT-AMS Access column from IT-AMS Access file
-            ogm_df = ogm_df.iloc[:,:-1]
-            ogm_df = pd.merge(ogm_df, it_ams_df[['Email', 'IT-AMS Access']], how='left', on='Email')
-
-            user_role_df = pd.read_excel(role_filepath)
-            ogm_df = pd.merge(ogm_df, user_role_df[['Email', 'User Location']], how='left', on='Email')
-            if user_role_df['User Location'].dtype == 'int64' and ogm_df['User Location'].dtype == 'float64':
-                ogm_df['User Location'] = ogm_df['User Location'].astype('Int64')
-            rearrange_cols = list(ogm_df.columns)
-            rearrange_cols.pop()
-            rearrange_cols.insert(1, 'User Location')
-            ogm_df = ogm_df[rearrange_cols]
-            ogm_df = ogm_df.rename(columns={'IT-AMS Access': 'IT-AMS Role\n(please specify using dropdown)'})
-            ogm_df.loc[ogm_df['User Location'].isna(), 'User Location'] = 0
-            ogm_df = ogm_df.sort_values(by=['User Location', 'Last Name', 'First Name'])
-
-            ogm_df.to_excel(final_ogm_filepath, 'OGM HSES Accounts', index=False)
-            wb = load_workbook(final_ogm_filepath)
-            ws = wb.active
-            style_worksheet(ws)
-            separate_location_groups_with_thick_borders(ws)
-            add_it_ams_roles_sheet(wb)
-            wb.save(final_ogm_filepath)
+            ogm_df = transform_ogm_accounts(rgnall_filepath, rgn0_filepath, role_filepath, read_report_cached(processed_it_ams_filepath))
+            with report_writer(final_ogm_filepath, it_ams_roles_sheet=True) as writer:
+                ogm_df.to_excel(writer, 'OGM HSES Accounts', index=False)
+                ws = writer.sheets['OGM HSES Accounts']
+                style_worksheet(ws)
+                separate_location_groups_with_thick_borders(ws)
             print(f'File processed: {final_ogm_filepath}')
+            report_progress('report_finished', report=os.path.basename(final_ogm_filepath), rows=len(ogm_df))
     else:
         if ogm_file_already_exists:
             print('INFO: HSES OGM Accounts_<month>-<year>.xlsx already exists in the folder and is therefore assumed to be intentionally provided. No action will be taken to process this file, it will be used as is and copied over to the output folder.')
             shutil.copy(ogm_filepath, final_ogm_filepath)
         else:
             print('FAILED: There are one or more files missing needed to generate the HSES OGM Accounts report.')
+            report_progress('error', message='There are one or more files missing needed to generate the HSES OGM Accounts report.')
             print('Make sure you provided the correct files/file name formats and/or the correct folder/directory path.')
             if not rgnall_file_exists:
                 print('Missing file: RgnAll HSES Accounts.xlsx')
@@ -183,7 +539,25 @@ def process_ogm_file(input_folder, output_folder, monthyear):
                 print('Missing file: IT-AMS Access_<month>-<year>.xlsx')
 
 
-def process_regional_files(input_folder, output_folder, monthyear):
+def transform_ogm_accounts(rgnall_filepath, rgn0_filepath, role_filepath, it_ams_df):
+    if STREAM_RGNALL:
+        rgnall_df = stream_rgnall_accounts(rgnall_filepath, 'ogm')
+    else:
+        rgnall_df = read_excel_cached(rgnall_filepath)
+    central_office_df = read_central_office_accounts(rgn0_filepath)
+    user_role_df = pd.read_excel(role_filepath)
+    return backend.build_ogm_accounts(rgnall_df, central_office_df, it_ams_df, user_role_df)
+
+
+def read_central_office_accounts(filepath):
+    central_office_df = pd.read_excel(filepath)
+    central_office_df['Region'] = central_office_df['Region'].str.replace('Central Office', '0')
+    return central_office_df
+
+
+def process_regional_files(input_folder, output_folder, monthyear, skip_regional_files=()):
+    if REGIONAL_FROM_RGNALL:
+        return process_regional_files_from_rgnall(input_folder, output_folder, monthyear)
     processed_ogm_filepath = os.path.join(output_folder, f'HSES OGM Accounts_{monthyear}.xlsx')
     processed_it_ams_filepath = os.path.join(output_folder, f'IT-AMS Access_{monthyear}.xlsx')
     regional_files_list = glob.glob(os.path.join(input_folder, 'Rgn[0-9][0-9]*'))
@@ -192,40 +566,28 @@ def process_regional_files(input_folder, output_folder, monthyear):
         if len(regional_files_list) < 12:
             print('WARNING: Less than 12 Regional files were provided/detected. There should be 12 of these files (Rgn<##> HSES Accounts.xlsx). Please verify')
         for region in regional_files_list:
-            final_region_filepath = os.path.join(output_folder, os.path.basename(region))
-            final_region_filepath = sub(r'(\s*\(\d*\)\.xlsx)|(\.xlsx)', f'_{monthyear}.xlsx', final_region_filepath)
+            if os.path.basename(region) in skip_regional_files:
+                continue
+            final_region_filepath = os.path.join(output_folder, get_regional_output_filename(os.path.basename(region), monthyear))
             shutil.copy(region, final_region_filepath)
+            report_progress('report_started', report=os.path.basename(final_region_filepath))
             with warnings.catch_warnings(record=True):
                 warnings.simplefilter("always")
                 xl = pd.ExcelFile(final_region_filepath)
-                region_df = pd.read_excel(xl, 0)
-
-                ogm_df = pd.read_excel(processed_ogm_filepath)
-                region_df = region_df[~region_df['Email'].isin(ogm_df['Email'].tolist())]
-
-                it_ams_df = pd.read_excel(processed_it_ams_filepath)
-                # drop and re-add IT-AMS Access column from IT-AMS Access file
-                region_df = region_df.iloc[:,:-1]
-                region_df = pd.merge(region_df, it_ams_df[['Email', 'IT-AMS Access']], how='left', on='Email')
-                region_df = region_df.rename(columns={'IT-AMS Access': 'IT-AMS Role\n(please specify using dropdown)'})
-                region_df = region_df.sort_values(by=['Last Name', 'First Name'])
-
-                writer = pd.ExcelWriter(final_region_filepath)
-                region_df.to_excel(writer, xl.sheet_names[0], index=False)
-                if xl.sheet_names[1]:
-                    sheet2 = pd.read_excel(region, xl.sheet_names[1]) # get it from original file to avoid write errors
-                    sheet2.to_excel(writer, xl.sheet_names[1], index=False)
-                writer.save()
-                wb_region = load_workbook(final_region_filepath)
-                ws_region = wb_region.active
-                style_worksheet(ws_region)
-                sheet2 = wb_region[xl.sheet_names[1]]
-                style_worksheet(sheet2)
-                add_it_ams_roles_sheet(wb_region)
-                wb_region.save(final_region_filepath)
+                region_df = transform_regional_accounts(xl, read_report_cached(processed_ogm_filepath), read_report_cached(processed_it_ams_filepath))
+
+                with report_writer(final_region_filepath, it_ams_roles_sheet=True) as writer:
+                    region_df.to_excel(writer, xl.sheet_names[0], index=False)
+                    if xl.sheet_names[1]:
+                        sheet2 = pd.read_excel(region, xl.sheet_names[1]) # get it from original file to avoid write errors
+                        sheet2.to_excel(writer, xl.sheet_names[1], index=False)
+                    style_worksheet(writer.sheets[xl.sheet_names[0]])
+                    style_worksheet(writer.sheets[xl.sheet_names[1]])
                 print(f'File processed: {final_region_filepath}')
+                report_progress('report_finished', report=os.path.basename(final_region_filepath), rows=len(region_df))
     else:
         print('FAILED: There are one or more files missing needed to process Rgn<##> HSES Accounts_<date>.xlsx files.')
+        report_progress('error', message='There are one or more files missing needed to process Rgn<##> HSES Accounts_<date>.xlsx files.')
         if len(regional_files_list) == 0:
             print('Missing file(s): Rgn<##> HSES Accounts.xlsx')
         if not os.path.isfile(processed_ogm_filepath):
@@ -234,6 +596,108 @@ def process_regional_files(input_folder, output_folder, monthyear):
             print('Missing file: IT-AMS Access_<month>-<year>.xlsx')
 
 
+def process_regional_files_from_rgnall(input_folder, output_folder, monthyear):
+    processed_ogm_filepath = os.path.join(output_folder, f'HSES OGM Accounts_{monthyear}.xlsx')
+    processed_it_ams_filepath = os.path.join(output_folder, f'IT-AMS Access_{monthyear}.xlsx')
+    rgnall = glob.glob(os.path.join(input_folder, 'RgnAll HSES Accounts*.xlsx'))
+    if len(rgnall) > 0 and os.path.isfile(processed_ogm_filepath) and os.path.isfile(processed_it_ams_filepath):
+        regional_filepaths = get_regional_filepaths(input_folder)
+        discrepancies = []
+        with warnings.catch_warnings(record=True):
+            warnings.simplefilter("always")
+            ogm_df = read_report_cached(processed_ogm_filepath)
+            it_ams_df = read_report_cached(processed_it_ams_filepath)
+            for region, region_df in partition_accounts_by_region(read_excel_cached(rgnall[0])).items():
+                final_region_filepath = os.path.join(output_folder, f'Rgn{region:02d} HSES Accounts_{monthyear}.xlsx')
+                report_progress('report_started', report=os.path.basename(final_region_filepath))
+                sheets = [[REGIONAL_SHEET_NAME, backend.build_regional_accounts(region_df, ogm_df, it_ams_df)]]
+                if region in regional_filepaths:
+                    xl = pd.ExcelFile(regional_filepaths[region])
+                    discrepancies.append(get_regional_discrepancies(region, region_df, pd.read_excel(xl, 0)))
+                    sheets = [[xl.sheet_names[0], sheets[0][1]]] + [[sheet_name, pd.read_excel(xl, sheet_name)] for sheet_name in xl.sheet_names[1:]]
+
+                with report_writer(final_region_filepath, it_ams_roles_sheet=True) as writer:
+                    for sheet_name, sheet_df in sheets:
+                        sheet_df.to_excel(writer, sheet_name, index=False)
+                        style_worksheet(writer.sheets[sheet_name])
+                print(f'File processed: {final_region_filepath}')
+                report_progress('report_finished', report=os.path.basename(final_region_filepath), rows=len(sheets[0][1]))
+
+            if discrepancies:
+                write_regional_discrepancies(pd.concat(discrepancies), output_folder, monthyear)
+    else:
+        print('FAILED: There are one or more files missing needed to derive the Rgn<##> HSES Accounts_<date>.xlsx files from RgnAll.')
+        report_progress('error', message='There are one or more files missing needed to derive the Rgn<##> HSES Accounts_<date>.xlsx files from RgnAll.')
+        if len(rgnall) == 0:
+            print('Missing file: RgnAll HSES Accounts.xlsx')
+        if not os.path.isfile(processed_ogm_filepath):
+            print('Missing file: HSES OGM Accounts_<month>-<year>.xlsx')
+        if not os.path.isfile(processed_it_ams_filepath):
+            print('Missing file: IT-AMS Access_<month>-<year>.xlsx')
+
+
+def get_regional_filepaths(input_folder):
+    # {region number: uploaded Rgn<##> HSES Accounts file}
+    regional_filepaths = {}
+    for filepath in sorted(glob.glob(os.path.join(input_folder, 'Rgn[0-9][0-9]*'))):
+        regional_filepaths.setdefault(int(os.path.basename(filepath)[3:5]), filepath)
+    return regional_filepaths
+
+
+def partition_accounts_by_region(rgnall_df):
+    # {region number: accounts} for regions 1 to 12 in one grouped pass over RgnAll. Region is a single number or a
+    # list of regions ('0,3,4'), such accounts are exploded into one row per region
+    regions = rgnall_df['Region'].astype(str).str.split(',')
+    exploded_df = rgnall_df.assign(**{'Region Number': regions}).explode('Region Number')
+    exploded_df['Region Number'] = pd.to_numeric(exploded_df['Region Number'].str.strip(), errors='coerce')
+    region_dfs = {}
+    for region, region_df in exploded_df.groupby('Region Number', sort=False):
+        region_df = region_df.drop(columns='Region Number')
+        # like a regional file read on its own, Region is numeric when none of the region's accounts has several regions
+        try:
+            region_df['Region'] = pd.to_numeric(region_df['Region'])
+        except ValueError:
+            pass
+        region_dfs[region] = region_df
+    return {region: region_dfs.get(region, rgnall_df.iloc[0:0]) for region in range(1, 13)}
+
+
+def get_regional_discrepancies(region, derived_df, uploaded_df):
+    # accounts only in RgnAll or only in the uploaded regional file, and accounts whose details differ between them
+    discrepancy_columns = ['Region', 'First Name', 'Last Name', 'Email', 'Title', 'Roles']
+    only_in_rgnall_df = derived_df[~derived_df['Email'].isin(uploaded_df['Email'])].assign(Discrepancy='Only in RgnAll HSES Accounts.xlsx')
+    only_in_upload_df = uploaded_df[~uploaded_df['Email'].isin(derived_df['Email'])].assign(Discrepancy=f'Only in Rgn{region:02d} HSES Accounts.xlsx')
+    compared_columns = [column for column in discrepancy_columns if column != 'Email' and column in derived_df.columns and column in uploaded_df.columns]
+    both_df = pd.merge(derived_df, uploaded_df[['Email'] + compared_columns], how='inner', on='Email', suffixes=('', ' (uploaded)'))
+    differences = pd.Series('', index=both_df.index)
+    for column in compared_columns:
+        differs = both_df[column].fillna('').astype(str) != both_df[f'{column} (uploaded)'].fillna('').astype(str)
+        differences[differs] += f'{column}, '
+    different_df = both_df[differences != ''].assign(Discrepancy='Different ' + differences[differences != ''].str[:-2] + f' in Rgn{region:02d} HSES Accounts.xlsx')
+    discrepancies_df = pd.concat([only_in_rgnall_df, only_in_upload_df, different_df], axis=0)
+    discrepancies_df.insert(0, 'Regional Report', region)
+    return discrepancies_df.reindex(columns=['Regional Report'] + discrepancy_columns + ['Discrepancy'])
+
+
+def write_regional_discrepancies(discrepancies_df, output_folder, monthyear):
+    discrepancies_filepath = os.path.join(output_folder, f'Regional File Discrepancies_{monthyear}.xlsx')
+    with report_writer(discrepancies_filepath) as writer:
+        discrepancies_df.to_excel(writer, 'Discrepancies', index=False)
+        style_worksheet(writer.sheets['Discrepancies'])
+    if len(discrepancies_df) > 0:
+        print(f'WARNING: {len(discrepancies_df)} differences between RgnAll HSES Accounts.xlsx and the regional files, see {discrepancies_filepath}')
+    print(f'File processed: {discrepancies_filepath}')
+
+
+def transform_regional_accounts(region_filepath, ogm_df, it_ams_df):
+    # the regional files and the CO POD file: accounts not in the OGM report, with their IT-AMS role
+    return backend.build_regional_accounts(pd.read_excel(region_filepath, 0), ogm_df, it_ams_df)
+
+
+def get_regional_output_filename(region_filename, monthyear):
+    return sub(r'(\s*\(\d*\)\.xlsx)|(\.xlsx)', f'_{monthyear}.xlsx', region_filename)
+
+
 def process_it_ams_access_file(input_folder, output_folder, monthyear):
     final_it_ams_filepath = os.path.join(output_folder, f'IT-AMS Access_{monthyear}.xlsx')
 
@@ -251,71 +715,24 @@ def process_it_ams_access_file(input_folder, output_folder, monthyear):
         rgn0_filepath = rgn0[0]
         rgn0_pod_filepath = rgn0_pod[0]
         shutil.copy(rgnall_filepath, final_it_ams_filepath)
+        report_progress('report_started', report=os.path.basename(final_it_ams_filepath))
 
         with warnings.catch_warnings(record=True):
             warnings.simplefilter("always")
 
-            it_ams_df = pd.read_excel(final_it_ams_filepath)
-
-            central_office_df = pd.read_excel(rgn0_filepath)
-            central_office_df['Region'] = central_office_df['Region'].str.replace('Central Office', '0')
-            it_ams_df = pd.concat([it_ams_df, central_office_df], axis=0)
-
-            central_office_pod_df = pd.read_excel(rgn0_pod_filepath)
-            central_office_pod_df['Region'] = central_office_pod_df['Region'].str.replace('Central Office', '0')
-            it_ams_df = pd.concat([it_ams_df, central_office_pod_df], axis=0)
-
-            it_ams_df.insert(loc=len(it_ams_df.columns) - 1, column='RPM', value=np.nan)
-            it_ams_df.insert(loc=len(it_ams_df.columns) - 1, column='PS', value=np.nan)
-            it_ams_df.insert(loc=len(it_ams_df.columns) - 1, column='GS', value=np.nan)
-            it_ams_df.insert(loc=len(it_ams_df.columns) - 1, column='SPS', value=np.nan)
-
-            it_ams_df.loc[it_ams_df['Roles'].str.contains('IT-AMS RPM Application Access'), 'RPM'] = 'RPM'
-            it_ams_df.loc[it_ams_df['Roles'].str.contains('Supervisory Program Specialist'), 'SPS'] = 'SPS'
-            it_ams_df.loc[(it_ams_df['Roles'].str.contains('IT-AMS PS Application Access')) |
-                ((it_ams_df['Roles'].str.contains('Program Specialist')) & 
-                (~it_ams_df['Roles'].str.contains('Supervisory Program Specialist'))), 'PS'] = 'PS'
-            it_ams_df.loc[(it_ams_df['Roles'].str.contains('IT-AMS GS Application Access')) |
-                ((it_ams_df['Roles'].str.contains('Grants Specialist')) & 
-                (~it_ams_df['Roles'].str.contains('National Centers Grants Specialist'))), 'GS'] = 'GS'
-
-            # now fill in the IT-AMS Access column based on the above columns
-            it_ams_df.loc[(it_ams_df['RPM'].str.contains('RPM')) & 
-                (it_ams_df['PS'].isna()) & (it_ams_df['GS'].isna()) &
-                (it_ams_df['SPS'].isna()), 'IT-AMS Access'] = 'RPM'
-            it_ams_df.loc[(it_ams_df['SPS'].str.contains('SPS')) & 
-                (it_ams_df['PS'].isna()) & (it_ams_df['GS'].isna()) &
-                (it_ams_df['RPM'].isna()), 'IT-AMS Access'] = 'SPS'
-            it_ams_df.loc[(it_ams_df['PS'].str.contains('PS')) & 
-                (it_ams_df['SPS'].isna()) & (it_ams_df['GS'].isna()) &
-                (it_ams_df['RPM'].isna()), 'IT-AMS Access'] = 'PS'
-            it_ams_df.loc[(it_ams_df['GS'].str.contains('GS')) & 
-                (it_ams_df['SPS'].isna()) & (it_ams_df['PS'].isna()) &
-                (it_ams_df['RPM'].isna()), 'IT-AMS Access'] = 'GS'
-            it_ams_df.loc[(it_ams_df['PS'].str.contains('PS')) & 
-                (it_ams_df['SPS'].isna()) & (it_ams_df['GS'].str.contains('GS')) &
-                (it_ams_df['RPM'].isna()), 'IT-AMS Access'] = 'PS and GS'
-                
-            # need custom sorting as the Region column contains both integers (one region) and a string list of integers (multiple regions: '0,1,4,5')
-            sort_on_one_region = it_ams_df[~it_ams_df['Region'].str.contains(',')]
-            sort_on_one_region['Region'] = sort_on_one_region['Region'].astype('float').astype('Int64')
-            sort_on_one_region = sort_on_one_region.sort_values(by=['Region', 'Last Name', 'First Name'])
-            sort_on_one_region['Region'] = sort_on_one_region['Region'].astype('object')
-            sort_on_multiple_regions = it_ams_df[it_ams_df['Region'].str.contains(',')].sort_values(by=['Region', 'Last Name', 'First Name'])
-            it_ams_df = pd.concat([sort_on_one_region, sort_on_multiple_regions], axis=0)
-
-            it_ams_df.to_excel(final_it_ams_filepath, 'IT-AMS Roles', index=False)
-            wb = load_workbook(final_it_ams_filepath)
-            ws = wb.active
-            style_worksheet(ws)
-            wb.save(final_it_ams_filepath)
+            it_ams_df = transform_it_ams_accounts(rgnall_filepath, rgn0_filepath, rgn0_pod_filepath)
+            with report_writer(final_it_ams_filepath) as writer:
+                it_ams_df.to_excel(writer, 'IT-AMS Roles', index=False)
+                style_worksheet(writer.sheets['IT-AMS Roles'])
             print(f'File processed: {final_it_ams_filepath}')
+            report_progress('report_finished', report=os.path.basename(final_it_ams_filepath), rows=len(it_ams_df))
     else:
         if it_ams_file_already_exists:
             print('INFO: IT-AMS Access_<month>-<year>.xlsx already exists in the folder and is therefore assumed to be intentionally provided. No action will be taken to process this file, it will be used as is and copied over to the output folder.')
             shutil.copy(it_ams_filepath, final_it_ams_filepath)
         else:
             print('FAILED: There are one or more files missing needed to generate the IT-AMS Access report.')
+            report_progress('error', message='There are one or more files missing needed to generate the IT-AMS Access report.')
             print('Make sure you provided the correct files/file name formats and/or the correct folder/directory path.')
             if not rgnall_file_exists:
                 print('Missing file: RgnAll HSES Accounts.xlsx')
@@ -325,6 +742,49 @@ def process_it_ams_access_file(input_folder, output_folder, monthyear):
                 print('Missing file: Rgn0 HSES POD Accounts.xlsx (Central Office POD Accounts)') 
 
 
+def transform_it_ams_accounts(rgnall_filepath, rgn0_filepath, rgn0_pod_filepath):
+    central_office_df = read_central_office_accounts(rgn0_filepath)
+    central_office_pod_df = read_central_office_accounts(rgn0_pod_filepath)
+    if STREAM_RGNALL:
+        # the RgnAll rows are already classified chunk by chunk, only the central office rows are left
+        central_office_df = backend.classify_it_ams_roles(pd.concat([central_office_df, central_office_pod_df], axis=0))
+        it_ams_df = pd.concat([stream_rgnall_accounts(rgnall_filepath, 'it_ams'), central_office_df], axis=0)
+        return backend.sort_it_ams_accounts(it_ams_df)
+    it_ams_df = read_excel_cached(rgnall_filepath)
+    it_ams_df = pd.concat([it_ams_df, central_office_df], axis=0)
+    it_ams_df = pd.concat([it_ams_df, central_office_pod_df], axis=0)
+    return backend.build_it_ams_accounts(it_ams_df)
+
+
+def stream_rgnall_accounts(rgnall_filepath, part):
+    # reads RgnAll once for both the IT-AMS and OGM stages and returns their `part` of it, 'it_ams' (classified
+    # accounts) or 'ogm' (OGM accounts). A part is dropped from the cache once its stage took it
+    stat = os.stat(rgnall_filepath)
+    key = (os.path.abspath(rgnall_filepath), stat.st_mtime_ns, stat.st_size)
+    if part not in rgnall_stream_cache.get(key, {}):
+        rgnall_stream_cache.clear()
+        it_ams_parts, ogm_parts = [], []
+        wb = load_workbook(rgnall_filepath, read_only=True)
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows))
+        first_row = 0
+        for chunk in iter(lambda: list(islice(rows, STREAM_CHUNK_ROWS)), []):
+            # same number handling as pd.read_excel: whole floats become ints
+            chunk = [[int(value) if isinstance(value, float) and value.is_integer() else value for value in row] for row in chunk]
+            chunk_df = pd.DataFrame(chunk, columns=header, index=pd.RangeIndex(first_row, first_row + len(chunk)))
+            chunk_df = chunk_df.dropna(how='all')
+            first_row += len(chunk)
+            it_ams_parts.append(backend.classify_it_ams_roles(chunk_df.copy()))
+            ogm_parts.append(backend.filter_ogm_accounts(chunk_df))
+        wb.close()
+        if not it_ams_parts:
+            # header only export
+            empty_df = pd.DataFrame(columns=header)
+            it_ams_parts, ogm_parts = [backend.classify_it_ams_roles(empty_df.copy())], [backend.filter_ogm_accounts(empty_df)]
+        rgnall_stream_cache[key] = {'it_ams': pd.concat(it_ams_parts).infer_objects(), 'ogm': pd.concat(ogm_parts).infer_objects()}
+    return rgnall_stream_cache[key].pop(part)
+
+
 def process_monitoring_file(input_folder, output_folder, monthyear):
     final_monitoring_filepath = os.path.join(output_folder, f'HSES Monitoring Network Accounts_{monthyear}.xlsx')
 
@@ -339,56 +799,26 @@ def process_monitoring_file(input_folder, output_folder, monthyear):
         danya_filepath = danya[0]
         lewin_filepath = lewin[0]
         network_users_filepath = network_users[0]
+        report_progress('report_started', report=os.path.basename(final_monitoring_filepath))
         with warnings.catch_warnings(record=True):
             warnings.simplefilter("always")
-            support_accounts_df = pd.read_excel(danya_filepath, 'Verify Review Support Accounts')
-            planner_accounts_df = pd.read_excel(danya_filepath, 'Verify Review Planner Accounts')
-            support_accounts_df = pd.concat([support_accounts_df, planner_accounts_df], axis=0)
-
-            lewin_df = pd.read_excel(lewin_filepath)
-            copy_to_lewin = support_accounts_df[support_accounts_df['Roles'].str.contains('Lewin Group')]
-            # swap the Title and Roles columns as they are out of order when copied over
-            cols_list = list(copy_to_lewin.columns)
-            roles_col = cols_list.pop()
-            title_col = cols_list.pop()
-            cols_list += [roles_col, title_col]
-            copy_to_lewin = copy_to_lewin[cols_list]
-            lewin_df = pd.concat([lewin_df, copy_to_lewin], axis=0)
-            lewin_df = lewin_df.sort_values(by=['Last Name', 'First Name'])
-            support_accounts_df = support_accounts_df[~support_accounts_df['Roles'].str.contains('Lewin Group')]
-            support_accounts_df = support_accounts_df.sort_values(by=['Title', 'Last Name', 'First Name'])
-
-            reviewer_accounts_df = pd.read_excel(danya_filepath, 'Verify Reviewer Accounts')
-            network_users_df = pd.read_excel(network_users_filepath)
-            reviewer_accounts_df = pd.merge(reviewer_accounts_df, network_users_df[['Email', 'Gateway Id']], how='left', on='Email')
-            reviewer_accounts_df = reviewer_accounts_df.rename(columns={'Gateway Id': 'Monitoring System ID Linked for Reviews'})
-            reviewer_accounts_df = reviewer_accounts_df.sort_values(by=['Last Name', 'First Name'])
-            # move users with no id to the top
-            reviewer_accounts_df.loc[
-                reviewer_accounts_df['Monitoring System ID Linked for Reviews'] == '0', 
-                'Monitoring System ID Linked for Reviews'
-                ] = np.nan
-            reviewer_accounts_df = pd.concat([
-                reviewer_accounts_df[reviewer_accounts_df['Monitoring System ID Linked for Reviews'].isna()],
-                reviewer_accounts_df[~reviewer_accounts_df['Monitoring System ID Linked for Reviews'].isna()]
-                ])
-
-            writer = pd.ExcelWriter(final_monitoring_filepath)
-            support_accounts_df.to_excel(writer, 'Verify Planner-Support Accounts', index=False)
-            reviewer_accounts_df.to_excel(writer, 'Verify Reviewer Accounts', index=False)
-            lewin_df.to_excel(writer, 'Verify Lewin Accounts', index=False)
-            writer.save()
-            wb = load_workbook(final_monitoring_filepath)
-            ws = wb.active
-            style_worksheet(ws)
-            separate_title_groups_with_thick_borders(ws)
-            style_worksheet(wb['Verify Reviewer Accounts'])
-            highlight_reviewer_accounts_with_no_id_yellow(wb['Verify Reviewer Accounts'])
-            style_worksheet(wb['Verify Lewin Accounts'])
-            wb.save(final_monitoring_filepath)
+            [support_accounts_df, reviewer_accounts_df, lewin_df] = transform_monitoring_accounts(danya_filepath, lewin_filepath, network_users_filepath)
+
+            with report_writer(final_monitoring_filepath) as writer:
+                support_accounts_df.to_excel(writer, 'Verify Planner-Support Accounts', index=False)
+                reviewer_accounts_df.to_excel(writer, 'Verify Reviewer Accounts', index=False)
+                lewin_df.to_excel(writer, 'Verify Lewin Accounts', index=False)
+                ws = writer.sheets['Verify Planner-Support Accounts']
+                style_worksheet(ws)
+                separate_title_groups_with_thick_borders(ws)
+                style_worksheet(writer.sheets['Verify Reviewer Accounts'])
+                highlight_reviewer_accounts_with_no_id_yellow(writer.sheets['Verify Reviewer Accounts'])
+                style_worksheet(writer.sheets['Verify Lewin Accounts'])
             print(f'File processed: {final_monitoring_filepath}')
+            report_progress('report_finished', report=os.path.basename(final_monitoring_filepath), rows=len(support_accounts_df) + len(reviewer_accounts_df) + len(lewin_df))
     else:
         print('FAILED: There are one or more files missing needed to generate the Monitoring report.')
+        report_progress('error', message='There are one or more files missing needed to generate the Monitoring report.')
         if not danya_file_exists:
             print('Missing file: Danya User HSES Accounts.xlsx')
         if not lewin_file_exists:
@@ -397,6 +827,17 @@ def process_monitoring_file(input_folder, output_folder, monthyear):
             print('Missing file: Monitoring_Network_Users.xlsx')
 
 
+def transform_monitoring_accounts(danya_filepath, lewin_filepath, network_users_filepath):
+    # returns [planner/support accounts, reviewer accounts, lewin accounts]
+    return backend.build_monitoring_accounts(
+        pd.read_excel(danya_filepath, 'Verify Review Support Accounts'),
+        pd.read_excel(danya_filepath, 'Verify Review Planner Accounts'),
+        pd.read_excel(lewin_filepath),
+        pd.read_excel(danya_filepath, 'Verify Reviewer Accounts'),
+        pd.read_excel(network_users_filepath)
+    )
+
+
 def process_pod_file(input_folder, output_folder, monthyear):
     final_pod_filepath = os.path.join(output_folder, f'Rgn0 HSES POD Accounts_{monthyear}.xlsx')
     processed_ogm_filepath = os.path.join(output_folder, f'HSES OGM Accounts_{monthyear}.xlsx')
@@ -408,29 +849,19 @@ def process_pod_file(input_folder, output_folder, monthyear):
     if rgn0_pod_file_exists and os.path.isfile(processed_ogm_filepath) and os.path.isfile(processed_it_ams_filepath):
         pod_filepath = rgn0_pod[0]
         shutil.copy(pod_filepath, final_pod_filepath)
+        report_progress('report_started', report=os.path.basename(final_pod_filepath))
         with warnings.catch_warnings(record=True):
             warnings.simplefilter("always")
-            pod_df = pd.read_excel(final_pod_filepath)
-
-            ogm_df = pd.read_excel(processed_ogm_filepath)
-            pod_df = pod_df[~pod_df['Email'].isin(ogm_df['Email'].tolist())]
-
-            it_ams_df = pd.read_excel(processed_it_ams_filepath)
-            # drop and re-add IT-AMS Access column from IT-AMS Access file
-            pod_df = pod_df.iloc[:,:-1]
-            pod_df = pd.merge(pod_df, it_ams_df[['Email', 'IT-AMS Access']], how='left', on='Email')
-            pod_df = pod_df.rename(columns={'IT-AMS Access': 'IT-AMS Role\n(please specify using dropdown)'})
-            pod_df = pod_df.sort_values(by=['Last Name', 'First Name'])
-
-            pod_df.to_excel(final_pod_filepath, 'Rgn0 HSES POD Accounts', index=False)
-            wb = load_workbook(final_pod_filepath)
-            ws = wb.active
-            style_worksheet(ws)
-            add_it_ams_roles_sheet(wb)
-            wb.save(final_pod_filepath)
+            pod_df = transform_regional_accounts(final_pod_filepath, read_report_cached(processed_ogm_filepath), read_report_cached(processed_it_ams_filepath))
+
+            with report_writer(final_pod_filepath, it_ams_roles_sheet=True) as writer:
+                pod_df.to_excel(writer, 'Rgn0 HSES POD Accounts', index=False)
+                style_worksheet(writer.sheets['Rgn0 HSES POD Accounts'])
             print(f'File processed: {final_pod_filepath}')
+            report_progress('report_finished', report=os.path.basename(final_pod_filepath), rows=len(pod_df))
     else:
         print('FAILED: There are one or more files missing needed to generate the CO POD Accounts report.')
+        report_progress('error', message='There are one or more files missing needed to generate the CO POD Accounts report.')
         if not rgn0_pod_file_exists:
             print('Missing file: Rgn0 HSES POD Accounts.xlsx (Central Office POD Accounts)')
         if not os.path.isfile(processed_ogm_filepath):
@@ -449,22 +880,19 @@ def process_tta_file(input_folder, output_folder, monthyear):
     if rgn0_tta_file_exists and os.path.isfile(processed_ogm_filepath):
         tta_filepath = rgn0_tta[0]
         shutil.copy(tta_filepath, final_tta_filepath)
+        report_progress('report_started', report=os.path.basename(final_tta_filepath))
         with warnings.catch_warnings(record=True):
             warnings.simplefilter("always")
-            tta_df = pd.read_excel(final_tta_filepath)
-            tta_df = tta_df.loc[:, ~tta_df.columns.str.contains('^Unnamed')] # drop the empty column at the end that is there for some reason, remove this line if it is no longer there
+            tta_df = backend.build_tta_accounts(pd.read_excel(final_tta_filepath), read_report_cached(processed_ogm_filepath))
 
-            ogm_df = pd.read_excel(processed_ogm_filepath)
-            tta_df = tta_df[~tta_df['Email'].isin(ogm_df['Email'].tolist())]
-
-            tta_df.to_excel(final_tta_filepath, 'Rgn0 HSES T&TA Accounts', index=False)
-            wb = load_workbook(final_tta_filepath)
-            ws = wb.active
-            style_worksheet(ws)
-            wb.save(final_tta_filepath)
+            with report_writer(final_tta_filepath) as writer:
+                tta_df.to_excel(writer, 'Rgn0 HSES T&TA Accounts', index=False)
+                style_worksheet(writer.sheets['Rgn0 HSES T&TA Accounts'])
             print(f'File processed: {final_tta_filepath}')
+            report_progress('report_finished', report=os.path.basename(final_tta_filepath), rows=len(tta_df))
     else:
         print('FAILED: There are one or more files missing needed to generate the CO TTA Accounts report.')
+        report_progress('error', message='There are one or more files missing needed to generate the CO TTA Accounts report.')
         if not rgn0_tta_file_exists:
             print('Missing file: Rgn0 HSES T&TA Accounts.xlsx (Central Office T&TA Accounts)')
         if not os.path.isfile(processed_ogm_filepath):
@@ -474,37 +902,30 @@ def process_tta_file(input_folder, output_folder, monthyear):
 def style_worksheet(ws):
     ws.freeze_panes = "B2"
     ws.auto_filter.ref = ws.dimensions
-    for row in range(1, ws.max_row + 1):
-        for col in range(1, ws.max_column + 1):
-            #default style for all cells
-            cell = ws.cell(row = row, column = col)
-            cell.alignment = Alignment(wrap_text=True, vertical='top', horizontal='left')
-            cell.border = Border(left=Side(border_style='thin'), right=Side(border_style='thin'), 
-                                top=Side(border_style='thin'), bottom=Side(border_style='thin'))
-            cell.font = Font(name='Arial', size=10, bold=False)
-            if row == 1:
+    styles = {}
+    for row in ws.iter_rows(min_row=1, max_row=ws.max_row, max_col=ws.max_column):
+        for cell in row:
+            fill_color = None # the header style's light green
+            if cell.row == 1:
                 #style header row
-                cell.font= Font(name='Arial', size=10, bold=True)
-                cell.border = Border(left=Side(border_style=cell.border.left.style), right=Side(border_style=cell.border.right.style), 
-                                top=Side(border_style=cell.border.top.style), bottom=Side(border_style='thick'))
-                ws.row_dimensions[row].height = 45
+                ws.row_dimensions[cell.row].height = 45
                 ws.column_dimensions[cell.column_letter].width = 14.84 #column width is 14 in excel doc, need to add 0.84 to that to get the intended value with openpyxl
-                cell.fill = PatternFill('solid', fgColor='CCFFCC') #default light green
                 if cell.value in ['Action Required', 'IT-AMS Role']:
-                    cell.fill = PatternFill('solid', fgColor='FFFF00') #color yellow
+                    fill_color = 'FFFF00' #color yellow
                 elif cell.value == 'IT-AMS Role\n(please specify using dropdown)':
-                    dv = DataValidation(type="list", formula1='"PS, GS, PS and GS, SPS, RPM"', allow_blank=True)
-                    ws.add_data_validation(dv)
-                    dv.add(f'{cell.column_letter}2:{cell.column_letter}{ws.max_row}')
-                    cell.fill = PatternFill('solid', fgColor='FFFF00') #color yellow
+                    if ws.max_row > 1:
+                        dv = DataValidation(type="list", formula1=IT_AMS_ROLE_CHOICES, allow_blank=True)
+                        ws.add_data_validation(dv)
+                        dv.add(f'{cell.column_letter}2:{cell.column_letter}{ws.max_row}')
+                    fill_color = 'FFFF00' #color yellow
                 elif cell.value in ['RPM', 'PS', 'GS', 'SPS']:
-                    cell.fill = PatternFill('solid', fgColor='FFFF00') #color yellow
+                    fill_color = 'FFFF00' #color yellow
                     ws.column_dimensions[cell.column_letter].width = 8.84
                 elif cell.value == 'IT-AMS Access':
-                    cell.fill = PatternFill('solid', fgColor='99CCFF') #color blue
+                    fill_color = '99CCFF' #color blue
                     ws.column_dimensions[cell.column_letter].width = 8.84
                 elif cell.value == 'Monitoring System ID Linked for Reviews':
-                    cell.fill = PatternFill('solid', fgColor='99CCFF') #color blue
+                    fill_color = '99CCFF' #color blue
                     ws.column_dimensions[cell.column_letter].width = 31.17
                 elif cell.value == 'Roles':
                     ws.column_dimensions[cell.column_letter].width = 37.17
@@ -514,19 +935,99 @@ def style_worksheet(ws):
                     ws.column_dimensions[cell.column_letter].width = 21.51
                 elif cell.value == 'Title':
                     ws.column_dimensions[cell.column_letter].width = 21.51
-            #apply bold borders to whole table outline
-            if col == 1:
-                cell.border = Border(left=Side(border_style='thick'), right=Side(border_style=cell.border.right.style), 
-                                top=Side(border_style=cell.border.top.style), bottom=Side(border_style=cell.border.bottom.style))
-            if col == ws.max_column:
-                cell.border = Border(left=Side(border_style=cell.border.left.style), right=Side(border_style='thick'), 
-                                top=Side(border_style=cell.border.top.style), bottom=Side(border_style=cell.border.bottom.style))
-            if row == 1:
-                cell.border = Border(left=Side(border_style=cell.border.left.style), right=Side(border_style=cell.border.right.style), 
-                                top=Side(border_style='thick'), bottom=Side(border_style=cell.border.bottom.style))
-            if row == ws.max_row:
-                cell.border = Border(left=Side(border_style=cell.border.left.style), right=Side(border_style=cell.border.right.style), 
-                                top=Side(border_style=cell.border.top.style), bottom=Side(border_style='thick'))
+            #bold borders around the whole table
+            apply_report_style(cell, styles, cell.row == 1, fill_color, cell.column == 1, cell.column == ws.max_column, cell.row == ws.max_row)
+
+
+def apply_report_style(cell, styles, header, fill_color, left_edge, right_edge, bottom_edge):
+    # the first cell of every kind gets the template's named style and its fill and border, the others share its
+    # style instead of creating the same fonts, fills and borders again for every cell. Number formats (dates) are kept
+    number_format_id = cell._style.numFmtId if cell.has_style else 0
+    key = (header, fill_color, left_edge, right_edge, bottom_edge)
+    if key not in styles:
+        cell.style = 'Report Header' if header else 'Report Cell'
+        if fill_color:
+            cell.fill = PatternFill('solid', fgColor=fill_color)
+        if left_edge or right_edge or bottom_edge:
+            border = cell.border
+            cell.border = Border(left=Side(border_style='thick' if left_edge else border.left.style), right=Side(border_style='thick' if right_edge else border.right.style),
+                                top=Side(border_style=border.top.style), bottom=Side(border_style='thick' if bottom_edge else border.bottom.style))
+        styles[key] = copy(cell._style)
+    else:
+        cell._style = copy(styles[key])
+    cell._style.numFmtId = number_format_id
+
+
+# every report is written into a copy of this workbook: the IT_AMS_Roles reference sheet and the named styles of the
+# report cells and headers. It is built once per process, or with UVR_TEMPLATE_CACHE_DIR (set by the web app) once per
+# version of this script and openpyxl and kept in that folder, which only the app's user can read and write
+IT_AMS_ROLE_CHOICES = '"PS, GS, PS and GS, SPS, RPM"'
+TEMPLATE_CACHE_DIR = os.environ.get('UVR_TEMPLATE_CACHE_DIR')
+report_template = {}
+
+
+def get_report_template():
+    if 'data' not in report_template:
+        if TEMPLATE_CACHE_DIR:
+            report_template['data'] = get_cached_report_template(TEMPLATE_CACHE_DIR)
+        else:
+            report_template['data'] = build_report_template()
+    return report_template['data']
+
+
+def get_cached_report_template(cache_folder):
+    key = hashlib.sha256(f'{hash_file(os.path.abspath(__file__))}|{openpyxl.__version__}'.encode()).hexdigest()[:16]
+    template_filepath = os.path.join(cache_folder, f'report_template_{key}.xlsx')
+    if os.path.isfile(template_filepath):
+        with open(template_filepath, 'rb') as template_file:
+            return template_file.read()
+    data = build_report_template()
+    os.makedirs(cache_folder, mode=0o700, exist_ok=True)
+    # several runs may build it at the same time, each writes its own temp file (mkstemp creates it readable and
+    # writable by its owner only) and moves it into place
+    [temp_file, temp_filepath] = tempfile.mkstemp(dir=cache_folder, suffix='.tmp')
+    try:
+        with os.fdopen(temp_file, 'wb') as template_file:
+            template_file.write(data)
+        os.replace(temp_filepath, template_filepath)
+    except BaseException:
+        os.remove(temp_filepath)
+        raise
+    return data
+
+
+def build_report_template():
+    # returns the template workbook as xlsx bytes
+    wb = Workbook()
+    wb.remove(wb.active)
+    add_it_ams_roles_sheet(wb)
+    wb['IT_AMS_Roles'].sheet_view.tabSelected = False
+    alignment = Alignment(wrap_text=True, vertical='top', horizontal='left')
+    thin = Side(border_style='thin')
+    wb.add_named_style(NamedStyle('Report Cell', font=Font(name='Arial', size=10, bold=False), alignment=alignment,
+                                  border=Border(left=thin, right=thin, top=thin, bottom=thin)))
+    wb.add_named_style(NamedStyle('Report Header', font=Font(name='Arial', size=10, bold=True), alignment=alignment,
+                                  border=Border(left=thin, right=thin, top=Side(border_style='thick'), bottom=Side(border_style='thick')),
+                                  fill=PatternFill('solid', fgColor='CCFFCC'))) #default light green
+    template_file = io.BytesIO()
+    wb.save(template_file)
+    return template_file.getvalue()
+
+
+@contextmanager
+def report_writer(filepath, it_ams_roles_sheet=False):
+    # a pandas ExcelWriter on a copy of the report template. The sheets are styled through writer.sheets before the
+    # report is saved, once, when the block ends
+    with open(filepath, 'wb') as report_file:
+        report_file.write(get_report_template())
+    with pd.ExcelWriter(filepath, engine='openpyxl', mode='a') as writer:
+        yield writer
+        wb = writer.book
+        if it_ams_roles_sheet:
+            wb.move_sheet('IT_AMS_Roles', len(wb.sheetnames) - 1)
+        else:
+            wb.remove(wb['IT_AMS_Roles'])
+        wb.active = 0
 
 
 def add_it_ams_roles_sheet(wb):
@@ -666,7 +1167,7 @@ def highlight_reviewer_accounts_with_no_id_yellow(ws):
     col = ws.max_column
     for row in range(2, ws.max_row + 1):
         cell = ws.cell(row = row, column = col)
-        if cell.value is None:
+        if cell.value in (None, ''): # missing ids are written as empty strings
             cell.fill = PatternFill('solid', fgColor='FFFF00') #color yellow
 
 
@@ -694,25 +1195,22 @@ def separate_location_groups_with_thick_borders(ws):
                                 top=Side(border_style=cell.border.top.style), bottom=Side(border_style='thick'))
 
 
-def get_month_and_year():
-    month = None
-    year = None
+def get_month_and_year(month=None, year=None):
+    from dateutil.relativedelta import relativedelta
     try:
-        year = sys.argv[3]
         year = datetime.strptime(year, '%Y')
         year = year.strftime('%Y')
-    except IndexError:
+    except TypeError: # no year provided
         year = None
     except ValueError:
         year = None
         print(f'INFO: Invalid year provided, will default accordingly')
 
     try:
-        month = sys.argv[2]
         month = datetime.strptime(month, '%b')
         month = month.strftime('%b')
         year = date.today().strftime('%Y') if not year else year
-    except IndexError:
+    except TypeError: # no month provided
         month = date.today() + relativedelta(months=1)
         print(f'INFO: Defaulting to the coming month ({month.strftime("%b")})')
         year = month.strftime('%Y') if not year else year
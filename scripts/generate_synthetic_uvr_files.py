@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# Writes a synthetic, randomly generated set of the 20 UVR input workbooks for load tests and local runs:
+#   python scripts/generate_synthetic_uvr_files.py <folder> [number of accounts] [seed]
+import os
+import sys
+import random
+from zipfile import ZipFile, ZIP_DEFLATED
+
+import pandas as pd
+
+ROLES = [
+    'Program Specialist', 'Supervisory Program Specialist', 'Grants Specialist', 'National Centers Grants Specialist',
+    'Grants Management Officer', 'Grants Admin Support', 'IT-AMS RPM Application Access', 'IT-AMS PS Application Access',
+    'IT-AMS GS Application Access', 'User Verification Contact-Program', 'Regional Office Staff'
+]
+REGIONS = [str(region) for region in range(1, 13)] + ['1,2', '0,3,4', '5,9']
+ACCOUNT_COLUMNS = ['Region', 'First Name', 'Last Name', 'Email', 'Title', 'Roles', 'IT-AMS Access']
+
+
+def main():
+    try:
+        folder = sys.argv[1]
+    except IndexError:
+        sys.exit('ERROR: Provide the folder to write the synthetic UVR files to.')
+    number_of_accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    generate_input_files(folder, number_of_accounts, seed)
+    print(f'Synthetic UVR files written to: {folder}')
+
+
+def generate_accounts(rnd, first_id, number_of_accounts, region=None):
+    rows = []
+    for account_id in range(first_id, first_id + number_of_accounts):
+        rows.append({
+            'Region': region if region is not None else rnd.choice(REGIONS),
+            'First Name': f'First{account_id}',
+            'Last Name': f'Last{rnd.randint(0, number_of_accounts)}',
+            'Email': f'user{account_id}@example.gov',
+            'Title': rnd.choice(['Program Specialist', 'Grants Specialist', 'Regional Program Manager', 'Analyst']),
+            'Roles': ', '.join(rnd.sample(ROLES, rnd.randint(1, 3))),
+            'IT-AMS Access': None,
+        })
+    return pd.DataFrame(rows, columns=ACCOUNT_COLUMNS)
+
+
+def generate_input_files(folder, number_of_accounts=400, seed=1):
+    rnd = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    central_office_accounts = max(number_of_accounts // 10, 10)
+    next_id = number_of_accounts
+
+    rgnall_df = generate_accounts(rnd, 0, number_of_accounts)
+    rgnall_df.to_excel(os.path.join(folder, 'RgnAll HSES Accounts.xlsx'), index=False)
+    for region in range(1, 13):
+        region_df = rgnall_df[rgnall_df['Region'].str.split(',').apply(lambda regions: str(region) in regions)]
+        grantee_df = pd.DataFrame({'Grantee Name': [f'Grantee {region}'], 'Email': [f'grantee{region}@example.org']})
+        with pd.ExcelWriter(os.path.join(folder, f'Rgn{region:02d} HSES Accounts.xlsx')) as writer:
+            region_df.to_excel(writer, sheet_name='HSES Accounts', index=False)
+            grantee_df.to_excel(writer, sheet_name='Grantee Accounts', index=False)
+
+    for filename in ['Rgn0 OGM Accounts.xlsx', 'Rgn0 HSES POD Accounts.xlsx']:
+        generate_accounts(rnd, next_id, central_office_accounts, 'Central Office').to_excel(os.path.join(folder, filename), index=False)
+        next_id += central_office_accounts
+    tta_df = generate_accounts(rnd, next_id, central_office_accounts, '0')
+    tta_df['Unnamed: 7'] = None
+    tta_df.to_excel(os.path.join(folder, 'Rgn0 HSES T&TA Accounts.xlsx'), index=False)
+    next_id += central_office_accounts
+
+    pd.DataFrame({
+        'Email': [f'user{account_id}@example.gov' for account_id in range(next_id)],
+        'User Location': [rnd.randint(0, 12) for _ in range(next_id)]
+    }).to_excel(os.path.join(folder, 'UserRoleListingReport.xlsx'), index=False)
+
+    support_df = generate_accounts(rnd, next_id, central_office_accounts * 2, '1')
+    support_df['Roles'] = [rnd.choice(['Review Support', 'Lewin Group', 'Review Planner']) for _ in range(len(support_df))]
+    support_df = support_df[['Last Name', 'First Name', 'Email', 'Region', 'IT-AMS Access', 'Title', 'Roles']]
+    next_id += len(support_df)
+    reviewer_df = generate_accounts(rnd, next_id, central_office_accounts * 2, '1')[['Last Name', 'First Name', 'Email', 'Region']]
+    next_id += len(reviewer_df)
+    with pd.ExcelWriter(os.path.join(folder, 'Danya User HSES Accounts.xlsx')) as writer:
+        support_df.iloc[:len(support_df) // 2].to_excel(writer, sheet_name='Verify Review Support Accounts', index=False)
+        support_df.iloc[len(support_df) // 2:].to_excel(writer, sheet_name='Verify Review Planner Accounts', index=False)
+        reviewer_df.to_excel(writer, sheet_name='Verify Reviewer Accounts', index=False)
+    lewin_df = generate_accounts(rnd, next_id, central_office_accounts, '1')
+    lewin_df[['Last Name', 'First Name', 'Email', 'Region', 'IT-AMS Access', 'Roles', 'Title']].to_excel(os.path.join(folder, 'Lewin Accounts.xlsx'), index=False)
+    pd.DataFrame({
+        'Email': reviewer_df['Email'],
+        'Gateway Id': [rnd.choice(['0', f'GW{rnd.randint(1000, 9999)}']) for _ in range(len(reviewer_df))]
+    }).to_excel(os.path.join(folder, 'Monitoring_Network_Users.xlsx'), index=False)
+
+
+def generate_upload_zip(zip_filepath, number_of_accounts=400, seed=1):
+    input_folder = os.path.splitext(zip_filepath)[0]
+    generate_input_files(input_folder, number_of_accounts, seed)
+    with ZipFile(zip_filepath, 'w', ZIP_DEFLATED) as upload_zip:
+        for filename in sorted(os.listdir(input_folder)):
+            upload_zip.write(os.path.join(input_folder, filename), filename)
+    return zip_filepath
+
+
+if __name__ == '__main__':
+    main()
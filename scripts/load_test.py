@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# Concurrent load test of the user_verification endpoints with synthetic uploads, e.g.
+#   python scripts/load_test.py --concurrency 4 --iterations 3 --output load_test_results.json
+#   python scripts/load_test.py --server http://localhost:8000 --concurrency 8
+# Without --server the requests go through the Django test client in one process per worker, which uses the
+# local settings, database and media folder, so run it against a development checkout rather than production.
+import os
+import sys
+import json
+import time
+import uuid
+import resource
+import argparse
+import tempfile
+import statistics
+import urllib.request
+from http.cookiejar import CookieJar
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from generate_synthetic_uvr_files import generate_upload_zip
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the user_verification endpoints.')
+    parser.add_argument('--concurrency', type=int, default=4, help='number of concurrent workers')
+    parser.add_argument('--iterations', type=int, default=2, help='upload/status/download cycles per worker')
+    parser.add_argument('--accounts', type=int, default=400, help='accounts in each synthetic RgnAll export')
+    parser.add_argument('--status-polls', type=int, default=5, help='get_run_progress and get_download_status requests per cycle')
+    parser.add_argument('--form-upload', action='store_true', help='send month and year in the form like older clients, instead of the query string that has the files ingested while they stream in')
+    parser.add_argument('--unique-inputs', action='store_true', help='generate different inputs per cycle to bypass the run cache')
+    parser.add_argument('--same-month', action='store_true', help='have every worker submit the same month instead of one month per worker')
+    parser.add_argument('--server', help='base url of a running server, the Django test client is used otherwise')
+    parser.add_argument('--output', default='load_test_results.json', help='file to write the JSON results to')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as upload_folder:
+        print('INFO: Generating synthetic uploads...')
+        seeds = range(args.concurrency * args.iterations) if args.unique_inputs else [0]
+        uploads = {seed: generate_upload_zip(os.path.join(upload_folder, f'upload_{seed}.zip'), args.accounts, seed) for seed in seeds}
+        jobs = []
+        for worker in range(args.concurrency):
+            month = MONTHS[0 if args.same_month else worker % len(MONTHS)]
+            zip_filepaths = [uploads[worker * args.iterations + i if args.unique_inputs else 0] for i in range(args.iterations)]
+            jobs.append([args, month, zip_filepaths])
+
+        print(f'INFO: Running {args.concurrency} workers x {args.iterations} iterations...')
+        start = time.monotonic()
+        with Pool(args.concurrency) as pool:
+            worker_results = pool.starmap(run_worker, jobs)
+        wall_time = time.monotonic() - start
+
+    results = summarize(args, worker_results, wall_time)
+    with open(args.output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    for endpoint, stats in results['endpoints'].items():
+        print(f'{endpoint}: {stats["requests"]} requests, p50 {stats["p50"]}s, p95 {stats["p95"]}s, p99 {stats["p99"]}s, error rate {stats["error_rate"]}, {stats["rejected"]} rejected (409)')
+    print(f'Throughput: {results["throughput"]} requests/s. Results written to: {args.output}')
+
+
+def get_client(server):
+    if server:
+        return HttpClient(server)
+    sys.path.insert(0, BASE_DIR)
+    os.chdir(BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hses_automation_app.settings')
+    import django
+    django.setup()
+    from django.test.utils import setup_test_environment
+    from django.test import Client
+    setup_test_environment() # allows the testserver host
+    return Client()
+
+
+class HttpClient:
+    # minimal stand-in for the Django test client that talks to a running server, including the csrf handshake
+    def __init__(self, server):
+        self.server = server.rstrip('/')
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        self.get('/user_verification/')
+
+    def request(self, path, body=None, headers={}):
+        request = urllib.request.Request(self.server + path, data=body, headers=headers)
+        try:
+            with self.opener.open(request, timeout=600) as response:
+                return HttpResponse(response.status, response.read())
+        except urllib.error.HTTPError as e:
+            return HttpResponse(e.code, e.read())
+
+    def get(self, path):
+        return self.request(path)
+
+    def post(self, path, data):
+        boundary = uuid.uuid4().hex
+        body = b''
+        for name, value in data.items():
+            if hasattr(value, 'read'):
+                header = f'Content-Disposition: form-data; name="{name}"; filename="{os.path.basename(value.name)}"\r\nContent-Type: application/zip'
+                content = value.read()
+            else:
+                header = f'Content-Disposition: form-data; name="{name}"'
+                content = str(value).encode()
+            body += f'--{boundary}\r\n{header}\r\n\r\n'.encode() + content + b'\r\n'
+        body += f'--{boundary}--\r\n'.encode()
+        csrftoken = next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+        return self.request(path, body, {
+            'Content-Type': f'multipart/form-data; boundary={boundary}',
+            'X-CSRFToken': csrftoken,
+            'Referer': self.server + '/user_verification/'
+        })
+
+
+class HttpResponse:
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def run_worker(args, month, zip_filepaths):
+    client = get_client(args.server)
+    year = time.strftime('%Y')
+    samples = []
+
+    def timed(endpoint, send):
+        # the response, or None when the request failed
+        start = time.monotonic()
+        try:
+            response = send()
+        except Exception:
+            response = None
+        samples.append([endpoint, time.monotonic() - start, response.status_code if response is not None else None])
+        return response
+
+    for zip_filepath in zip_filepaths:
+        # a run id per upload like the page, which follows the run's progress with it
+        run_id = uuid.uuid4().hex
+        with open(zip_filepath, 'rb') as upload:
+            if args.form_upload:
+                timed('run_reports', lambda: client.post('/user_verification/run_reports', {'file0': upload, 'month': month, 'year': year, 'run_id': run_id}))
+            else:
+                timed('run_reports', lambda: client.post(f'/user_verification/run_reports?month={month}&year={year}&run_id={run_id}', {'file0': upload}))
+        offset = 0
+        for _ in range(args.status_polls):
+            response = timed('get_run_progress', lambda: client.get(f'/user_verification/get_run_progress/{year}/{month}?run_id={run_id}&offset={offset}&timeout=0'))
+            if response is not None and response.status_code == 200:
+                offset = response.json()['offset']
+            timed('get_download_status', lambda: client.get(f'/user_verification/get_download_status/{year}/{month}'))
+        timed('get_processed_files', lambda: client.get(f'/user_verification/get_processed_files/{year}/{month}'))
+
+    # ru_maxrss is in KB on linux, the report script runs as a child process so its peak is reported separately
+    return {
+        'pid': os.getpid(),
+        'month': month,
+        'samples': samples,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'peak_children_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def percentile(sorted_values, percent):
+    index = min(int(round(percent / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return round(sorted_values[index], 4)
+
+
+def is_error(status_code):
+    # 409 is an upload rejected while another one for the same month is processed (--same-month), not an error
+    return status_code is None or (status_code >= 400 and status_code != 409)
+
+
+def summarize(args, worker_results, wall_time):
+    samples = [sample for worker in worker_results for sample in worker['samples']]
+    endpoints = {}
+    for endpoint in ['run_reports', 'get_run_progress', 'get_download_status', 'get_processed_files']:
+        latencies = sorted(latency for name, latency, _ in samples if name == endpoint)
+        errors = len([status_code for name, _, status_code in samples if name == endpoint and is_error(status_code)])
+        if not latencies:
+            continue
+        endpoints[endpoint] = {
+            'requests': len(latencies),
+            'errors': errors,
+            'rejected': len([status_code for name, _, status_code in samples if name == endpoint and status_code == 409]),
+            'error_rate': round(errors / len(latencies), 4),
+            'mean': round(statistics.mean(latencies), 4),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': round(latencies[-1], 4),
+        }
+    return {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(time.time() - wall_time)),
+        'config': vars(args),
+        'wall_time': round(wall_time, 3),
+        'requests': len(samples),
+        'throughput': round(len(samples) / wall_time, 3) if wall_time else 0,
+        'error_rate': round(len([status_code for _, _, status_code in samples if is_error(status_code)]) / len(samples), 4) if samples else 0,
+        'endpoints': endpoints,
+        'workers': [{key: worker[key] for key in ['pid', 'month', 'peak_rss_kb', 'peak_children_rss_kb']} for worker in worker_results],
+    }
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# Default report backend: every transformation is an eager pandas call.
+# A backend takes and returns pandas DataFrames, reading and writing the workbooks stays in auto_user_verif.py.
+# polars_backend.py implements the same functions.
+import numpy as np
+import pandas as pd
+
+name = 'pandas'
+
+
+def from_pandas(df):
+    # the frame of a report that several others are joined with, see polars_backend.py. They don't modify it
+    return df
+
+
+def classify_it_ams_roles(it_ams_df):
+    it_ams_df.insert(loc=len(it_ams_df.columns) - 1, column='RPM', value=np.nan)
+    it_ams_df.insert(loc=len(it_ams_df.columns) - 1, column='PS', value=np.nan)
+    it_ams_df.insert(loc=len(it_ams_df.columns) - 1, column='GS', value=np.nan)
+    it_ams_df.insert(loc=len(it_ams_df.columns) - 1, column='SPS', value=np.nan)
+
+    it_ams_df.loc[it_ams_df['Roles'].str.contains('IT-AMS RPM Application Access'), 'RPM'] = 'RPM'
+    it_ams_df.loc[it_ams_df['Roles'].str.contains('Supervisory Program Specialist'), 'SPS'] = 'SPS'
+    it_ams_df.loc[(it_ams_df['Roles'].str.contains('IT-AMS PS Application Access')) |
+        ((it_ams_df['Roles'].str.contains('Program Specialist')) &
+        (~it_ams_df['Roles'].str.contains('Supervisory Program Specialist'))), 'PS'] = 'PS'
+    it_ams_df.loc[(it_ams_df['Roles'].str.contains('IT-AMS GS Application Access')) |
+        ((it_ams_df['Roles'].str.contains('Grants Specialist')) &
+        (~it_ams_df['Roles'].str.contains('National Centers Grants Specialist'))), 'GS'] = 'GS'
+
+    # now fill in the IT-AMS Access column based on the above columns
+    it_ams_df.loc[(it_ams_df['RPM'].str.contains('RPM')) &
+        (it_ams_df['PS'].isna()) & (it_ams_df['GS'].isna()) &
+        (it_ams_df['SPS'].isna()), 'IT-AMS Access'] = 'RPM'
+    it_ams_df.loc[(it_ams_df['SPS'].str.contains('SPS')) &
+        (it_ams_df['PS'].isna()) & (it_ams_df['GS'].isna()) &
+        (it_ams_df['RPM'].isna()), 'IT-AMS Access'] = 'SPS'
+    it_ams_df.loc[(it_ams_df['PS'].str.contains('PS')) &
+        (it_ams_df['SPS'].isna()) & (it_ams_df['GS'].isna()) &
+        (it_ams_df['RPM'].isna()), 'IT-AMS Access'] = 'PS'
+    it_ams_df.loc[(it_ams_df['GS'].str.contains('GS')) &
+        (it_ams_df['SPS'].isna()) & (it_ams_df['PS'].isna()) &
+        (it_ams_df['RPM'].isna()), 'IT-AMS Access'] = 'GS'
+    it_ams_df.loc[(it_ams_df['PS'].str.contains('PS')) &
+        (it_ams_df['SPS'].isna()) & (it_ams_df['GS'].str.contains('GS')) &
+        (it_ams_df['RPM'].isna()), 'IT-AMS Access'] = 'PS and GS'
+    return it_ams_df
+
+
+def sort_it_ams_accounts(it_ams_df):
+    # need custom sorting as the Region column contains both integers (one region) and a string list of integers (multiple regions: '0,1,4,5')
+    sort_on_one_region = it_ams_df[~it_ams_df['Region'].str.contains(',')]
+    sort_on_one_region['Region'] = sort_on_one_region['Region'].astype('float').astype('Int64')
+    sort_on_one_region = sort_on_one_region.sort_values(by=['Region', 'Last Name', 'First Name'])
+    sort_on_one_region['Region'] = sort_on_one_region['Region'].astype('object')
+    sort_on_multiple_regions = it_ams_df[it_ams_df['Region'].str.contains(',')].sort_values(by=['Region', 'Last Name', 'First Name'])
+    return pd.concat([sort_on_one_region, sort_on_multiple_regions], axis=0)
+
+
+def build_it_ams_accounts(it_ams_df):
+    return sort_it_ams_accounts(classify_it_ams_roles(it_ams_df))
+
+
+def filter_ogm_accounts(ogm_df):
+    return ogm_df[
+        (ogm_df['Roles'].str.lower().str.contains('user verification contact-program') == False) &
+        (
+            (ogm_df['Roles'].str.lower().str.contains('grants management officer')) |
+            (ogm_df['Roles'].str.lower().str.contains('grants specialist')) |
+            (ogm_df['Roles'].str.lower().str.contains('grants admin support'))
+        )
+    ]
+
+
+def build_ogm_accounts(rgnall_df, central_office_df, it_ams_df, user_role_df):
+    # filtering is idempotent, so RgnAll rows that were already filtered while streaming can be passed as well
+    ogm_df = pd.concat([filter_ogm_accounts(rgnall_df), central_office_df], axis=0)
+
+    # drop and re-add IT-AMS Access column from IT-AMS Access file
+    ogm_df = ogm_df.iloc[:,:-1]
+    ogm_df = pd.merge(ogm_df, it_ams_df[['Email', 'IT-AMS Access']], how='left', on='Email')
+
+    ogm_df = pd.merge(ogm_df, user_role_df[['Email', 'User Location']], how='left', on='Email')
+    if user_role_df['User Location'].dtype == 'int64' and ogm_df['User Location'].dtype == 'float64':
+        ogm_df['User Location'] = ogm_df['User Location'].astype('Int64')
+    rearrange_cols = list(ogm_df.columns)
+    rearrange_cols.pop()
+    rearrange_cols.insert(1, 'User Location')
+    ogm_df = ogm_df[rearrange_cols]
+    ogm_df = ogm_df.rename(columns={'IT-AMS Access': 'IT-AMS Role\n(please specify using dropdown)'})
+    ogm_df.loc[ogm_df['User Location'].isna(), 'User Location'] = 0
+    return ogm_df.sort_values(by=['User Location', 'Last Name', 'First Name'])
+
+
+def build_regional_accounts(region_df, ogm_df, it_ams_df):
+    # used for the regional and the central office POD reports
+    region_df = region_df[~region_df['Email'].isin(ogm_df['Email'].tolist())]
+
+    # drop and re-add IT-AMS Access column from IT-AMS Access file
+    region_df = region_df.iloc[:,:-1]
+    region_df = pd.merge(region_df, it_ams_df[['Email', 'IT-AMS Access']], how='left', on='Email')
+    region_df = region_df.rename(columns={'IT-AMS Access': 'IT-AMS Role\n(please specify using dropdown)'})
+    return region_df.sort_values(by=['Last Name', 'First Name'])
+
+
+def build_tta_accounts(tta_df, ogm_df):
+    tta_df = tta_df.loc[:, ~tta_df.columns.str.contains('^Unnamed')] # drop the empty column at the end that is there for some reason, remove this line if it is no longer there
+    return tta_df[~tta_df['Email'].isin(ogm_df['Email'].tolist())]
+
+
+def build_monitoring_accounts(support_accounts_df, planner_accounts_df, lewin_df, reviewer_accounts_df, network_users_df):
+    # returns [planner/support accounts, reviewer accounts, lewin accounts]
+    support_accounts_df = pd.concat([support_accounts_df, planner_accounts_df], axis=0)
+
+    copy_to_lewin = support_accounts_df[support_accounts_df['Roles'].str.contains('Lewin Group')]
+    # swap the Title and Roles columns as they are out of order when copied over
+    cols_list = list(copy_to_lewin.columns)
+    roles_col = cols_list.pop()
+    title_col = cols_list.pop()
+    cols_list += [roles_col, title_col]
+    copy_to_lewin = copy_to_lewin[cols_list]
+    lewin_df = pd.concat([lewin_df, copy_to_lewin], axis=0)
+    lewin_df = lewin_df.sort_values(by=['Last Name', 'First Name'])
+    support_accounts_df = support_accounts_df[~support_accounts_df['Roles'].str.contains('Lewin Group')]
+    support_accounts_df = support_accounts_df.sort_values(by=['Title', 'Last Name', 'First Name'])
+
+    reviewer_accounts_df = pd.merge(reviewer_accounts_df, network_users_df[['Email', 'Gateway Id']], how='left', on='Email')
+    reviewer_accounts_df = reviewer_accounts_df.rename(columns={'Gateway Id': 'Monitoring System ID Linked for Reviews'})
+    reviewer_accounts_df = reviewer_accounts_df.sort_values(by=['Last Name', 'First Name'])
+    # move users with no id to the top
+    reviewer_accounts_df.loc[
+        reviewer_accounts_df['Monitoring System ID Linked for Reviews'] == '0',
+        'Monitoring System ID Linked for Reviews'
+        ] = np.nan
+    reviewer_accounts_df = pd.concat([
+        reviewer_accounts_df[reviewer_accounts_df['Monitoring System ID Linked for Reviews'].isna()],
+        reviewer_accounts_df[~reviewer_accounts_df['Monitoring System ID Linked for Reviews'].isna()]
+        ])
+    return [support_accounts_df, reviewer_accounts_df, lewin_df]
@@ -0,0 +1,165 @@
+# Optional report backend on Polars LazyFrames (UVR_DATAFRAME_BACKEND=polars, needs "pip install polars pyarrow").
+# Each report is built as one lazy query, so its filter -> join -> sort chain is optimized and executed as a whole
+# on all cores. Takes and returns pandas DataFrames like pandas_backend.py, which it has to match row for row, and
+# takes the LazyFrames of from_pandas for the reports that several others are joined with.
+import pandas as pd
+import polars as pl
+
+name = 'polars'
+IT_AMS_ROLE_COLUMN = 'IT-AMS Role\n(please specify using dropdown)'
+
+
+def to_lazy(df):
+    if isinstance(df, pl.LazyFrame):
+        return df
+    # a polars column has a single type, while object columns read from excel can mix numbers and text
+    mixed_columns = [column for column in df.columns[df.dtypes == object] if pd.api.types.infer_dtype(df[column], skipna=True) not in ['string', 'empty']]
+    if mixed_columns:
+        df = df.assign(**{column: df[column].where(df[column].isna(), df[column].astype(str)) for column in mixed_columns})
+    return pl.from_pandas(df).lazy()
+
+
+def from_pandas(df):
+    # converted once, instead of by every report that is joined with it
+    return to_lazy(df)
+
+
+def get_columns(lazy_df):
+    return lazy_df.collect_schema().names()
+
+
+def contains(column, text):
+    return pl.col(column).str.contains(text, literal=True).fill_null(False)
+
+
+def join_on_email(lazy_df, other_df, how):
+    # pandas matches missing emails with each other, so nulls are joined as equal values here as well
+    lazy_df = lazy_df.with_columns(pl.col('Email').cast(pl.String))
+    other_df = other_df.with_columns(pl.col('Email').cast(pl.String))
+    if how == 'anti':
+        other_df = other_df.select('Email').unique()
+    return lazy_df.join(other_df, on='Email', how=how, nulls_equal=True, maintain_order='left')
+
+
+def sort(lazy_df, by):
+    # stable with missing values last, like DataFrame.sort_values
+    return lazy_df.sort(by, nulls_last=True, maintain_order=True)
+
+
+def classify_it_ams_roles_lazy(it_ams_df):
+    columns = get_columns(it_ams_df)
+    rpm = contains('Roles', 'IT-AMS RPM Application Access')
+    sps = contains('Roles', 'Supervisory Program Specialist')
+    ps = contains('Roles', 'IT-AMS PS Application Access') | (contains('Roles', 'Program Specialist') & ~sps)
+    gs = contains('Roles', 'IT-AMS GS Application Access') | (contains('Roles', 'Grants Specialist') & ~contains('Roles', 'National Centers Grants Specialist'))
+    it_ams_access = (
+        pl.when(rpm & ~ps & ~gs & ~sps).then(pl.lit('RPM'))
+        .when(sps & ~ps & ~gs & ~rpm).then(pl.lit('SPS'))
+        .when(ps & ~sps & ~gs & ~rpm).then(pl.lit('PS'))
+        .when(gs & ~sps & ~ps & ~rpm).then(pl.lit('GS'))
+        .when(ps & gs & ~sps & ~rpm).then(pl.lit('PS and GS'))
+        .otherwise(pl.col('IT-AMS Access').cast(pl.String))
+    )
+    # the role columns go in front of the last (IT-AMS Access) column
+    return it_ams_df.select(
+        *columns[:-1],
+        pl.when(rpm).then(pl.lit('RPM')).alias('RPM'),
+        pl.when(ps).then(pl.lit('PS')).alias('PS'),
+        pl.when(gs).then(pl.lit('GS')).alias('GS'),
+        pl.when(sps).then(pl.lit('SPS')).alias('SPS'),
+        *[it_ams_access.alias(column) if column == 'IT-AMS Access' else pl.col(column) for column in columns[-1:]]
+    )
+
+
+def sort_it_ams_accounts_lazy(it_ams_df):
+    # accounts with one region sorted numerically first, then the ones with a list of regions ('0,1,4,5') sorted as text
+    region = pl.col('Region').cast(pl.String)
+    multiple_regions = region.str.contains(',', literal=True)
+    return sort(it_ams_df, [
+        multiple_regions,
+        pl.when(~multiple_regions).then(region.cast(pl.Float64).cast(pl.Int64)),
+        pl.when(multiple_regions).then(region),
+        'Last Name',
+        'First Name',
+    ])
+
+
+def collect_it_ams_accounts(it_ams_df):
+    it_ams_df = it_ams_df.collect().to_pandas()
+    # single regions are written as numbers, like the pandas backend does
+    it_ams_df['Region'] = pd.Series(
+        [region if ',' in region else int(float(region)) for region in it_ams_df['Region'].astype(str)],
+        index=it_ams_df.index, dtype='object'
+    )
+    return it_ams_df
+
+
+def classify_it_ams_roles(it_ams_df):
+    return classify_it_ams_roles_lazy(to_lazy(it_ams_df)).collect().to_pandas()
+
+
+def sort_it_ams_accounts(it_ams_df):
+    return collect_it_ams_accounts(sort_it_ams_accounts_lazy(to_lazy(it_ams_df)))
+
+
+def build_it_ams_accounts(it_ams_df):
+    return collect_it_ams_accounts(sort_it_ams_accounts_lazy(classify_it_ams_roles_lazy(to_lazy(it_ams_df))))
+
+
+def ogm_accounts_filter():
+    roles = pl.col('Roles').str.to_lowercase()
+    return ~roles.str.contains('user verification contact-program', literal=True) & (
+        roles.str.contains('grants management officer', literal=True) |
+        roles.str.contains('grants specialist', literal=True) |
+        roles.str.contains('grants admin support', literal=True)
+    )
+
+
+def filter_ogm_accounts(ogm_df):
+    return to_lazy(ogm_df).filter(ogm_accounts_filter()).collect().to_pandas()
+
+
+def build_ogm_accounts(rgnall_df, central_office_df, it_ams_df, user_role_df):
+    ogm_df = pl.concat([to_lazy(rgnall_df).filter(ogm_accounts_filter()), to_lazy(central_office_df)], how='diagonal_relaxed')
+    # drop and re-add IT-AMS Access column from IT-AMS Access file
+    columns = get_columns(ogm_df)[:-1]
+    ogm_df = join_on_email(ogm_df.select(columns), to_lazy(it_ams_df).select('Email', 'IT-AMS Access'), 'left')
+    ogm_df = join_on_email(ogm_df, to_lazy(user_role_df).select('Email', 'User Location'), 'left')
+    ogm_df = ogm_df.select(columns[0], pl.col('User Location').fill_null(0), *columns[1:], pl.col('IT-AMS Access').alias(IT_AMS_ROLE_COLUMN))
+    return sort(ogm_df, ['User Location', 'Last Name', 'First Name']).collect().to_pandas()
+
+
+def build_regional_accounts(region_df, ogm_df, it_ams_df):
+    region_df = join_on_email(to_lazy(region_df), to_lazy(ogm_df).select('Email'), 'anti')
+    # drop and re-add IT-AMS Access column from IT-AMS Access file
+    region_df = region_df.select(get_columns(region_df)[:-1])
+    region_df = join_on_email(region_df, to_lazy(it_ams_df).select('Email', 'IT-AMS Access'), 'left')
+    region_df = region_df.rename({'IT-AMS Access': IT_AMS_ROLE_COLUMN})
+    return sort(region_df, ['Last Name', 'First Name']).collect().to_pandas()
+
+
+def build_tta_accounts(tta_df, ogm_df):
+    # drop the empty column at the end that is there for some reason
+    tta_df = to_lazy(tta_df).select(pl.exclude('^Unnamed.*$'))
+    return join_on_email(tta_df, to_lazy(ogm_df).select('Email'), 'anti').collect().to_pandas()
+
+
+def build_monitoring_accounts(support_accounts_df, planner_accounts_df, lewin_df, reviewer_accounts_df, network_users_df):
+    # returns [planner/support accounts, reviewer accounts, lewin accounts]
+    support_accounts_df = pl.concat([to_lazy(support_accounts_df), to_lazy(planner_accounts_df)], how='diagonal_relaxed')
+    # swap the Title and Roles columns as they are out of order when copied over
+    columns = get_columns(support_accounts_df)
+    copy_to_lewin = support_accounts_df.filter(contains('Roles', 'Lewin Group')).select(columns[:-2] + [columns[-1], columns[-2]])
+    lewin_df = sort(pl.concat([to_lazy(lewin_df), copy_to_lewin], how='diagonal_relaxed'), ['Last Name', 'First Name'])
+    support_accounts_df = sort(support_accounts_df.filter(~pl.col('Roles').str.contains('Lewin Group', literal=True)), ['Title', 'Last Name', 'First Name'])
+
+    reviewer_accounts_df = join_on_email(to_lazy(reviewer_accounts_df), to_lazy(network_users_df).select('Email', 'Gateway Id'), 'left')
+    reviewer_accounts_df = reviewer_accounts_df.rename({'Gateway Id': 'Monitoring System ID Linked for Reviews'})
+    monitoring_id = pl.col('Monitoring System ID Linked for Reviews')
+    if reviewer_accounts_df.collect_schema()['Monitoring System ID Linked for Reviews'] == pl.String:
+        reviewer_accounts_df = reviewer_accounts_df.with_columns(pl.when(monitoring_id != '0').then(monitoring_id))
+    # users with no id at the top
+    reviewer_accounts_df = sort(reviewer_accounts_df, [monitoring_id.is_not_null(), 'Last Name', 'First Name'])
+
+    # the three independent queries run in parallel
+    return [df.to_pandas() for df in pl.collect_all([support_accounts_df, reviewer_accounts_df, lewin_df])]
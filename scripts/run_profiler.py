@@ -0,0 +1,117 @@
+# Profiling for auto_user_verif.py --profile: runs a function under cProfile, a stack sampler and tracemalloc and
+# writes into profile_folder
+#   profile.pstats             deterministic profile, e.g. python -m pstats profile.pstats or snakeviz
+#   profile_top.txt            the 40 slowest functions by cumulative and by own time
+#   profile.speedscope.json    sampled call stacks, open it on https://www.speedscope.app for a flame graph
+#   allocations.txt            peak traced memory and the 30 biggest allocation sites around the peak (with call stacks
+#                              when UVR_PROFILE_TRACEMALLOC_FRAMES is above 1)
+import os
+import io
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+
+SAMPLE_INTERVAL = 0.005
+# deeper tracemalloc tracebacks show who called the allocating line, but each frame slows the run down a lot
+TRACEMALLOC_FRAMES = int(os.environ.get('UVR_PROFILE_TRACEMALLOC_FRAMES', 1))
+# the sampler checks the traced memory every MEMORY_CHECK_SAMPLES samples and snapshots it when it grew by 10%
+MEMORY_CHECK_SAMPLES = 100
+
+
+def run_profiled(profile_folder, function, *args):
+    os.makedirs(profile_folder, exist_ok=True)
+    samples = []
+    peak = {'bytes': 0, 'snapshot': None}
+    stop_sampling = threading.Event()
+    sampler = threading.Thread(target=sample_stacks, args=[threading.get_ident(), samples, peak, stop_sampling], daemon=True)
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    profiler = cProfile.Profile()
+    sampler.start()
+    profiler.enable()
+    try:
+        return function(*args)
+    finally:
+        profiler.disable()
+        stop_sampling.set()
+        sampler.join()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        snapshot = peak['snapshot'] or tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        write_pstats(profiler, profile_folder)
+        write_speedscope(samples, profile_folder)
+        write_allocations(snapshot, peak_bytes, profile_folder)
+        print(f'INFO: Profile written to: {profile_folder}')
+
+
+def sample_stacks(thread_id, samples, peak, stop_sampling):
+    last_sample = time.perf_counter()
+    while not stop_sampling.wait(SAMPLE_INTERVAL):
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            stack.append((frame.f_code.co_name, frame.f_code.co_filename, frame.f_code.co_firstlineno))
+            frame = frame.f_back
+        now = time.perf_counter()
+        # the time since the previous sample, the sampler can be held up by the GIL
+        samples.append([stack[::-1], now - last_sample])
+        last_sample = now
+        if len(samples) % MEMORY_CHECK_SAMPLES == 0 and tracemalloc.get_traced_memory()[0] > peak['bytes'] * 1.1:
+            peak['bytes'] = tracemalloc.get_traced_memory()[0]
+            peak['snapshot'] = tracemalloc.take_snapshot()
+
+
+def write_pstats(profiler, profile_folder):
+    profiler.dump_stats(os.path.join(profile_folder, 'profile.pstats'))
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats('cumulative').print_stats(40)
+    stats.sort_stats('tottime').print_stats(40)
+    with open(os.path.join(profile_folder, 'profile_top.txt'), 'w') as top_file:
+        top_file.write(output.getvalue())
+
+
+def write_speedscope(samples, profile_folder):
+    frames, frame_indexes, stacks = [], {}, []
+    for stack, _ in samples:
+        stack_indexes = []
+        for frame in stack:
+            if frame not in frame_indexes:
+                frame_indexes[frame] = len(frames)
+                frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+            stack_indexes.append(frame_indexes[frame])
+        stacks.append(stack_indexes)
+    weights = [weight for _, weight in samples]
+    with open(os.path.join(profile_folder, 'profile.speedscope.json'), 'w') as speedscope_file:
+        json.dump({
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': 'auto_user_verif.py',
+            'exporter': 'run_profiler.py',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': 'main thread',
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': stacks,
+                'weights': weights,
+            }],
+        }, speedscope_file)
+
+
+def write_allocations(snapshot, peak_bytes, profile_folder):
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)])
+    with open(os.path.join(profile_folder, 'allocations.txt'), 'w') as allocations_file:
+        allocations_file.write(f'Peak traced memory: {peak_bytes / 1024 / 1024:.1f} MB\n\nTop allocation sites around the peak:\n')
+        for statistic in snapshot.statistics('lineno')[:30]:
+            allocations_file.write(f'{statistic}\n')
+        if TRACEMALLOC_FRAMES == 1:
+            return
+        allocations_file.write('\nTop allocation sites with call stacks:\n')
+        for statistic in snapshot.statistics('traceback')[:10]:
+            allocations_file.write(f'\n{statistic.size / 1024:.1f} KiB in {statistic.count} blocks\n')
+            allocations_file.write('\n'.join(statistic.traceback.format()) + '\n')
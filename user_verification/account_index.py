@@ -0,0 +1,176 @@
+import io
+import os
+import re
+import datetime
+
+from zipfile import ZipFile
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Now
+from openpyxl import load_workbook
+
+from . import run_registry
+from .models import AccountIndexerLock, IndexedAccount, IndexedReport, Run
+
+# Index of the accounts in every month's reports, so a lookup by email or name across months doesn't have to open the
+# archived workbooks. Every run that produces an output reindexes its month from its archived output in the background, but only the
+# reports that changed since the month was last indexed: the incremental pipeline leaves the other ones untouched, so
+# their crc32 and size in the archive are the same
+INDEX_BATCH_SIZE = 500
+IT_AMS_ACCESS_COLUMNS = ['IT-AMS Access', 'IT-AMS Role\n(please specify using dropdown)']
+# the indexer renews its lock after every run, one that died loses it after this
+INDEXER_LOCK_SECONDS = 15 * 60
+INDEXER_LOCK_ID = 1
+
+
+def index_pending_runs(holder):
+    # adds the runs waiting for it to the index, oldest first, and returns how many. Only one process at a time does
+    # this: without the lock it returns 0 right away, as the holder also takes the runs that are added while it works.
+    # It checks for runs once more after releasing the lock, a run added while it released it isn't left behind
+    indexed = 0
+    while lock_indexer(holder):
+        try:
+            # left by an indexer that died
+            Run.objects.filter(index_status=Run.INDEXING).update(index_status=Run.INDEX_PENDING)
+            while True:
+                run = Run.objects.filter(index_status=Run.INDEX_PENDING).order_by('finished_at', 'id').first()
+                if run is None:
+                    break
+                index_run(run)
+                indexed += 1
+                if not lock_indexer(holder):
+                    return indexed
+        finally:
+            unlock_indexer(holder)
+        if not Run.objects.filter(index_status=Run.INDEX_PENDING).exists():
+            break
+    return indexed
+
+
+def index_run(run):
+    # indexes the archived output of `run` and records the outcome as its index_status
+    Run.objects.filter(pk=run.pk).update(index_status=Run.INDEXING, index_error='')
+    try:
+        if not run.output_path or not os.path.isfile(run.output_path):
+            raise FileNotFoundError('The output of the run was removed to free up disk space')
+        index_output(run.output_path, run.month, run.year, run)
+    except Exception as e:
+        Run.objects.filter(pk=run.pk).update(index_status=Run.INDEX_FAILED, index_error=f'{type(e).__name__}: {e}')
+    else:
+        Run.objects.filter(pk=run.pk).update(index_status=Run.INDEXED)
+
+
+def lock_indexer(holder):
+    # takes the indexer lock, or renews it for its holder. A database row, so it holds across hosts
+    expires_at = run_registry.get_database_time(INDEXER_LOCK_SECONDS)
+    try:
+        with transaction.atomic():
+            AccountIndexerLock.objects.create(id=INDEXER_LOCK_ID, holder=holder, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        # renewed by its holder, or taken over from one that died
+        lock = AccountIndexerLock.objects.filter(Q(holder=holder) | Q(expires_at__lt=Now()), id=INDEXER_LOCK_ID)
+        return bool(lock.update(holder=holder, expires_at=expires_at))
+
+
+def unlock_indexer(holder):
+    AccountIndexerLock.objects.filter(id=INDEXER_LOCK_ID, holder=holder).delete()
+
+
+def is_indexer_running():
+    return AccountIndexerLock.objects.filter(expires_at__gte=Now()).exists()
+
+
+def index_output(archive_filepath, month, year, run=None):
+    # returns the number of reports that were (re)indexed
+    month_start = datetime.datetime.strptime(f'{month} {year}', '%b %Y').date()
+    reindexed = 0
+    with ZipFile(archive_filepath) as archive, transaction.atomic():
+        # read in the transaction, so a run of the month indexing at the same time can't change them in between
+        indexed_reports = {report.filename: report for report in IndexedReport.objects.select_for_update().filter(year=year, month=month)}
+        fingerprints = {info.filename: f'{info.CRC:08x}-{info.file_size}' for info in archive.infolist() if info.filename.endswith('.xlsx')}
+        IndexedReport.objects.filter(year=year, month=month).exclude(filename__in=fingerprints).delete()
+        for filename, fingerprint in fingerprints.items():
+            report = indexed_reports.get(filename)
+            if report is not None and report.fingerprint == fingerprint:
+                continue
+            if report is not None:
+                report.delete()
+            report = IndexedReport.objects.create(month=month, year=year, month_start=month_start, filename=filename, fingerprint=fingerprint, run=run)
+            IndexedAccount.objects.bulk_create(read_accounts(archive.read(filename), report), batch_size=INDEX_BATCH_SIZE)
+            reindexed += 1
+    return reindexed
+
+
+def read_accounts(report_data, report):
+    wb = load_workbook(io.BytesIO(report_data), read_only=True)
+    for ws in wb.worksheets:
+        rows = ws.iter_rows(values_only=True)
+        header = [str(column) if column is not None else '' for column in next(rows, [])]
+        # the discrepancies report lists accounts of other reports
+        if 'Discrepancy' in header:
+            continue
+        email_column = next((header.index(column) for column in ['Email', 'Email Address'] if column in header), None)
+        if email_column is None:
+            continue # e.g. IT_AMS_Roles
+        columns = {column: header.index(column) for column in ['First Name', 'Last Name', 'Region', 'Title', 'Roles'] + IT_AMS_ACCESS_COLUMNS if column in header}
+        it_ams_access_column = next((columns[column] for column in IT_AMS_ACCESS_COLUMNS if column in columns), None)
+        for row in rows:
+            email = normalize_email(get_value(row, email_column))
+            if not email:
+                continue
+            first_name = get_value(row, columns.get('First Name'))
+            last_name = get_value(row, columns.get('Last Name'))
+            yield IndexedAccount(
+                report=report, sheet=ws.title, email=email, first_name=first_name, last_name=last_name,
+                name_key=normalize_name(f'{first_name} {last_name}'), last_name_key=normalize_name(last_name),
+                region=get_value(row, columns.get('Region')), title=get_value(row, columns.get('Title')),
+                roles=get_value(row, columns.get('Roles')), it_ams_access=get_value(row, it_ams_access_column)
+            )
+    wb.close()
+
+
+def get_value(row, column):
+    if column is None or column >= len(row) or row[column] is None:
+        return ''
+    return str(row[column]).strip()
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
+def normalize_name(name):
+    return re.sub(r'\s+', ' ', name).strip().lower()
+
+
+NAME_PREFIX_MIN_LENGTH = 3
+
+
+def lookup_accounts(email=None, name=None, limit=100):
+    # every month and report an account is in, the latest month first. name matches the start of "first last" or of
+    # the last name. The prefix is looked up as a range, which the indexes answer on any database
+    accounts = IndexedAccount.objects.select_related('report', 'report__run')
+    if email:
+        accounts = accounts.filter(email=normalize_email(email))
+    else:
+        prefix = normalize_name(name)
+        accounts = accounts.filter(name_key__gte=prefix, name_key__lt=prefix + '\uffff') | accounts.filter(last_name_key__gte=prefix, last_name_key__lt=prefix + '\uffff')
+    return accounts.order_by('-report__month_start', 'email', 'report__filename', 'sheet')[:limit]
+
+
+def serialize_account(account):
+    return {
+        'email': account.email,
+        'first_name': account.first_name,
+        'last_name': account.last_name,
+        'month': account.report.month,
+        'year': account.report.year,
+        'report': account.report.filename,
+        'sheet': account.sheet,
+        'region': account.region,
+        'title': account.title,
+        'roles': account.roles,
+        'it_ams_access': account.it_ams_access,
+        'run_id': account.report.run.run_id if account.report.run else None,
+    }
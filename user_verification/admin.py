@@ -1,3 +1,21 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import IndexedReport, Job, Run
+
+
+@admin.register(Run)
+class RunAdmin(admin.ModelAdmin):
+    list_display = ['month', 'year', 'status', 'started_at', 'duration', 'output_size']
+    list_filter = ['status', 'year', 'month']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['run', 'status', 'attempts', 'worker', 'created_at', 'heartbeat_at']
+    list_filter = ['status']
+
+
+@admin.register(IndexedReport)
+class IndexedReportAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'month', 'year', 'indexed_at']
+    list_filter = ['year', 'month']
@@ -0,0 +1,122 @@
+import os
+import time
+import uuid
+import subprocess
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+from . import pipeline
+
+# stage: [check_upload keys of the files it reads, upstream stages], in pipeline order, see STAGE_DEPENDENCIES in
+# scripts/auto_user_verif.py. The regional stage starts with the regional files that are there and picks up the
+# others on a later run, or with UVR_REGIONAL_FROM_RGNALL derives all of them from RgnAll without waiting for any
+REGIONAL_UPLOADS = [f'rgn{region}FileUploaded' for region in range(1, 13)]
+STAGE_UPLOADS = {
+    'it_ams': [['rgnAllFileUploaded', 'ogmFileUploaded', 'podFileUploaded'], []],
+    'ogm': [['rgnAllFileUploaded', 'ogmFileUploaded', 'userRoleFileUploaded'], ['it_ams']],
+    'regional': [[], ['it_ams', 'ogm']],
+    'pod': [['podFileUploaded'], ['it_ams', 'ogm']],
+    'tta': [['ttaFileUploaded'], ['ogm']],
+    'monitoring': [['danyaUserFileUploaded', 'lewinFileUploaded', 'monitoringFileUploaded'], []],
+}
+
+
+def get_ready_stages(context):
+    ready_stages = []
+    for stage, [uploads, upstream_stages] in STAGE_UPLOADS.items():
+        if stage == 'regional' and not settings.UVR_REGIONAL_FROM_RGNALL and not any(context[upload] for upload in REGIONAL_UPLOADS):
+            continue
+        if all(context[upload] for upload in uploads) and all(upstream_stage in ready_stages for upstream_stage in upstream_stages):
+            ready_stages.append(stage)
+    return ready_stages
+
+
+class StreamingIngest:
+    # stores every uploaded file as soon as its part of the request body is complete and runs the pipeline stages
+    # whose files are all there in the background, so the upload and the processing overlap. Only one pipeline
+    # process runs at a time since they share processed_files, and the incremental final run in run_reports skips
+    # every stage that is already done. The stage processes have the limits of a run, and the upload is stopped once
+    # the run is cancelled or past its deadline
+    def __init__(self, month, year, run_id, uvr_filepath, context, store_upload, command, env):
+        self.month = month
+        self.year = year
+        self.run_id = run_id
+        self.uvr_filepath = uvr_filepath
+        self.context = context
+        self.store_upload = store_upload
+        self.command = command
+        self.env = env
+        self.process = None
+        self.has_new_uploads = False
+        self.start = time.monotonic()
+        self.last_check = self.start
+        self.stopped = None # pipeline.RunStopped once the run was cancelled or past its deadline
+
+    def add_upload(self, part_filepath, filename):
+        self.context = self.store_upload(self.context, self.uvr_filepath, part_filepath, filename)
+        if os.path.exists(part_filepath):
+            os.remove(part_filepath) # not a UVR file, or a zip that was extracted
+        self.has_new_uploads = True
+        self.start_ready_stages()
+
+    def start_ready_stages(self):
+        if time.monotonic() - self.last_check >= pipeline.STOP_CHECK_INTERVAL:
+            self.check_run_limits()
+        if self.command is None or self.stopped is not None or not self.has_new_uploads or self.is_running():
+            return
+        self.has_new_uploads = False
+        stages = get_ready_stages(self.context)
+        if stages:
+            self.process = pipeline.start_report_script(self.command, dict(self.env, UVR_STAGES=','.join(stages)), subprocess.DEVNULL)
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def check_run_limits(self):
+        self.last_check = time.monotonic()
+        if self.stopped is None:
+            self.stopped = pipeline.check_run_limits(self.run_id, self.start)
+        if self.stopped is not None and self.is_running():
+            pipeline.stop_process(self.process)
+
+    def wait(self):
+        # for the stage process of the last upload, unless the run is stopped first
+        self.check_run_limits()
+        while self.stopped is None and self.is_running():
+            try:
+                self.process.wait(timeout=pipeline.STOP_CHECK_INTERVAL)
+            except subprocess.TimeoutExpired:
+                self.check_run_limits()
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    # writes each file of the request body straight into the month's workspace instead of memory or /tmp
+    def __init__(self, request, streaming_ingest):
+        super().__init__(request)
+        self.streaming_ingest = streaming_ingest
+        self.part_file = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.part_file = open(os.path.join(self.streaming_ingest.uvr_filepath, f'.upload_{uuid.uuid4().hex}.part'), 'wb')
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.streaming_ingest.stopped is not None:
+            # the rest of the body is discarded, process_uploads reports how the run was stopped
+            self.upload_interrupted()
+            raise StopUpload()
+        self.part_file.write(raw_data)
+        # a stage may have finished since the last file completed, with new files waiting for it
+        self.streaming_ingest.start_ready_stages()
+
+    def file_complete(self, file_size):
+        self.part_file.close()
+        self.streaming_ingest.add_upload(self.part_file.name, os.path.basename(self.file_name))
+        self.part_file = None
+
+    def upload_interrupted(self):
+        if self.part_file is not None:
+            self.part_file.close()
+            os.remove(self.part_file.name)
+            self.part_file = None
@@ -0,0 +1,133 @@
+import subprocess
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from . import pipeline, progress, run_registry
+from .models import Job, Run
+
+# Durable queue of report runs in the Django database, so it needs no other service. With UVR_JOB_QUEUE on, run_reports
+# stores the uploads in the month's workspace and queues a job, and `python manage.py uvr_worker` processes claim and
+# run them. A claim is a lease that the worker extends with heartbeats while the report script runs. When a worker
+# dies its lease runs out and the next worker takes the job over, the incremental pipeline carries on from the stages
+# that were already done. Claims are conditional updates on the attempt counter, so two workers can't claim the same
+# attempt of a job. Leases expire by the database's clock, so workers on hosts whose clocks differ agree on them. With
+# the SQLite database the queue is single-host, its file locks aren't reliable on NFS. Workers on several hosts need a
+# database server in DATABASES and shared media/ and var/ folders
+
+
+def get_lease_expiry():
+    return run_registry.get_database_time(settings.UVR_JOB_LEASE_SECONDS)
+
+
+def enqueue(run, profile=False):
+    run.status = Run.QUEUED
+    run.save(update_fields=['status'])
+    progress.record_event(run.run_id, 'run_queued')
+    return Job.objects.create(run=run, profile=profile)
+
+
+def has_active_job(month, year):
+    # a queued run processes the month's workspace as it is when a worker gets to it
+    return Job.objects.filter(run__month=month, run__year=year, status__in=[Job.QUEUED, Job.RUNNING]).exists()
+
+
+def claim_job(worker_id):
+    claimable_jobs = Job.objects.filter(Q(status=Job.QUEUED) | Q(status=Job.RUNNING, lease_expires_at__lt=Now())).select_related('run')
+    busy_months = set(Job.objects.filter(status=Job.RUNNING, lease_expires_at__gte=Now()).values_list('run__month', 'run__year'))
+    for job in claimable_jobs.order_by('created_at'):
+        if (job.run.month, job.run.year) in busy_months:
+            continue
+        if job.attempts >= settings.UVR_JOB_MAX_ATTEMPTS:
+            # every worker that had it died or lost its lease, probably the run itself takes the worker down
+            give_up_job(job, f'Stopped after {job.attempts} attempts, the worker running it stopped responding')
+            continue
+        claimed = Job.objects.filter(pk=job.pk, status=job.status, attempts=job.attempts).update(
+            status=Job.RUNNING, worker=worker_id, attempts=F('attempts') + 1, heartbeat_at=Now(), lease_expires_at=get_lease_expiry()
+        )
+        if not claimed:
+            continue # claimed by another worker in the meantime
+        job.refresh_from_db()
+        if is_workspace_busy(job):
+            release_job(job, worker_id)
+            continue
+        return job
+    return None
+
+
+def is_workspace_busy(job):
+    # runs of the same month share a workspace, so a job waits while another worker holds a live lease on one of
+    # them. Two workers that claim jobs of the same month at the same moment may both back off, they retry later
+    return Job.objects.filter(
+        run__month=job.run.month, run__year=job.run.year, status=Job.RUNNING, lease_expires_at__gte=Now()
+    ).exclude(pk=job.pk).exists()
+
+
+def release_job(job, worker_id):
+    Job.objects.filter(pk=job.pk, worker=worker_id, attempts=job.attempts).update(
+        status=Job.QUEUED, worker='', attempts=F('attempts') - 1, heartbeat_at=None, lease_expires_at=None
+    )
+
+
+def heartbeat(job, worker_id):
+    # False once the lease ran out and another worker claimed the job
+    return bool(Job.objects.filter(pk=job.pk, worker=worker_id, attempts=job.attempts, status=Job.RUNNING).update(
+        heartbeat_at=Now(), lease_expires_at=get_lease_expiry()
+    ))
+
+
+def finish_job(job, worker_id, status, error=''):
+    return bool(Job.objects.filter(pk=job.pk, worker=worker_id, attempts=job.attempts).update(
+        status=status, finished_at=timezone.now(), lease_expires_at=None, error=error
+    ))
+
+
+def give_up_job(job, error):
+    if not Job.objects.filter(pk=job.pk, status=job.status, attempts=job.attempts).update(
+        status=Job.FAILED, finished_at=timezone.now(), lease_expires_at=None, error=error
+    ):
+        return
+    run = job.run
+    progress.record_event(run.run_id, 'run_failed', error=error)
+    run_registry.finish_run(run, Run.FAILED, events=[event for _, event in progress.read_events(run.run_id)])
+
+
+def cancel_queued_job(run):
+    # False when no worker has to pick the run up anymore, or one already did and has to be told through
+    # run_registry.request_cancellation
+    if not Job.objects.filter(run=run, status=Job.QUEUED).update(status=Job.CANCELLED, finished_at=timezone.now(), error='The run was cancelled'):
+        return False
+    progress.record_event(run.run_id, 'run_failed', status=Run.CANCELLED, error='The run was cancelled')
+    run_registry.finish_run(run, Run.CANCELLED, events=[event for _, event in progress.read_events(run.run_id)])
+    return True
+
+
+def run_job(job, worker_id):
+    run = job.run
+    run.status = Run.RUNNING
+    run.save(update_fields=['status'])
+    if job.attempts > 1:
+        progress.record_event(run.run_id, 'run_retried', attempt=job.attempts)
+    uvr_filepath = pipeline.get_workspace_filepath(run.month, run.year)
+    try:
+        pipeline.run_pipeline(
+            run, uvr_filepath, progress.get_progress_filepath(run.run_id), job.profile,
+            heartbeat=lambda: heartbeat(job, worker_id), heartbeat_interval=settings.UVR_JOB_LEASE_SECONDS / 4
+        )
+    except pipeline.LeaseLost:
+        return # another worker runs it now
+    except pipeline.RunStopped as e:
+        finish_job(job, worker_id, Job.CANCELLED if e.status == Run.CANCELLED else Job.FAILED, str(e))
+        return
+    except subprocess.CalledProcessError as e:
+        # the run is already recorded as failed, rerunning the same inputs would fail the same way
+        finish_job(job, worker_id, Job.FAILED, f'Report script exited with status {e.returncode}')
+        return
+    except Exception as e:
+        if finish_job(job, worker_id, Job.FAILED, repr(e)):
+            progress.record_event(run.run_id, 'run_failed', error=repr(e))
+            run_registry.finish_run(run, Run.FAILED, events=[event for _, event in progress.read_events(run.run_id)])
+        raise
+    finish_job(job, worker_id, Job.FINISHED)
@@ -0,0 +1,47 @@
+import os
+import re
+import socket
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user_verification import account_index, pipeline
+from user_verification.models import Run
+
+
+class Command(BaseCommand):
+    help = 'Adds the reports of every month in media/downloadable_resources to the account index used by lookup_account. Finished runs are queued for the index and added by a --pending process, this is only needed for the months that were run before the index existed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--run-id', help='only index the archived output of this run')
+        parser.add_argument('--pending', action='store_true', help='index the runs queued by pipeline.start_account_indexing, unless another process already does')
+
+    def handle(self, *args, **options):
+        holder = f'{socket.gethostname()}:{os.getpid()}'
+        if options['run_id']:
+            run = Run.objects.filter(run_id=options['run_id']).exclude(output_path='').first()
+            if run is None:
+                raise CommandError(f'No archived output found for run {options["run_id"]}.')
+            Run.objects.filter(pk=run.pk).update(index_status=Run.INDEX_PENDING, index_error='')
+            account_index.index_pending_runs(holder)
+            run.refresh_from_db()
+            if run.index_status == Run.INDEX_PENDING:
+                self.stdout.write(f'Run {run.run_id} is queued for the indexer that is running')
+            elif run.index_status == Run.INDEX_FAILED:
+                self.stdout.write(f'Run {run.run_id} was not indexed: {run.index_error}')
+            else:
+                self.stdout.write(f'{run.month} {run.year}: run {run.run_id} indexed')
+            return
+        if options['pending']:
+            indexed = account_index.index_pending_runs(holder)
+            self.stdout.write(f'{indexed} runs indexed')
+            return
+        output_folder = os.path.dirname(pipeline.get_output_filepath('', ''))
+        if not os.path.isdir(output_folder):
+            return
+        for filename in sorted(os.listdir(output_folder)):
+            match = re.fullmatch(r'([A-Za-z]{3})_(\d{4})_UVR_Output\.zip', filename)
+            if match is None:
+                continue # e.g. an archive being written
+            [month, year] = [match.group(1), int(match.group(2))]
+            reindexed = account_index.index_output(os.path.join(output_folder, filename), month, year)
+            self.stdout.write(f'{month} {year}: {reindexed} reports indexed')
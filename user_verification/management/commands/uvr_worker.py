@@ -0,0 +1,40 @@
+import os
+import time
+import signal
+import socket
+import traceback
+
+from django.core.management.base import BaseCommand
+
+from user_verification import job_queue
+
+
+class Command(BaseCommand):
+    help = 'Runs the user verification report jobs queued by run_reports when UVR_JOB_QUEUE is on. Start as many as the host has cores to spare, on the host that serves the app: with SQLite the queue is single-host.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--worker-id', default=f'{socket.gethostname()}:{os.getpid()}', help='name of this worker in the job records')
+        parser.add_argument('--poll-interval', type=float, default=2, help='seconds between checks of an empty queue')
+        parser.add_argument('--once', action='store_true', help='exit once the queue is empty instead of waiting for new jobs')
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id']
+        stopping = []
+        # finish the current job before exiting, e.g. on systemctl stop
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+        self.stdout.write(f'Worker {worker_id} waiting for jobs')
+        while not stopping:
+            job = job_queue.claim_job(worker_id)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+            self.stdout.write(f'Running {job.run.month} {job.run.year} run {job.run.run_id} (attempt {job.attempts})')
+            start = time.monotonic()
+            try:
+                job_queue.run_job(job, worker_id)
+            except Exception:
+                self.stderr.write(traceback.format_exc())
+            job.refresh_from_db()
+            self.stdout.write(f'Run {job.run.run_id} {job.status} after {time.monotonic() - start:.1f}s')
@@ -0,0 +1,152 @@
+import os
+import re
+import logging
+import sqlite3
+import datetime
+import threading
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import progress
+from .models import Job, Run
+
+logger = logging.getLogger(__name__)
+LABEL_PATTERN = re.compile(r'(\w+)="([^"]*)"')
+_local = threading.local()
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+UPLOAD_SIZE_BUCKETS = [2 ** exponent for exponent in range(16, 28)] # 64KB up to 128MB
+PIPELINE_DURATION_BUCKETS = [1, 2.5, 5, 10, 20, 30, 60, 90, 120, 180, 300, 600]
+
+# name: [type, help, histogram buckets]
+METRICS = {
+    'uvr_request_duration_seconds': ['histogram', 'Latency of user_verification views.', LATENCY_BUCKETS],
+    'uvr_upload_size_bytes': ['histogram', 'Size of run_reports upload request bodies.', UPLOAD_SIZE_BUCKETS],
+    'uvr_pipeline_run_duration_seconds': ['histogram', 'Duration of complete report pipeline runs.', PIPELINE_DURATION_BUCKETS],
+    'uvr_pipeline_stage_duration_seconds': ['histogram', 'Duration of the report pipeline stages.', PIPELINE_DURATION_BUCKETS],
+    'uvr_pipeline_runs_in_flight': ['gauge', 'Report pipeline runs currently executing.', None],
+    'uvr_pipeline_runs_queued': ['gauge', 'Report pipeline runs waiting for a uvr_worker.', None],
+    'uvr_pipeline_runs_failed_total': ['counter', 'Report pipeline runs that failed.', None],
+    'uvr_pipeline_runs_stopped_total': ['counter', 'Report pipeline runs that were cancelled or timed out.', None],
+    'uvr_media_disk_usage_bytes': ['gauge', 'Disk space used by MEDIA_ROOT.', None],
+}
+
+
+def get_connection():
+    # a single sqlite file shared by all uwsgi processes, so every worker reports the same aggregated values. Every
+    # thread keeps its connection open, the schema is only set up when it is opened (and again in a forked process)
+    metrics_filepath = os.path.join(settings.UVR_STATE_DIR, 'metrics.sqlite3')
+    key = (os.getpid(), metrics_filepath)
+    if getattr(_local, 'key', None) != key:
+        close_connection()
+        os.makedirs(os.path.dirname(metrics_filepath), exist_ok=True)
+        connection = sqlite3.connect(metrics_filepath, timeout=5, isolation_level=None)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS samples (name TEXT, labels TEXT, value REAL, PRIMARY KEY (name, labels))')
+        except sqlite3.Error:
+            connection.close()
+            raise
+        [_local.key, _local.connection] = [key, connection]
+    return _local.connection
+
+
+def close_connection():
+    if getattr(_local, 'key', None) is not None and _local.key[0] == os.getpid():
+        _local.connection.close()
+    [_local.key, _local.connection] = [None, None]
+
+
+def format_labels(labels):
+    return ','.join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+
+
+def parse_labels(labels):
+    return dict(LABEL_PATTERN.findall(labels))
+
+
+def add_samples(samples):
+    # metrics are best effort, a locked or broken metrics database must not fail the request or run being measured
+    try:
+        connection = get_connection()
+        connection.execute('BEGIN IMMEDIATE')
+        connection.executemany(
+            'INSERT INTO samples VALUES (?, ?, ?) ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value',
+            samples
+        )
+        connection.execute('COMMIT')
+    except (sqlite3.Error, OSError):
+        logger.exception('Could not record metrics %s', sorted({name for name, _, _ in samples}))
+        close_connection() # rolls back, the next write opens a new connection
+
+
+def increment(name, amount=1, **labels):
+    add_samples([[name, format_labels(labels), amount]])
+
+
+def observe(name, value, **labels):
+    buckets = METRICS[name][2]
+    samples = [[f'{name}_bucket', format_labels({**labels, 'le': bucket}), 1] for bucket in buckets if value <= bucket]
+    samples.append([f'{name}_bucket', format_labels({**labels, 'le': '+Inf'}), 1])
+    samples.append([f'{name}_sum', format_labels(labels), value])
+    samples.append([f'{name}_count', format_labels(labels), 1])
+    add_samples(samples)
+
+
+def record_pipeline_stage_durations(events):
+    for event in events:
+        if event['event'] == 'stage_finished':
+            observe('uvr_pipeline_stage_duration_seconds', event['duration'], stage=event['stage'])
+
+
+def get_disk_usage(folder):
+    total_bytes = 0
+    for root, _, files in os.walk(folder):
+        for filename in files:
+            try:
+                total_bytes += os.path.getsize(os.path.join(root, filename))
+            except FileNotFoundError:
+                pass # removed while walking
+    return total_bytes
+
+
+def get_run_samples():
+    # counted from the run registry and the job queue when scraped, so a process that dies during a run can't leave
+    # them off. A run without a job is running in a web process, it can't be running anymore once past its deadline
+    now = timezone.now()
+    deadline = now - datetime.timedelta(seconds=settings.UVR_RUN_TIMEOUT_SECONDS + progress.STALE_RUN_GRACE_SECONDS)
+    in_flight = Job.objects.filter(status=Job.RUNNING, lease_expires_at__gte=now).count() + \
+        Run.objects.filter(status=Run.RUNNING, job__isnull=True, started_at__gte=deadline).count()
+    # jobs of dead workers wait for another worker as well
+    queued = Job.objects.filter(Q(status=Job.QUEUED) | Q(status=Job.RUNNING, lease_expires_at__lt=now)).count()
+    return [['uvr_pipeline_runs_in_flight', '', in_flight], ['uvr_pipeline_runs_queued', '', queued]]
+
+
+def format_sample(name, labels, value):
+    value = int(value) if float(value).is_integer() else value
+    return f'{name}{{{labels}}} {value}' if labels else f'{name} {value}'
+
+
+def render():
+    samples = get_connection().execute('SELECT name, labels, value FROM samples').fetchall()
+    samples += get_run_samples()
+    samples.append(['uvr_media_disk_usage_bytes', '', get_disk_usage(settings.MEDIA_ROOT)])
+    values = {(name, labels): value for name, labels, value in samples}
+
+    lines = []
+    for name, [metric_type, description, buckets] in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        if metric_type != 'histogram':
+            lines += [format_sample(name, labels, value) for (sample_name, labels), value in sorted(values.items()) if sample_name == name]
+            continue
+        # every bucket of every label set in increasing order, only the buckets a value fell into are stored
+        for labels in sorted(labels for sample_name, labels in values if sample_name == f'{name}_count'):
+            for bucket in buckets + ['+Inf']:
+                bucket_labels = format_labels({**parse_labels(labels), 'le': bucket})
+                lines.append(format_sample(f'{name}_bucket', bucket_labels, values.get((f'{name}_bucket', bucket_labels), 0)))
+            lines.append(format_sample(f'{name}_sum', labels, values.get((f'{name}_sum', labels), 0)))
+            lines.append(format_sample(f'{name}_count', labels, values[f'{name}_count', labels]))
+    return '\n'.join(lines) + '\n'
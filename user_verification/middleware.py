@@ -0,0 +1,21 @@
+import time
+
+from . import metrics
+
+# views whose latency is recorded, keyed by url name
+MEASURED_VIEWS = ['index', 'run_reports', 'get_download_status', 'get_processed_files']
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.monotonic()
+        response = self.get_response(request)
+        match = request.resolver_match
+        if match is not None and match.url_name in MEASURED_VIEWS:
+            metrics.observe('uvr_request_duration_seconds', time.monotonic() - start, view=match.url_name)
+            if match.url_name == 'run_reports' and request.META.get('CONTENT_LENGTH'):
+                metrics.observe('uvr_upload_size_bytes', int(request.META['CONTENT_LENGTH']))
+        return response
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.6 on 2026-10-19 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Run',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_id', models.CharField(max_length=64, unique=True)),
+                ('month', models.CharField(max_length=3)),
+                ('year', models.IntegerField()),
+                ('status', models.CharField(choices=[('running', 'Running'), ('finished', 'Finished'), ('cached', 'Finished (cached output)'), ('failed', 'Failed')], default='running', max_length=16)),
+                ('input_fingerprint', models.CharField(max_length=64)),
+                ('input_hashes', models.JSONField(default=dict)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.FloatField(blank=True, null=True)),
+                ('stage_durations', models.JSONField(default=dict)),
+                ('row_counts', models.JSONField(default=dict)),
+                ('output_path', models.CharField(blank=True, max_length=255)),
+                ('output_size', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='run',
+            index=models.Index(fields=['year', 'month', '-started_at'], name='user_verifi_year_4867eb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='run',
+            index=models.Index(fields=['-started_at'], name='user_verifi_started_533c78_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.6 on 2026-10-19 14:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_verification', '0003_run_cancellation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexedReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.CharField(max_length=3)),
+                ('year', models.IntegerField()),
+                ('month_start', models.DateField()),
+                ('filename', models.CharField(max_length=255)),
+                ('fingerprint', models.CharField(max_length=32)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+                ('run', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='indexed_reports', to='user_verification.run')),
+            ],
+            options={
+                'ordering': ['-month_start', 'filename'],
+            },
+        ),
+        migrations.CreateModel(
+            name='IndexedAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sheet', models.CharField(max_length=64)),
+                ('email', models.CharField(db_index=True, max_length=255)),
+                ('first_name', models.CharField(blank=True, max_length=255)),
+                ('last_name', models.CharField(blank=True, max_length=255)),
+                ('name_key', models.CharField(db_index=True, max_length=511)),
+                ('last_name_key', models.CharField(db_index=True, max_length=255)),
+                ('region', models.CharField(blank=True, max_length=64)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('roles', models.TextField(blank=True)),
+                ('it_ams_access', models.CharField(blank=True, max_length=64)),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accounts', to='user_verification.indexedreport')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='indexedreport',
+            constraint=models.UniqueConstraint(fields=('year', 'month', 'filename'), name='unique_indexed_report'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.6 on 2026-10-19 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_verification', '0004_account_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkspaceLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.CharField(max_length=3)),
+                ('year', models.IntegerField()),
+                ('run_id', models.CharField(max_length=64)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='workspacelock',
+            constraint=models.UniqueConstraint(fields=('year', 'month'), name='unique_workspace_lock'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.6 on 2026-10-19 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_verification', '0005_workspace_lock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountIndexerLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holder', models.CharField(max_length=255)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='index_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='index_status',
+            field=models.CharField(blank=True, choices=[('', 'Not indexed'), ('pending', 'Pending'), ('indexing', 'Indexing'), ('indexed', 'Indexed'), ('failed', 'Failed')], max_length=16),
+        ),
+    ]
@@ -1,3 +1,158 @@
 from django.db import models
 
-# Create your models here.
+
+class Run(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    CACHED = 'cached'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    TIMED_OUT = 'timed_out'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FINISHED, 'Finished'),
+        (CACHED, 'Finished (cached output)'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+        (TIMED_OUT, 'Timed out'),
+    ]
+    # adding the run's output to the account index, see account_index.index_pending_runs
+    INDEX_PENDING = 'pending'
+    INDEXING = 'indexing'
+    INDEXED = 'indexed'
+    INDEX_FAILED = 'failed'
+    INDEX_STATUS_CHOICES = [
+        ('', 'Not indexed'),
+        (INDEX_PENDING, 'Pending'),
+        (INDEXING, 'Indexing'),
+        (INDEXED, 'Indexed'),
+        (INDEX_FAILED, 'Failed'),
+    ]
+
+    run_id = models.CharField(max_length=64, unique=True)
+    month = models.CharField(max_length=3)
+    year = models.IntegerField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=RUNNING)
+    input_fingerprint = models.CharField(max_length=64)
+    input_hashes = models.JSONField(default=dict) # input filename: sha256
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    stage_durations = models.JSONField(default=dict)
+    stage = models.CharField(max_length=32, blank=True) # last stage the run started
+    row_counts = models.JSONField(default=dict) # output report filename: number of rows
+    output_path = models.CharField(max_length=255, blank=True) # archived output, empty once evicted
+    output_size = models.BigIntegerField(default=0)
+    index_status = models.CharField(max_length=16, choices=INDEX_STATUS_CHOICES, blank=True)
+    index_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['year', 'month', '-started_at']),
+            models.Index(fields=['-started_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.month} {self.year} ({self.status}, {self.started_at:%Y-%m-%d %H:%M})'
+
+
+class Job(models.Model):
+    # a run queued for the uvr_worker command, see job_queue.py
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FINISHED, 'Finished'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
+    run = models.OneToOneField(Run, on_delete=models.CASCADE, related_name='job')
+    profile = models.BooleanField(default=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=255, blank=True) # worker id of the latest claim
+    created_at = models.DateTimeField(auto_now_add=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True) # another worker can take over a running job after this
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.run.month} {self.run.year} ({self.status}, attempt {self.attempts})'
+
+
+class WorkspaceLock(models.Model):
+    # held by the upload (and the run it starts) that is changing a month's workspace, see run_registry.lock_workspace
+    month = models.CharField(max_length=3)
+    year = models.IntegerField()
+    run_id = models.CharField(max_length=64)
+    expires_at = models.DateTimeField() # a holder that died can't keep it longer than this
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'month'], name='unique_workspace_lock'),
+        ]
+
+    def __str__(self):
+        return f'{self.month} {self.year} ({self.run_id})'
+
+
+class AccountIndexerLock(models.Model):
+    # held by the one process that adds runs to the account index, see account_index.index_pending_runs
+    holder = models.CharField(max_length=255)
+    expires_at = models.DateTimeField() # a holder that died can't keep it longer than this
+
+    def __str__(self):
+        return self.holder
+
+
+class IndexedReport(models.Model):
+    # a report of a month's latest output in the account index, see account_index.py
+    month = models.CharField(max_length=3)
+    year = models.IntegerField()
+    month_start = models.DateField() # for sorting the months
+    filename = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=32) # crc32 and size of the report in the output archive
+    run = models.ForeignKey(Run, null=True, blank=True, on_delete=models.SET_NULL, related_name='indexed_reports')
+    indexed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-month_start', 'filename']
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'month', 'filename'], name='unique_indexed_report'),
+        ]
+
+    def __str__(self):
+        return f'{self.filename} ({self.month} {self.year})'
+
+
+class IndexedAccount(models.Model):
+    report = models.ForeignKey(IndexedReport, on_delete=models.CASCADE, related_name='accounts')
+    sheet = models.CharField(max_length=64)
+    email = models.CharField(max_length=255, db_index=True) # lowercase, without surrounding spaces
+    first_name = models.CharField(max_length=255, blank=True)
+    last_name = models.CharField(max_length=255, blank=True)
+    # lowercase "first last" and "last" for name prefix lookups
+    name_key = models.CharField(max_length=511, db_index=True)
+    last_name_key = models.CharField(max_length=255, db_index=True)
+    region = models.CharField(max_length=64, blank=True)
+    title = models.CharField(max_length=255, blank=True)
+    roles = models.TextField(blank=True)
+    it_ams_access = models.CharField(max_length=64, blank=True)
+
+    def __str__(self):
+        return f'{self.email} ({self.report})'
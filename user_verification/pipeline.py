@@ -0,0 +1,261 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import signal
+import threading
+import subprocess
+
+from zipfile import ZipFile, ZIP_DEFLATED
+from django.conf import settings
+
+try:
+    import resource
+except ImportError:
+    resource = None # not on Windows, the runs are not resource limited there
+
+from . import account_index, metrics, progress, run_cache, run_registry
+from .models import Run
+
+
+# a summary only runs the data transformations, see --summary in scripts/auto_user_verif.py
+SUMMARY_TIMEOUT = 60
+# how often a running report script is checked for cancellation and its deadline, and how long it gets to exit
+# after SIGTERM before it is killed
+STOP_CHECK_INTERVAL = 1
+STOP_GRACE_SECONDS = 10
+# runs the report script with its resource limits, see limit_command. Gets the CPU seconds, the grace period and the
+# memory bytes, followed by the command it replaces itself with
+LIMIT_WRAPPER = """
+import os, sys, resource
+
+def set_limit(limit, soft, hard):
+    # an unprivileged process can only lower its hard limit
+    [_, current_hard] = resource.getrlimit(limit)
+    if current_hard != resource.RLIM_INFINITY:
+        [soft, hard] = [min(soft, current_hard), min(hard, current_hard)]
+    resource.setrlimit(limit, (soft, hard))
+
+[cpu_seconds, grace_seconds, memory_bytes] = [int(value) for value in sys.argv[1:4]]
+set_limit(resource.RLIMIT_CPU, cpu_seconds, cpu_seconds + grace_seconds)
+set_limit(resource.RLIMIT_DATA, memory_bytes, memory_bytes)
+os.execvp(sys.argv[4], sys.argv[4:])
+"""
+
+
+class LeaseLost(Exception):
+    # the job's lease ran out and another worker claimed it, see job_queue.py
+    pass
+
+
+class RunStopped(Exception):
+    # the run was cancelled or ran past its deadline or CPU limit, status is Run.CANCELLED or Run.TIMED_OUT
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def get_output_filepath(month, year):
+    return os.path.join('media', 'downloadable_resources', f'{month}_{year}_UVR_Output.zip')
+
+
+def get_workspace_filepath(month, year, create=True):
+    # every month keeps its own workspace between runs: uploaded files replace the ones of the same kind and the
+    # files uploaded earlier count towards the required ones, so a corrected regional file can be uploaded on its own
+    # and the incremental pipeline only reprocesses what it affects
+    uvr_filepath = os.path.join('media', 'user_verification_files', f'{month}_{year}')
+    if create:
+        os.makedirs(uvr_filepath, exist_ok=True)
+    return uvr_filepath
+
+
+def remove_expired_workspaces(retention_days):
+    # the uploads hold personal data, a month's workspace is removed once nothing in it changed for retention_days. A
+    # later run of that month needs every file uploaded again
+    workspaces_folder = os.path.dirname(get_workspace_filepath('', '', create=False))
+    if not os.path.isdir(workspaces_folder):
+        return
+    expired = time.time() - retention_days * 24 * 60 * 60
+    for workspace in os.listdir(workspaces_folder):
+        uvr_filepath = os.path.join(workspaces_folder, workspace)
+        if not os.path.isdir(uvr_filepath):
+            continue
+        if get_last_modified(uvr_filepath) < expired:
+            shutil.rmtree(uvr_filepath, ignore_errors=True)
+
+
+def get_last_modified(folder):
+    last_modified = 0
+    for root, _, filenames in os.walk(folder):
+        for path in [root] + [os.path.join(root, filename) for filename in filenames]:
+            try:
+                last_modified = max(last_modified, os.path.getmtime(path))
+            except FileNotFoundError:
+                pass # removed while walking
+    return last_modified
+
+
+def run_pipeline(run, uvr_filepath, progress_filepath, profile=False, heartbeat=None, heartbeat_interval=None):
+    # runs the report script on the month's workspace and archives its output, either in the web process that
+    # received the upload or in a uvr_worker process. heartbeat is called every heartbeat_interval seconds while
+    # the script runs and stops it by returning False
+    [month, year] = [run.month, run.year]
+    output_filepath = get_output_filepath(month, year)
+    start = time.monotonic()
+    try:
+        # a profiled run reprocesses every stage, skipped stages would not show up in the profile
+        log = run_report_script(
+            get_report_command(uvr_filepath, month, year, profile),
+            get_report_env(progress_filepath, incremental=not profile),
+            run.run_id, heartbeat, heartbeat_interval
+        )
+    except RunStopped as e:
+        progress.record_event(run.run_id, 'run_failed', status=e.status, error=str(e))
+        metrics.increment('uvr_pipeline_runs_stopped_total', reason=e.status)
+        run_registry.finish_run(run, e.status, events=[event for _, event in progress.read_events(run.run_id)])
+        raise
+    except subprocess.CalledProcessError as e:
+        progress.record_event(run.run_id, 'run_failed', error=f'Report script exited with status {e.returncode}')
+        metrics.increment('uvr_pipeline_runs_failed_total')
+        run_registry.finish_run(run, Run.FAILED, events=[event for _, event in progress.read_events(run.run_id)])
+        raise
+    finally:
+        run_registry.archive_profile(os.path.join(uvr_filepath, 'profile'), run.run_id)
+    events = [event for _, event in progress.read_events(run.run_id)]
+    metrics.observe('uvr_pipeline_run_duration_seconds', time.monotonic() - start)
+    metrics.record_pipeline_stage_durations(events)
+    print('User Verification Log:')
+    print(log.decode('utf-8'))
+    # build the archive under a temporary name and swap it in, the previous output may be hard linked into the run archive
+    temp_archive_filepath = os.path.join('media', 'downloadable_resources', f'{month}_{year}_UVR_Output_{run.run_id}.zip')
+    archive_reports(os.path.join(uvr_filepath, 'processed_files'), temp_archive_filepath)
+    os.replace(temp_archive_filepath, output_filepath)
+    run_cache.store_output(run.input_fingerprint, output_filepath)
+    run_registry.finish_run(run, Run.FINISHED, output_filepath, events)
+    start_account_indexing(run)
+    progress.record_event(run.run_id, 'run_finished')
+
+
+def summarize_reports(uvr_filepath, month, year):
+    # row counts, accounts per region, IT-AMS Access distribution and missing ids of the reports the workspace's files
+    # would produce, printed as json on the last line
+    output = subprocess.check_output(
+        get_report_command(uvr_filepath, month, year, summary=True), env=dict(os.environ, **get_pipeline_options()),
+        stderr=subprocess.PIPE, timeout=SUMMARY_TIMEOUT
+    )
+    return json.loads(output.splitlines()[-1])
+
+
+def run_report_script(command, env, run_id, heartbeat=None, heartbeat_interval=None):
+    process = start_report_script(command, env, subprocess.PIPE)
+    start = time.monotonic()
+    last_heartbeat = start
+    while True:
+        try:
+            log, _ = process.communicate(timeout=STOP_CHECK_INTERVAL)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+        stopped = check_run_limits(run_id, start)
+        if stopped is not None:
+            stop_process(process)
+            raise stopped
+        if heartbeat is not None and time.monotonic() - last_heartbeat >= heartbeat_interval:
+            last_heartbeat = time.monotonic()
+            if not heartbeat():
+                stop_process(process)
+                raise LeaseLost()
+    if process.returncode == -getattr(signal, 'SIGXCPU', 0):
+        raise RunStopped(Run.TIMED_OUT, f'The run used more than {settings.UVR_RUN_CPU_SECONDS} seconds of CPU time')
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command, log)
+    return log
+
+
+def start_report_script(command, env, stdout):
+    # the script runs in its own process group, so stopping it also stops anything it started
+    return subprocess.Popen(limit_command(command), env=env, stdout=stdout, start_new_session=True)
+
+
+def check_run_limits(run_id, start):
+    # RunStopped once run `run_id` was cancelled or is past its deadline, otherwise None
+    if run_registry.is_cancellation_requested(run_id):
+        return RunStopped(Run.CANCELLED, 'The run was cancelled')
+    if time.monotonic() - start > settings.UVR_RUN_TIMEOUT_SECONDS:
+        return RunStopped(Run.TIMED_OUT, f'The run took longer than {settings.UVR_RUN_TIMEOUT_SECONDS} seconds')
+    return None
+
+
+def limit_command(command):
+    # a huge or corrupt upload can't take more than its share of CPU time and memory, the script is stopped with
+    # SIGXCPU or fails with a MemoryError instead. The limits are set by a small python process that then execs the
+    # script in its place, so the script never runs without them. The memory limit is on the heap and other private
+    # memory (RLIMIT_DATA), not on the address space, which the libraries reserve far more of than they use
+    if resource is None:
+        return command
+    limits = [settings.UVR_RUN_CPU_SECONDS, STOP_GRACE_SECONDS, settings.UVR_RUN_MEMORY_BYTES]
+    return [get_python_executable(), '-c', LIMIT_WRAPPER] + [str(limit) for limit in limits] + command
+
+
+def stop_process(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.communicate(timeout=STOP_GRACE_SECONDS)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.communicate()
+
+
+def get_python_executable():
+    python_executable = sys.executable
+    if 'uwsgi' in sys.executable:
+        with open('hses_automation_app_uwsgi.ini', 'r') as conf:
+            for line in conf.readlines():
+                if re.search(r'home\s*=', line):
+                    python_executable = os.path.join(line.replace('home', '', 1).replace('=', '').strip(), 'bin', 'python')
+    return python_executable
+
+
+def get_report_command(uvr_filepath, month, year, profile=False, summary=False):
+    return [get_python_executable(), os.path.join('scripts', 'auto_user_verif.py')] + (['--profile'] if profile else []) + (['--summary'] if summary else []) + [uvr_filepath, month, str(year)]
+
+
+def start_account_indexing(run):
+    # queues the run's reports for the account index used by lookup_account. Reading every report takes a while, so an
+    # indexer process adds them and the run doesn't wait for it. Only one indexer runs at a time, a running one also
+    # takes this run. The outcome is the run's index_status, if it failed the reports are fine and
+    # `python manage.py uvr_index_accounts --run-id` indexes them again
+    Run.objects.filter(pk=run.pk).update(index_status=Run.INDEX_PENDING, index_error='')
+    if account_index.is_indexer_running():
+        return
+    process = subprocess.Popen([get_python_executable(), 'manage.py', 'uvr_index_accounts', '--pending'], stdout=subprocess.DEVNULL, start_new_session=True)
+    # waited for, so it doesn't stay behind as a zombie of this process once it exits
+    threading.Thread(target=process.wait, daemon=True).start()
+
+
+def get_report_env(progress_filepath, incremental=True):
+    return dict(
+        os.environ, UVR_PROGRESS_FILE=os.path.abspath(progress_filepath), UVR_INCREMENTAL='1' if incremental else '0',
+        UVR_TEMPLATE_CACHE_DIR=get_template_cache_filepath(), **get_pipeline_options()
+    )
+
+
+def get_template_cache_filepath():
+    # the report template the script builds once per version, see get_report_template in scripts/auto_user_verif.py
+    return os.path.abspath(os.path.join(settings.UVR_STATE_DIR, 'report_templates'))
+
+
+def get_pipeline_options():
+    # the pipeline options in the settings, see "Pipeline options" in the README
+    return {'UVR_REGIONAL_FROM_RGNALL': '1' if settings.UVR_REGIONAL_FROM_RGNALL else '0'}
+
+
+def archive_reports(processed_files_filepath, archive_filepath):
+    # like shutil.make_archive, but leaves out the pipeline's hidden stage manifest
+    os.makedirs(os.path.dirname(archive_filepath), exist_ok=True)
+    with ZipFile(archive_filepath, 'w', ZIP_DEFLATED) as archive:
+        for filename in sorted(os.listdir(processed_files_filepath)):
+            if not filename.startswith('.'):
+                archive.write(os.path.join(processed_files_filepath, filename), filename)
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+
+from django.conf import settings
+
+from .models import Run
+
+# events the pipeline script and run_reports append to a run's progress file
+RUN_FINISHED_EVENTS = ['run_finished', 'run_failed']
+POLL_INTERVAL = 0.25
+# a run is stopped UVR_RUN_TIMEOUT_SECONDS after it started, give it this long on top to record that it stopped
+STALE_RUN_GRACE_SECONDS = 60
+
+
+def get_progress_filepath(run_id):
+    return os.path.join(settings.UVR_STATE_DIR, 'progress', f'{run_id}.jsonl')
+
+
+def get_latest_run_filepath(year, month):
+    return os.path.join(settings.UVR_STATE_DIR, 'progress', f'{month}_{year}.latest')
+
+
+def start_run(year, month, run_id):
+    # every run has its own progress file, so runs for the same month can't mix up or cut off each other's events
+    progress_filepath = get_progress_filepath(run_id)
+    os.makedirs(os.path.dirname(progress_filepath), exist_ok=True)
+    with open(progress_filepath, 'w') as progress_file:
+        progress_file.write(json.dumps({'event': 'run_started', 'time': time.time(), 'run_id': run_id, 'month': month, 'year': year}) + '\n')
+    # the month's status is the one of its latest run, see get_run_status
+    latest_run_filepath = get_latest_run_filepath(year, month)
+    with open(f'{latest_run_filepath}.{run_id}', 'w') as latest_run_file:
+        latest_run_file.write(run_id)
+    os.replace(f'{latest_run_filepath}.{run_id}', latest_run_filepath)
+    return progress_filepath
+
+
+def get_latest_run_id(year, month):
+    try:
+        with open(get_latest_run_filepath(year, month)) as latest_run_file:
+            return latest_run_file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def remove_expired_progress_files(retention_days):
+    # like the workspaces, see pipeline.remove_expired_workspaces. The run registry keeps the stages and row counts
+    progress_folder = os.path.dirname(get_progress_filepath(''))
+    if not os.path.isdir(progress_folder):
+        return
+    expired = time.time() - retention_days * 24 * 60 * 60
+    for filename in os.listdir(progress_folder):
+        try:
+            if os.path.getmtime(os.path.join(progress_folder, filename)) < expired:
+                os.remove(os.path.join(progress_folder, filename))
+        except FileNotFoundError:
+            pass # removed by another process
+
+
+def record_event(run_id, event, **data):
+    with open(get_progress_filepath(run_id), 'a') as progress_file:
+        progress_file.write(json.dumps({'event': event, 'time': time.time(), **data}) + '\n')
+
+
+# returns [end offset, event] pairs for the events written after byte `offset` of the run's progress file
+def read_events(run_id, offset=0):
+    events = []
+    try:
+        with open(get_progress_filepath(run_id), 'rb') as progress_file:
+            progress_file.seek(offset)
+            for line in progress_file:
+                if not line.endswith(b'\n'):
+                    break # still being written, it will be picked up on the next read
+                offset += len(line)
+                events.append([offset, json.loads(line)])
+    except FileNotFoundError:
+        pass
+    return events
+
+
+# waits up to `timeout` seconds for events of run `run_id` after byte `offset`
+# only the file size is checked between reads, so waiting on an idle run costs a stat call per poll
+def wait_for_events(run_id, offset=0, timeout=0):
+    progress_filepath = get_progress_filepath(run_id)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            size = os.path.getsize(progress_filepath)
+        except FileNotFoundError:
+            size = 0 # the run has not started yet
+        if size > offset:
+            events = read_events(run_id, offset)
+            if events:
+                return events
+        if time.monotonic() >= deadline:
+            return []
+        time.sleep(POLL_INTERVAL)
+
+
+def get_run_status(year, month):
+    # of the month's latest run
+    run_id = get_latest_run_id(year, month)
+    events = read_events(run_id) if run_id else []
+    if not events:
+        return {'status': 'idle'}
+    run_status = {'status': 'running', 'run_id': run_id, 'stage': None, 'errors': []}
+    for _, event in events:
+        if event['event'] == 'run_queued':
+            run_status['status'] = 'queued' # waiting for a uvr_worker
+        elif event['event'] == 'stage_started':
+            run_status['status'] = 'running'
+            run_status['stage'] = event['stage']
+        elif event['event'] in ['error', 'stage_failed', 'run_failed']:
+            run_status['errors'].append(event.get('message') or event.get('error'))
+        if event['event'] == 'run_finished':
+            run_status['status'] = 'finished'
+        elif event['event'] == 'run_failed':
+            run_status['status'] = event.get('status', 'failed') # or cancelled or timed_out
+    if run_status['status'] in ['queued', 'running']:
+        check_stale_run(run_status, events[-1][1]['time'])
+    return run_status
+
+
+def check_stale_run(run_status, last_event_time):
+    # a run whose process died (e.g. a restarted uwsgi worker) never records run_finished or run_failed, the run
+    # registry has how it ended, and a run that is past its deadline can't be running anymore
+    run = Run.objects.filter(run_id=run_status['run_id']).first() if run_status['run_id'] else None
+    if run is not None and run.status not in [Run.QUEUED, Run.RUNNING]:
+        run_status['status'] = 'finished' if run.status == Run.CACHED else run.status
+    elif run_status['status'] == 'running' and time.time() - last_event_time > settings.UVR_RUN_TIMEOUT_SECONDS + STALE_RUN_GRACE_SECONDS:
+        run_status['status'] = 'failed'
+        run_status['errors'].append('The run stopped without finishing')
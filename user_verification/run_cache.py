@@ -0,0 +1,98 @@
+import os
+import glob
+import shutil
+import hashlib
+
+from django.conf import settings
+
+HASH_CHUNK_SIZE = 1024 * 1024
+_pipeline_version = None
+
+
+def get_pipeline_version():
+    # hash of the report scripts, so cached outputs are invalidated whenever the pipeline code changes
+    global _pipeline_version
+    if _pipeline_version is None:
+        digest = hashlib.sha256()
+        for script in sorted(glob.glob(os.path.join(settings.BASE_DIR, 'scripts', '*.py'))):
+            with open(script, 'rb') as f:
+                digest.update(f.read())
+        _pipeline_version = digest.hexdigest()
+    return _pipeline_version
+
+
+def hash_file(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_input_hashes(input_folder):
+    input_hashes = {}
+    for filename in sorted(os.listdir(input_folder)):
+        filepath = os.path.join(input_folder, filename)
+        if os.path.isfile(filepath):
+            input_hashes[filename] = hash_file(filepath)
+    return input_hashes
+
+
+def get_input_fingerprint(input_hashes, month, year):
+    # output filenames are derived from the input filenames, so names are part of the fingerprint as well as contents
+    digest = hashlib.sha256(f'{get_pipeline_version()}|{month}|{year}'.encode())
+    if settings.UVR_REGIONAL_FROM_RGNALL:
+        digest.update(b'|regional_from_rgnall')
+    for filename, file_hash in sorted(input_hashes.items()):
+        digest.update(f'|{filename}|{file_hash}'.encode())
+    return digest.hexdigest()
+
+
+def get_cached_output_filepath(fingerprint):
+    return os.path.join(settings.UVR_STATE_DIR, 'run_cache', f'{fingerprint}.zip')
+
+
+def fetch_cached_output(fingerprint, output_filepath):
+    cached_filepath = get_cached_output_filepath(fingerprint)
+    if not os.path.isfile(cached_filepath):
+        return False
+    os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+    # replace rather than overwrite output_filepath, older versions of it may be hard linked into the run archive
+    temp_filepath = f'{output_filepath}.{os.getpid()}.tmp'
+    try:
+        shutil.copyfile(cached_filepath, temp_filepath)
+    except FileNotFoundError:
+        return False # evicted by another process in the meantime
+    os.replace(temp_filepath, output_filepath)
+    os.utime(cached_filepath) # mark as recently used for eviction
+    return True
+
+
+def store_output(fingerprint, output_filepath):
+    cached_filepath = get_cached_output_filepath(fingerprint)
+    os.makedirs(os.path.dirname(cached_filepath), exist_ok=True)
+    # copy under a temporary name first so a concurrent lookup never sees a partially written archive
+    temp_filepath = f'{cached_filepath}.{os.getpid()}.tmp'
+    shutil.copyfile(output_filepath, temp_filepath)
+    os.replace(temp_filepath, cached_filepath)
+    evict_least_recently_used(settings.UVR_RUN_CACHE_MAX_BYTES)
+
+
+def evict_least_recently_used(max_bytes):
+    cached_files = []
+    for filepath in glob.glob(os.path.join(settings.UVR_STATE_DIR, 'run_cache', '*.zip')):
+        try:
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            continue # evicted by another process
+        cached_files.append([stat.st_mtime, stat.st_size, filepath])
+    cached_files.sort()
+    total_bytes = sum(size for _, size, _ in cached_files)
+    for _, size, filepath in cached_files:
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
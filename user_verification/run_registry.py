@@ -0,0 +1,176 @@
+import os
+import re
+import shutil
+import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import DateTimeField, ExpressionWrapper, Max, Sum
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .models import Run, WorkspaceLock
+
+# run ids end up in file paths (archives, profiles, cancellation markers), only plain ids are accepted from clients
+RUN_ID_PATTERN = re.compile(r'[0-9a-z]{1,64}')
+
+
+def is_valid_run_id(run_id):
+    return bool(RUN_ID_PATTERN.fullmatch(run_id))
+
+
+def get_archive_filepath(run):
+    return os.path.join(settings.UVR_STATE_DIR, 'run_archive', f'{run.month}_{run.year}_{run.run_id}.zip')
+
+
+def get_profile_filepath(run_id):
+    return os.path.join(settings.UVR_STATE_DIR, 'run_profiles', f'{run_id}.zip')
+
+
+def archive_profile(profile_folder, run_id):
+    # profiles of runs started with profile=1 by an admin, see scripts/run_profiler.py
+    if not os.path.isdir(profile_folder):
+        return
+    profile_filepath = get_profile_filepath(run_id)
+    os.makedirs(os.path.dirname(profile_filepath), exist_ok=True)
+    shutil.make_archive(os.path.splitext(profile_filepath)[0], 'zip', profile_folder)
+    shutil.rmtree(profile_folder)
+
+
+def get_cancellation_filepath(run_id):
+    return os.path.join(settings.UVR_STATE_DIR, 'run_cancellations', run_id)
+
+
+def request_cancellation(run_id):
+    # a file rather than a database row, the process running the reports checks for it every second
+    cancellation_filepath = get_cancellation_filepath(run_id)
+    os.makedirs(os.path.dirname(cancellation_filepath), exist_ok=True)
+    open(cancellation_filepath, 'w').close()
+
+
+def is_cancellation_requested(run_id):
+    return os.path.exists(get_cancellation_filepath(run_id))
+
+
+def get_ingest_filepath(run_id):
+    return os.path.join(settings.UVR_STATE_DIR, 'run_ingests', run_id)
+
+
+def start_ingest(run_id):
+    # a streamed upload runs stages before its run has a Run row, the marker lets cancel_run stop them
+    ingest_filepath = get_ingest_filepath(run_id)
+    os.makedirs(os.path.dirname(ingest_filepath), exist_ok=True)
+    open(ingest_filepath, 'w').close()
+
+
+def finish_ingest(run_id):
+    # a cancellation of an upload that didn't start a run (summary_only, or stopped before) would otherwise stop the
+    # next run with the same run_id
+    for filepath in [get_ingest_filepath(run_id)] + ([get_cancellation_filepath(run_id)] if not Run.objects.filter(run_id=run_id).exists() else []):
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
+
+
+def is_ingesting(run_id):
+    return os.path.exists(get_ingest_filepath(run_id))
+
+
+def get_database_time(seconds=0):
+    # the database's clock `seconds` from now, for the expiry of locks and leases and the comparisons with them. The
+    # processes that share them can run on several hosts, whose clocks don't agree to the second
+    return ExpressionWrapper(Now() + datetime.timedelta(seconds=seconds), output_field=DateTimeField())
+
+
+def lock_workspace(month, year, run_id):
+    # only one upload at a time changes a month's workspace, and it keeps the lock while its run reads the files, so
+    # the input fingerprint of a run is the one of the files it processed. A database row, so it holds across hosts.
+    # The upload and the run each have UVR_RUN_TIMEOUT_SECONDS, a holder that died loses the lock after both
+    expires_at = get_database_time(2 * settings.UVR_RUN_TIMEOUT_SECONDS + 60)
+    try:
+        with transaction.atomic():
+            WorkspaceLock.objects.create(month=month, year=year, run_id=run_id, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        return bool(WorkspaceLock.objects.filter(month=month, year=year, expires_at__lt=Now()).update(run_id=run_id, expires_at=expires_at))
+
+
+def unlock_workspace(month, year, run_id):
+    WorkspaceLock.objects.filter(month=month, year=year, run_id=run_id).delete()
+
+
+def start_run(run_id, month, year, input_hashes, input_fingerprint):
+    return Run.objects.create(run_id=run_id, month=month, year=year, input_hashes=input_hashes, input_fingerprint=input_fingerprint)
+
+
+def finish_run(run, status, output_filepath=None, events=()):
+    run.status = status
+    run.finished_at = timezone.now()
+    run.duration = (run.finished_at - run.started_at).total_seconds()
+    for event in events:
+        if event['event'] == 'stage_started':
+            run.stage = event['stage']
+        elif event['event'] == 'stage_finished':
+            run.stage_durations[event['stage']] = event['duration']
+        elif event['event'] == 'report_finished':
+            run.row_counts[event['report']] = event['rows']
+    if output_filepath:
+        archive_filepath = get_archive_filepath(run)
+        os.makedirs(os.path.dirname(archive_filepath), exist_ok=True)
+        try:
+            # the next run for the same month replaces output_filepath, so a hard link keeps this version without a copy
+            os.link(output_filepath, archive_filepath)
+        except OSError:
+            shutil.copyfile(output_filepath, archive_filepath)
+        run.output_path = archive_filepath
+        run.output_size = os.path.getsize(archive_filepath)
+    run.save()
+    try:
+        os.remove(get_cancellation_filepath(run.run_id))
+    except FileNotFoundError:
+        pass
+    if output_filepath:
+        evict_archived_outputs(settings.UVR_RUN_ARCHIVE_MAX_BYTES)
+
+
+def evict_archived_outputs(max_bytes):
+    archived_runs = Run.objects.exclude(output_path='')
+    total_bytes = archived_runs.aggregate(total=Sum('output_size'))['total'] or 0
+    if total_bytes <= max_bytes:
+        return
+    latest_per_month = archived_runs.order_by().values('year', 'month').annotate(latest=Max('started_at'))
+    protected = {(latest['year'], latest['month'], latest['latest']) for latest in latest_per_month}
+    for run in archived_runs.order_by('started_at'):
+        if total_bytes <= max_bytes:
+            break
+        if (run.year, run.month, run.started_at) in protected:
+            continue
+        try:
+            os.remove(run.output_path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= run.output_size
+        run.output_path = ''
+        run.save(update_fields=['output_path'])
+
+
+def serialize_run(run):
+    return {
+        'run_id': run.run_id,
+        'month': run.month,
+        'year': run.year,
+        'status': run.status,
+        'input_hashes': run.input_hashes,
+        'started_at': run.started_at.isoformat(),
+        'finished_at': run.finished_at.isoformat() if run.finished_at else None,
+        'duration': run.duration,
+        'stage': run.stage,
+        'stage_durations': run.stage_durations,
+        'row_counts': run.row_counts,
+        'output_available': bool(run.output_path),
+        'output_size': run.output_size,
+        'profile_available': os.path.isfile(get_profile_filepath(run.run_id)),
+        'index_status': run.index_status,
+        'index_error': run.index_error,
+    }
@@ -1,3 +1,749 @@
-from django.test import TestCase
+import io
+import os
+import sys
+import json
+import tempfile
+import unittest
+import importlib.util
+import glob
+import time
+import datetime
+import shutil
+import subprocess
+from unittest import mock
 
-# Create your tests here.
+from zipfile import ZipFile
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+
+SCRIPTS_DIR = os.path.join(settings.BASE_DIR, 'scripts')
+# seconds from starting auto_user_verif.py to its first stage on a run without changes, on top of the time the
+# interpreter itself takes to start on this machine. Wall-clock times depend on the machine, so the benchmark only runs
+# when a budget is set
+STARTUP_BUDGET_SECONDS = os.environ.get('UVR_STARTUP_BUDGET_SECONDS')
+sys.path.insert(0, SCRIPTS_DIR)
+from generate_synthetic_uvr_files import generate_input_files
+
+from . import account_index, ingest, job_queue, metrics, pipeline, progress, run_cache, run_registry, views
+from .models import AccountIndexerLock, IndexedAccount, Job, Run
+
+
+class StateDirTestMixin:
+    # every test gets its own UVR_STATE_DIR (progress files, archives, markers, metrics), plus the settings in
+    # state_settings
+    state_settings = {}
+
+    def setUp(self):
+        super().setUp()
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        self.state_dir = state_dir.name
+        settings_override = override_settings(UVR_STATE_DIR=state_dir.name, **self.state_settings)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+def run_report_script(input_folder, dataframe_backend, **options):
+    subprocess.check_output(
+        [sys.executable, os.path.join(SCRIPTS_DIR, 'auto_user_verif.py'), input_folder, 'Nov', '2026'],
+        env=dict(os.environ, UVR_DATAFRAME_BACKEND=dataframe_backend, **options)
+    )
+    output = {}
+    output_folder = os.path.join(input_folder, 'processed_files')
+    for filename in sorted(os.listdir(output_folder)):
+        if filename.startswith('.'):
+            continue # stage manifest
+        wb = load_workbook(os.path.join(output_folder, filename))
+        output[filename] = {ws.title: [[cell.value for cell in row] for row in ws.iter_rows()] for ws in wb.worksheets}
+    return output
+
+
+@unittest.skipUnless(importlib.util.find_spec('polars') and importlib.util.find_spec('pyarrow'), 'polars backend not installed')
+class DataFrameBackendParityTest(SimpleTestCase):
+    def test_polars_backend_matches_pandas_backend(self):
+        with tempfile.TemporaryDirectory() as input_folder:
+            generate_input_files(input_folder, number_of_accounts=200, seed=7)
+            pandas_output = run_report_script(input_folder, 'pandas')
+            polars_output = run_report_script(input_folder, 'polars')
+        self.assertEqual(len(pandas_output), 17)
+        self.assertEqual(list(pandas_output), list(polars_output))
+        for filename in pandas_output:
+            self.assertEqual(pandas_output[filename], polars_output[filename], filename)
+
+
+class StreamingRgnAllTest(SimpleTestCase):
+    def test_streamed_rgnall_matches_eager_read(self):
+        with tempfile.TemporaryDirectory() as input_folder:
+            generate_input_files(input_folder, number_of_accounts=200, seed=7)
+            eager_output = run_report_script(input_folder, 'pandas')
+            # a chunk size that doesn't divide the rows, so the last chunk is partial
+            streamed_output = run_report_script(input_folder, 'pandas', UVR_STREAM_RGNALL='1', UVR_STREAM_CHUNK_ROWS='37')
+        self.assertEqual(list(eager_output), list(streamed_output))
+        for filename in eager_output:
+            self.assertEqual(eager_output[filename], streamed_output[filename], filename)
+
+
+class IncrementalRunTest(SimpleTestCase):
+    def test_changed_regional_file_only_rebuilds_its_report(self):
+        with tempfile.TemporaryDirectory() as input_folder, tempfile.TemporaryDirectory() as full_run_folder:
+            generate_input_files(input_folder, number_of_accounts=200, seed=7)
+            run_report_script(input_folder, 'pandas', UVR_INCREMENTAL='1')
+            [regional_filepath] = glob.glob(os.path.join(input_folder, 'Rgn05 HSES Accounts*.xlsx'))
+            wb = load_workbook(regional_filepath)
+            wb.worksheets[0]['E2'] = 'Changed Title'
+            wb.save(regional_filepath)
+            progress_filepath = os.path.join(full_run_folder, 'progress.jsonl')
+            incremental_output = run_report_script(input_folder, 'pandas', UVR_INCREMENTAL='1', UVR_PROGRESS_FILE=progress_filepath)
+            with open(progress_filepath) as progress_file:
+                events = [json.loads(line) for line in progress_file]
+            for filename in os.listdir(input_folder):
+                if filename.endswith('.xlsx'):
+                    shutil.copy(os.path.join(input_folder, filename), full_run_folder)
+            full_output = run_report_script(full_run_folder, 'pandas')
+        self.assertEqual([event['report'] for event in events if event['event'] == 'report_finished'], ['Rgn05 HSES Accounts_Nov-2026.xlsx'])
+        self.assertIn('Changed Title', [row[4] for row in incremental_output['Rgn05 HSES Accounts_Nov-2026.xlsx']['HSES Accounts'][1:]])
+        self.assertEqual(list(incremental_output), list(full_output))
+        for filename in full_output:
+            self.assertEqual(incremental_output[filename], full_output[filename], filename)
+
+
+class ReportSummaryTest(SimpleTestCase):
+    def test_summary_matches_generated_reports(self):
+        with tempfile.TemporaryDirectory() as input_folder:
+            generate_input_files(input_folder, number_of_accounts=200, seed=7)
+            summary = json.loads(subprocess.check_output(
+                [sys.executable, os.path.join(SCRIPTS_DIR, 'auto_user_verif.py'), '--summary', input_folder, 'Nov', '2026']
+            ))
+            output = run_report_script(input_folder, 'pandas')
+        self.assertEqual(summary['missing_files'], [])
+        self.assertEqual(sorted(summary['reports']), sorted(output))
+        for filename, sheets in output.items():
+            sheet_rows = [len(rows) - 1 for rows in sheets.values()]
+            if 'Monitoring' in filename:
+                self.assertEqual(summary['reports'][filename]['rows'], sum(sheet_rows), filename)
+                reviewer_rows = sheets['Verify Reviewer Accounts']
+                monitoring_ids = [row[reviewer_rows[0].index('Monitoring System ID Linked for Reviews')] for row in reviewer_rows[1:]]
+                self.assertEqual(summary['reports'][filename]['missing_monitoring_id'], monitoring_ids.count(None))
+            else:
+                self.assertEqual(summary['reports'][filename]['rows'], sheet_rows[0], filename)
+
+
+class RegionalFromRgnAllTest(SimpleTestCase):
+    def test_regional_reports_derived_from_rgnall_match_uploaded_ones(self):
+        with tempfile.TemporaryDirectory() as input_folder:
+            generate_input_files(input_folder, number_of_accounts=200, seed=7)
+            uploaded_output = run_report_script(input_folder, 'pandas')
+            derived_output = run_report_script(input_folder, 'pandas', UVR_REGIONAL_FROM_RGNALL='1')
+            for filepath in glob.glob(os.path.join(input_folder, 'Rgn[0-9][0-9]*')):
+                os.remove(filepath)
+            derived_only_output = run_report_script(input_folder, 'pandas', UVR_REGIONAL_FROM_RGNALL='1')
+        # the synthetic regional files are exactly the RgnAll accounts of their region
+        self.assertEqual(derived_output.pop('Regional File Discrepancies_Nov-2026.xlsx'), {'Discrepancies': [
+            ['Regional Report', 'Region', 'First Name', 'Last Name', 'Email', 'Title', 'Roles', 'Discrepancy']
+        ]})
+        self.assertEqual(uploaded_output, derived_output)
+        self.assertEqual(list(uploaded_output), list(derived_only_output))
+        for region in range(1, 13):
+            filename = f'Rgn{region:02d} HSES Accounts_Nov-2026.xlsx'
+            self.assertEqual(list(derived_only_output[filename].values())[0], list(uploaded_output[filename].values())[0], filename)
+
+
+class ReportTemplateTest(SimpleTestCase):
+    def test_reports_without_accounts_are_written(self):
+        with tempfile.TemporaryDirectory() as input_folder:
+            # too few accounts for every region, some regional reports only have their header row
+            generate_input_files(input_folder, number_of_accounts=50, seed=7)
+            output = run_report_script(input_folder, 'pandas')
+            wb = load_workbook(os.path.join(input_folder, 'processed_files', 'HSES OGM Accounts_Nov-2026.xlsx'))
+        empty_reports = [filename for filename, sheets in output.items() if len(list(sheets.values())[0]) == 1]
+        self.assertTrue(empty_reports)
+        for filename in empty_reports:
+            self.assertEqual(list(output[filename])[-1], 'IT_AMS_Roles', filename)
+        self.assertEqual(wb.sheetnames, ['OGM HSES Accounts', 'IT_AMS_Roles'])
+        self.assertEqual(wb.active.title, 'OGM HSES Accounts')
+        ws = wb['OGM HSES Accounts']
+        self.assertTrue(ws['A1'].font.b)
+        self.assertEqual(ws['A1'].fill.fgColor.rgb, '00CCFFCC')
+        self.assertFalse(ws['A2'].font.b)
+        self.assertEqual(ws['A2'].border.left.style, 'thick')
+
+    def test_template_is_cached_in_a_private_folder(self):
+        with tempfile.TemporaryDirectory() as input_folder, tempfile.TemporaryDirectory() as state_dir:
+            generate_input_files(input_folder, number_of_accounts=50, seed=7)
+            cache_folder = os.path.join(state_dir, 'report_templates')
+            uncached_output = run_report_script(input_folder, 'pandas')
+            shutil.rmtree(os.path.join(input_folder, 'processed_files'))
+            cached_output = run_report_script(input_folder, 'pandas', UVR_TEMPLATE_CACHE_DIR=cache_folder)
+            [template_filename] = os.listdir(cache_folder)
+            template_mode = os.stat(os.path.join(cache_folder, template_filename)).st_mode & 0o777
+            folder_mode = os.stat(cache_folder).st_mode & 0o777
+        self.assertEqual(cached_output, uncached_output)
+        self.assertRegex(template_filename, r'^report_template_[0-9a-f]{16}\.xlsx$')
+        self.assertEqual([template_mode, folder_mode], [0o600, 0o700])
+
+
+class StartupBudgetTest(SimpleTestCase):
+    def run_report_script(self, *args, **options):
+        # returns [seconds from the start of the script to its first progress event, modules it imported]
+        with tempfile.TemporaryDirectory() as progress_folder:
+            progress_filepath = os.path.join(progress_folder, 'progress.jsonl')
+            start = time.time()
+            process = subprocess.run(
+                [sys.executable, '-X', 'importtime', os.path.join(SCRIPTS_DIR, 'auto_user_verif.py'), *args],
+                env=dict(os.environ, UVR_PROGRESS_FILE=progress_filepath, **options), stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            events = []
+            if os.path.isfile(progress_filepath):
+                with open(progress_filepath) as progress_file:
+                    events = [json.loads(line) for line in progress_file]
+        imported_modules = [line.split('|')[-1].strip() for line in process.stderr.decode().splitlines() if line.startswith('import time:')]
+        return [events[0]['time'] - start if events else None, imported_modules]
+
+    def get_interpreter_startup(self):
+        # the baseline: seconds until a script that imports nothing prints the time
+        start = time.time()
+        output = subprocess.check_output([sys.executable, '-X', 'importtime', '-c', 'import time; print(time.time())'], stderr=subprocess.DEVNULL)
+        return float(output) - start
+
+    def test_usage_errors_do_not_import_the_libraries(self):
+        [_, imported_modules] = self.run_report_script(os.path.join(SCRIPTS_DIR, 'missing_folder'))
+        self.assertEqual({'pandas', 'openpyxl'} & set(imported_modules), set())
+
+    def test_unchanged_run_does_not_import_the_libraries(self):
+        with tempfile.TemporaryDirectory() as input_folder:
+            generate_input_files(input_folder, number_of_accounts=200, seed=7)
+            self.run_report_script(input_folder, 'Nov', '2026', UVR_INCREMENTAL='1')
+            [startup_seconds, imported_modules] = self.run_report_script(input_folder, 'Nov', '2026', UVR_INCREMENTAL='1')
+        self.assertIsNotNone(startup_seconds)
+        self.assertEqual({'pandas', 'openpyxl'} & set(imported_modules), set())
+
+    @unittest.skipUnless(STARTUP_BUDGET_SECONDS, 'set UVR_STARTUP_BUDGET_SECONDS to benchmark the startup')
+    def test_unchanged_run_starts_within_budget(self):
+        with tempfile.TemporaryDirectory() as input_folder:
+            generate_input_files(input_folder, number_of_accounts=200, seed=7)
+            self.run_report_script(input_folder, 'Nov', '2026', UVR_INCREMENTAL='1')
+            # the fastest of a few attempts, a busy machine slows down single ones
+            attempts = [self.run_report_script(input_folder, 'Nov', '2026', UVR_INCREMENTAL='1') for _ in range(3)]
+        baseline_seconds = min(self.get_interpreter_startup() for _ in range(3))
+        startup_seconds = min(startup_seconds for [startup_seconds, _] in attempts)
+        self.assertLess(startup_seconds - baseline_seconds, float(STARTUP_BUDGET_SECONDS))
+
+
+class StaticFilesTest(SimpleTestCase):
+    def setUp(self):
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        for filename, content in [['index-bundle.0123456789ab.js', b'bundle'], ['index-bundle.0123456789ab.js.gz', b'gzip'], ['index-bundle.0123456789ab.js.br', b'brotli'], ['index-bundle.js', b'bundle']]:
+            with open(os.path.join(static_root.name, filename), 'wb') as f:
+                f.write(content)
+        settings_override = override_settings(STATIC_ROOT=static_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get_static_file(self, path, **headers):
+        response = self.client.get(f'/static/{path}', **headers)
+        content = b''.join(response.streaming_content) if response.status_code == 200 else b''
+        return [response, content]
+
+    def test_best_accepted_variant_is_served(self):
+        for accept_encoding, [encoding, content] in [
+            ['gzip, deflate, br', ['br', b'brotli']],
+            ['gzip, br;q=0', ['gzip', b'gzip']],
+            ['gzip;q=0.0, br; q=0', [None, b'bundle']],
+            ['', [None, b'bundle']],
+        ]:
+            [response, response_content] = self.get_static_file('index-bundle.0123456789ab.js', HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertEqual([response.get('Content-Encoding'), response_content], [encoding, content], accept_encoding)
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_only_fingerprinted_files_are_immutable(self):
+        [response, _] = self.get_static_file('index-bundle.0123456789ab.js')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        [response, _] = self.get_static_file('index-bundle.js')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        [response, _] = self.get_static_file('index-bundle.js', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual([response.status_code, response['Cache-Control']], [304, 'public, max-age=3600'])
+        [response, _] = self.get_static_file('missing.js')
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_works_before_collectstatic(self):
+        with tempfile.TemporaryDirectory() as static_root, override_settings(STATIC_ROOT=static_root):
+            response = self.client.get('/user_verification/')
+            self.assertContains(response, '/static/index-bundle.js')
+            [response, _] = self.get_static_file('images/logo.png')
+            self.assertEqual(response.status_code, 200)
+
+
+class BatchModeTest(SimpleTestCase):
+    def test_batch_runs_every_entry_and_reports_failures(self):
+        with tempfile.TemporaryDirectory() as batch_folder:
+            input_folder = os.path.join(batch_folder, 'Nov')
+            generate_input_files(input_folder, number_of_accounts=50, seed=7)
+            manifest_filepath = os.path.join(batch_folder, 'manifest.json')
+            with open(manifest_filepath, 'w') as manifest_file:
+                json.dump([{'folder': input_folder, 'month': 'Nov', 'year': 2026}, {'folder': os.path.join(batch_folder, 'missing'), 'month': 'Dec', 'year': 2026}], manifest_file)
+            subprocess.check_output([sys.executable, os.path.join(SCRIPTS_DIR, 'auto_user_verif.py'), '--batch', manifest_filepath])
+            with open(os.path.join(batch_folder, 'manifest_summary.json')) as summary_file:
+                summary = json.load(summary_file)
+            reports = sorted(filename for filename in os.listdir(os.path.join(input_folder, 'processed_files')) if not filename.startswith('.'))
+        self.assertEqual([summary['succeeded'], summary['failed']], [1, 1])
+        [finished, failed] = summary['runs']
+        self.assertEqual([finished['status'], finished['monthyear'], sorted(finished['reports'])], ['finished', 'Nov-2026', reports])
+        self.assertEqual(len(reports), 17)
+        self.assertEqual(failed['status'], 'failed')
+        self.assertIn('FileNotFoundError', failed['error'])
+
+
+class LoadTestSummaryTest(SimpleTestCase):
+    def test_workers_without_samples_are_summarized(self):
+        import argparse
+        import load_test
+        args = argparse.Namespace(concurrency=2, iterations=1, same_month=False, unique_inputs=False, server=None)
+        worker_results = [
+            {'pid': 1, 'month': 'Jan', 'samples': [], 'peak_rss_kb': 100, 'peak_children_rss_kb': 0},
+            {'pid': 2, 'month': 'Feb', 'samples': [['run_reports', 2.0, 200], ['run_reports', 0.5, 409], ['get_run_progress', 0.1, None]], 'peak_rss_kb': 200, 'peak_children_rss_kb': 50}
+        ]
+        results = load_test.summarize(args, worker_results, 4.0)
+        self.assertEqual(sorted(results['endpoints']), ['get_run_progress', 'run_reports'])
+        self.assertEqual([results['endpoints']['run_reports'][key] for key in ['requests', 'errors', 'rejected']], [2, 0, 1])
+        self.assertEqual(results['endpoints']['get_run_progress']['errors'], 1)
+        self.assertEqual([results['requests'], results['throughput']], [3, 0.75])
+        results = load_test.summarize(args, worker_results[:1], 4.0)
+        self.assertEqual([results['requests'], results['endpoints'], results['error_rate']], [0, {}, 0])
+
+
+class RunCacheTest(StateDirTestMixin, TestCase):
+    def write_file(self, filepath, content, mtime=None):
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'w') as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(filepath, (mtime, mtime))
+        return filepath
+
+    def test_fingerprint_covers_file_names_contents_and_month(self):
+        with tempfile.TemporaryDirectory() as input_folder:
+            self.write_file(os.path.join(input_folder, 'RgnAll HSES Accounts.xlsx'), 'accounts')
+            input_hashes = run_cache.get_input_hashes(input_folder)
+            fingerprint = run_cache.get_input_fingerprint(input_hashes, 'Nov', 2026)
+            self.assertEqual(run_cache.get_input_fingerprint(run_cache.get_input_hashes(input_folder), 'Nov', 2026), fingerprint)
+            self.assertNotEqual(run_cache.get_input_fingerprint(input_hashes, 'Dec', 2026), fingerprint)
+            os.rename(os.path.join(input_folder, 'RgnAll HSES Accounts.xlsx'), os.path.join(input_folder, 'RgnAll HSES Accounts (1).xlsx'))
+            self.assertNotEqual(run_cache.get_input_fingerprint(run_cache.get_input_hashes(input_folder), 'Nov', 2026), fingerprint)
+            self.write_file(os.path.join(input_folder, 'RgnAll HSES Accounts (1).xlsx'), 'changed accounts')
+            os.rename(os.path.join(input_folder, 'RgnAll HSES Accounts (1).xlsx'), os.path.join(input_folder, 'RgnAll HSES Accounts.xlsx'))
+            self.assertNotEqual(run_cache.get_input_fingerprint(run_cache.get_input_hashes(input_folder), 'Nov', 2026), fingerprint)
+
+    def test_stored_output_is_fetched_for_the_same_fingerprint(self):
+        output_filepath = self.write_file(os.path.join(self.state_dir, 'output', 'Nov_2026_UVR_Output.zip'), 'reports')
+        self.assertFalse(run_cache.fetch_cached_output('fingerprint1', output_filepath))
+        run_cache.store_output('fingerprint1', output_filepath)
+        os.remove(output_filepath)
+        self.assertTrue(run_cache.fetch_cached_output('fingerprint1', output_filepath))
+        with open(output_filepath) as f:
+            self.assertEqual(f.read(), 'reports')
+        self.assertFalse(run_cache.fetch_cached_output('fingerprint2', output_filepath))
+
+    def test_least_recently_used_outputs_are_evicted(self):
+        now = time.time()
+        for age, fingerprint in enumerate(['fingerprint1', 'fingerprint2', 'fingerprint3']):
+            self.write_file(run_cache.get_cached_output_filepath(fingerprint), 'x' * 100, mtime=now - 100 * (age + 1))
+        # fetching an output marks it as used
+        run_cache.fetch_cached_output('fingerprint3', os.path.join(self.state_dir, 'output', 'output.zip'))
+        run_cache.evict_least_recently_used(200)
+        cached = sorted(os.path.basename(filepath) for filepath in glob.glob(os.path.join(self.state_dir, 'run_cache', '*.zip')))
+        self.assertEqual(cached, ['fingerprint1.zip', 'fingerprint3.zip'])
+
+    def test_archive_eviction_keeps_the_latest_run_of_every_month(self):
+        started_at = timezone.now()
+        for hours, [run_id, month] in enumerate([['run1', 'Nov'], ['run2', 'Nov'], ['run3', 'Dec'], ['run4', 'Nov']]):
+            run = run_registry.start_run(run_id, month, 2026, {}, run_id)
+            output_path = self.write_file(os.path.join(self.state_dir, 'run_archive', f'{run_id}.zip'), 'x' * 100)
+            Run.objects.filter(pk=run.pk).update(started_at=started_at + datetime.timedelta(hours=hours), output_path=output_path, output_size=100)
+        run_registry.evict_archived_outputs(300)
+        self.assertEqual(list(Run.objects.exclude(output_path='').order_by('run_id').values_list('run_id', flat=True)), ['run2', 'run3', 'run4'])
+        run_registry.evict_archived_outputs(0)
+        self.assertEqual(list(Run.objects.exclude(output_path='').order_by('run_id').values_list('run_id', flat=True)), ['run3', 'run4'])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.state_dir, 'run_archive'))), ['run3.zip', 'run4.zip'])
+
+
+class MetricsTest(StateDirTestMixin, TestCase):
+    def get_samples(self, prefix):
+        return [line for line in metrics.render().splitlines() if line.startswith(prefix)]
+
+    def test_histograms_have_every_bucket_in_order(self):
+        metrics.observe('uvr_pipeline_stage_duration_seconds', 3, stage='it_ams')
+        metrics.observe('uvr_pipeline_stage_duration_seconds', 45, stage='it_ams')
+        metrics.observe('uvr_pipeline_stage_duration_seconds', 700, stage='ogm')
+        samples = [sample for sample in self.get_samples('uvr_pipeline_stage_duration_seconds_bucket') if 'stage="it_ams"' in sample]
+        self.assertEqual([sample.split('le=')[1] for sample in samples], [f'"{bucket}",stage="it_ams"}} {0 if bucket < 5 else 1 if bucket < 60 else 2}' for bucket in metrics.PIPELINE_DURATION_BUCKETS] + ['"+Inf",stage="it_ams"} 2'])
+        self.assertEqual(self.get_samples('uvr_pipeline_stage_duration_seconds_bucket{le="+Inf",stage="ogm"}'), ['uvr_pipeline_stage_duration_seconds_bucket{le="+Inf",stage="ogm"} 1'])
+        self.assertEqual(self.get_samples('uvr_pipeline_stage_duration_seconds_count'), ['uvr_pipeline_stage_duration_seconds_count{stage="it_ams"} 2', 'uvr_pipeline_stage_duration_seconds_count{stage="ogm"} 1'])
+
+    def test_run_gauges_are_counted_from_the_registry(self):
+        run_registry.start_run('run1', 'Nov', 2026, {}, 'run1')
+        progress.start_run(2026, 'Dec', 'run2')
+        job_queue.enqueue(run_registry.start_run('run2', 'Dec', 2026, {}, 'run2'))
+        stale_run = run_registry.start_run('run3', 'Oct', 2026, {}, 'run3')
+        Run.objects.filter(pk=stale_run.pk).update(started_at=timezone.now() - datetime.timedelta(days=1))
+        self.assertEqual(self.get_samples('uvr_pipeline_runs_'), ['uvr_pipeline_runs_in_flight 1', 'uvr_pipeline_runs_queued 1'])
+
+    def test_broken_metrics_database_does_not_fail_requests(self):
+        metrics.close_connection()
+        os.makedirs(os.path.join(self.state_dir, 'metrics.sqlite3'))
+        with self.assertLogs('user_verification.metrics', 'ERROR'):
+            self.assertEqual(self.client.get('/user_verification/get_download_status/2026/Nov').status_code, 200)
+
+
+class ProgressTest(StateDirTestMixin, TestCase):
+    def get_progress(self, run_id, **params):
+        return self.client.get('/user_verification/get_run_progress/2026/Nov', {'run_id': run_id, 'timeout': 0, **params})
+
+    def stream_progress(self, run_id, **headers):
+        response = self.client.get('/user_verification/run_progress/2026/Nov', {'run_id': run_id}, **headers)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        return [json.loads(line[len('data: '):]) for line in lines if line.startswith('data: ')]
+
+    def test_runs_of_the_same_month_keep_their_events(self):
+        progress.start_run(2026, 'Nov', 'run1')
+        progress.record_event('run1', 'stage_started', stage='it_ams')
+        progress.start_run(2026, 'Nov', 'run2')
+        progress.record_event('run1', 'run_finished')
+        self.assertEqual([event['event'] for _, event in progress.read_events('run1')], ['run_started', 'stage_started', 'run_finished'])
+        self.assertEqual(progress.get_run_status(2026, 'Nov'), {'status': 'running', 'run_id': 'run2', 'stage': None, 'errors': []})
+
+    def test_long_poll_returns_the_events_after_offset(self):
+        progress.start_run(2026, 'Nov', 'run1')
+        first = self.get_progress('run1').json()
+        self.assertEqual([event['event'] for event in first['events']], ['run_started'])
+        self.assertEqual(self.get_progress('run1', offset=first['offset']).json(), {'events': [], 'offset': first['offset']})
+        progress.record_event('run1', 'stage_started', stage='ogm')
+        self.assertEqual([event['stage'] for event in self.get_progress('run1', offset=first['offset']).json()['events']], ['ogm'])
+        # without run_id, the month's latest run
+        self.assertEqual(len(self.client.get('/user_verification/get_run_progress/2026/Nov', {'timeout': 0}).json()['events']), 2)
+
+    def test_long_poll_waits_for_events_up_to_timeout(self):
+        progress.start_run(2026, 'Nov', 'run1')
+        offset = self.get_progress('run1').json()['offset']
+        start = time.monotonic()
+        self.assertEqual(self.get_progress('run1', offset=offset, timeout=0.5).json()['events'], [])
+        self.assertGreaterEqual(time.monotonic() - start, 0.5)
+
+    def test_invalid_progress_requests_are_rejected(self):
+        self.assertEqual(self.get_progress('run1', offset='start').status_code, 400)
+        self.assertEqual(self.get_progress('../run1').status_code, 400)
+        self.assertEqual(self.client.get('/user_verification/get_run_progress/2026/Nov').status_code, 404)
+        self.assertEqual(self.client.get('/user_verification/run_progress/2026/Nov').status_code, 404)
+
+    def test_stream_ends_when_the_run_finishes_or_fails(self):
+        for run_id, finished_event in [['run1', 'run_finished'], ['run2', 'run_failed']]:
+            progress.start_run(2026, 'Nov', run_id)
+            progress.record_event(run_id, 'stage_started', stage='it_ams')
+            progress.record_event(run_id, finished_event)
+            progress.record_event(run_id, 'stage_started', stage='ogm')
+            self.assertEqual([event['event'] for event in self.stream_progress(run_id)], ['run_started', 'stage_started', finished_event])
+        [offset, _] = progress.read_events('run1')[0]
+        self.assertEqual([event['event'] for event in self.stream_progress('run1', HTTP_LAST_EVENT_ID=str(offset))], ['stage_started', 'run_finished'])
+
+
+class JobQueueTest(StateDirTestMixin, TestCase):
+    state_settings = {'UVR_JOB_MAX_ATTEMPTS': 2}
+
+    def queue_run(self, run_id, month='Nov'):
+        progress.start_run(2026, month, run_id)
+        return job_queue.enqueue(run_registry.start_run(run_id, month, 2026, {}, run_id))
+
+    def expire_lease(self, job):
+        Job.objects.filter(pk=job.pk).update(lease_expires_at=run_registry.get_database_time(-1))
+
+    def test_job_is_claimed_by_one_worker_at_a_time(self):
+        queued_job = self.queue_run('run1')
+        self.assertEqual(queued_job.run.status, Run.QUEUED)
+        job = job_queue.claim_job('worker1')
+        self.assertEqual([job.pk, job.worker, job.attempts], [queued_job.pk, 'worker1', 1])
+        self.assertIsNone(job_queue.claim_job('worker2'))
+        self.assertTrue(job_queue.heartbeat(job, 'worker1'))
+
+    def test_job_of_dead_worker_is_retried_then_given_up(self):
+        self.queue_run('run1')
+        job = job_queue.claim_job('worker1')
+        self.expire_lease(job)
+        retried_job = job_queue.claim_job('worker2')
+        self.assertEqual([retried_job.worker, retried_job.attempts], ['worker2', 2])
+        self.assertFalse(job_queue.heartbeat(job, 'worker1'))
+        self.expire_lease(retried_job)
+        self.assertIsNone(job_queue.claim_job('worker3'))
+        retried_job.refresh_from_db()
+        self.assertEqual([retried_job.status, retried_job.run.status], [Job.FAILED, Run.FAILED])
+        self.assertEqual(progress.get_run_status(2026, 'Nov')['status'], 'failed')
+
+    def test_hosts_whose_clock_is_ahead_cannot_take_over_live_leases(self):
+        self.queue_run('run1')
+        job = job_queue.claim_job('worker1')
+        self.assertTrue(run_registry.lock_workspace('Dec', 2026, 'run2'))
+        self.assertTrue(account_index.lock_indexer('indexer1'))
+        # the leases expire by the database's clock, not by the clock of the host that checks them
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + datetime.timedelta(hours=1)):
+            self.assertIsNone(job_queue.claim_job('worker2'))
+            self.assertFalse(run_registry.lock_workspace('Dec', 2026, 'run3'))
+            self.assertFalse(account_index.lock_indexer('indexer2'))
+        self.assertTrue(job_queue.heartbeat(job, 'worker1'))
+
+    def test_runs_of_the_same_month_are_not_processed_at_the_same_time(self):
+        self.queue_run('run1')
+        self.queue_run('run2')
+        self.queue_run('run3', month='Dec')
+        self.assertEqual(job_queue.claim_job('worker1').run.run_id, 'run1')
+        self.assertEqual(job_queue.claim_job('worker2').run.run_id, 'run3')
+        self.assertIsNone(job_queue.claim_job('worker3'))
+
+    def test_run_that_died_is_not_reported_as_running(self):
+        progress.start_run(2026, 'Nov', 'run1')
+        run = run_registry.start_run('run1', 'Nov', 2026, {}, 'run1')
+        self.assertEqual(progress.get_run_status(2026, 'Nov')['status'], 'running')
+        # the registry knows the run ended even though run_failed was never recorded
+        run_registry.finish_run(run, Run.CANCELLED)
+        self.assertEqual(progress.get_run_status(2026, 'Nov')['status'], Run.CANCELLED)
+        progress.start_run(2026, 'Dec', 'run2')
+        with override_settings(UVR_RUN_TIMEOUT_SECONDS=-progress.STALE_RUN_GRACE_SECONDS - 1):
+            self.assertEqual(progress.get_run_status(2026, 'Dec')['status'], 'failed')
+
+
+class UploadTest(StateDirTestMixin, TestCase):
+    # uploads go to the month's workspace in media/, a year no one runs reports for keeps them apart
+    YEAR = '1999'
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(shutil.rmtree, pipeline.get_workspace_filepath('Nov', self.YEAR, create=False), ignore_errors=True)
+        self.addCleanup(lambda: os.path.exists(pipeline.get_output_filepath('Nov', self.YEAR)) and os.remove(pipeline.get_output_filepath('Nov', self.YEAR)))
+
+    def test_run_ids_that_are_not_plain_ids_are_rejected(self):
+        for run_id in ['../../db.sqlite3', 'Run1', 'a' * 65]:
+            response = self.client.post('/user_verification/run_reports', {'month': 'Nov', 'year': self.YEAR, 'run_id': run_id})
+            self.assertEqual(response.status_code, 400, run_id)
+        self.assertEqual(self.client.post('/user_verification/run_reports', {'month': '../Nov', 'year': self.YEAR}).status_code, 400)
+        self.assertFalse(Run.objects.exists())
+
+    def test_run_history_and_outputs_are_only_for_admins(self):
+        run = run_registry.start_run('run1', 'Nov', 2026, {'Lewin Accounts.xlsx': 'abc'}, 'run1')
+        output_filepath = os.path.join(self.state_dir, 'output.zip')
+        with open(output_filepath, 'wb') as f:
+            f.write(b'zip')
+        run_registry.finish_run(run, Run.FINISHED, output_filepath)
+        for path in ['/user_verification/get_run_history', '/user_verification/get_run_history/2026/Nov', '/user_verification/get_run_output/run1']:
+            self.assertEqual(self.client.get(path).status_code, 302, path)
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.assertEqual([run['run_id'] for run in self.client.get('/user_verification/get_run_history').json()['runs']], ['run1'])
+        self.assertEqual(b''.join(self.client.get('/user_verification/get_run_output/run1').streaming_content), b'zip')
+
+    def test_duplicate_run_id_returns_the_existing_run(self):
+        run_registry.start_run('run1', 'Nov', 2026, {}, 'run1')
+        response = self.client.post('/user_verification/run_reports', {'month': 'Nov', 'year': self.YEAR, 'run_id': 'run1'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([response.json()['run']['run_id'], response.json()['run']['year']], ['run1', 2026])
+
+    def upload(self, *filenames):
+        files = {f'file{index}': SimpleUploadedFile(filename, b'workbook') for index, filename in enumerate(filenames)}
+        return self.client.post('/user_verification/run_reports', {'month': 'Nov', 'year': self.YEAR, 'summary_only': '1', **files}).json()
+
+    def test_files_of_earlier_uploads_are_listed(self):
+        self.assertEqual(self.upload('RgnAll HSES Accounts.xlsx', 'Lewin Accounts.xlsx')['earlier_uploads'], [])
+        response = self.upload('Rgn0 OGM Accounts.xlsx')
+        self.assertEqual(response['earlier_uploads'], ['Lewin Accounts.xlsx', 'RgnAll HSES Accounts.xlsx'])
+        self.assertEqual([response['rgnAllFileUploaded'], response['ogmFileUploaded'], response['podFileUploaded']], [True, True, False])
+        self.assertEqual(self.upload('RgnAll HSES Accounts (1).xlsx')['earlier_uploads'], ['Lewin Accounts.xlsx', 'Rgn0 OGM Accounts.xlsx'])
+
+    def test_uploads_for_a_busy_month_are_rejected(self):
+        # another upload, or the run it started, has the workspace
+        self.assertTrue(run_registry.lock_workspace('Nov', self.YEAR, 'run1'))
+        files = {'file0': SimpleUploadedFile('Lewin Accounts.xlsx', b'workbook')}
+        for path in ['/user_verification/run_reports', f'/user_verification/run_reports?month=Nov&year={self.YEAR}&summary_only=1']:
+            response = self.client.post(path, {'month': 'Nov', 'year': self.YEAR, 'summary_only': '1', **files})
+            self.assertEqual(response.status_code, 409, path)
+        self.assertFalse(views.get_upload_context(pipeline.get_workspace_filepath('Nov', self.YEAR))['lewinFileUploaded'])
+        run_registry.unlock_workspace('Nov', self.YEAR, 'run1')
+        self.assertTrue(self.upload('Lewin Accounts.xlsx')['lewinFileUploaded'])
+        # a run waiting for a uvr_worker processes the workspace as it is then
+        progress.start_run(self.YEAR, 'Nov', 'run2')
+        job_queue.enqueue(run_registry.start_run('run2', 'Nov', self.YEAR, {}, 'run2'))
+        self.assertEqual(self.client.post('/user_verification/run_reports', {'month': 'Nov', 'year': self.YEAR, 'summary_only': '1'}).status_code, 409)
+
+    def test_lock_of_a_holder_that_died_expires(self):
+        with override_settings(UVR_RUN_TIMEOUT_SECONDS=-60):
+            self.assertTrue(run_registry.lock_workspace('Nov', self.YEAR, 'run1'))
+        self.assertTrue(run_registry.lock_workspace('Nov', self.YEAR, 'run2'))
+        self.assertFalse(run_registry.lock_workspace('Nov', self.YEAR, 'run3'))
+
+    def test_expired_workspaces_are_removed(self):
+        expired_filepath = pipeline.get_workspace_filepath('Oct', self.YEAR)
+        self.addCleanup(shutil.rmtree, expired_filepath, ignore_errors=True)
+        with open(os.path.join(expired_filepath, 'Lewin Accounts.xlsx'), 'w') as f:
+            f.write('workbook')
+        expired = time.time() - (settings.UVR_WORKSPACE_RETENTION_DAYS + 1) * 24 * 60 * 60
+        for path in [os.path.join(expired_filepath, 'Lewin Accounts.xlsx'), expired_filepath]:
+            os.utime(path, (expired, expired))
+        self.upload('Lewin Accounts.xlsx')
+        self.assertFalse(os.path.exists(expired_filepath))
+        self.assertTrue(os.path.isfile(os.path.join(pipeline.get_workspace_filepath('Nov', self.YEAR), 'Lewin Accounts.xlsx')))
+
+
+class StreamingIngestTest(StateDirTestMixin, TestCase):
+    MONITORING_UPLOADS = ['Danya User HSES Accounts.xlsx', 'Lewin Accounts.xlsx', 'Monitoring_Network_Users.xlsx']
+
+    state_settings = {'UVR_RUN_TIMEOUT_SECONDS': 60}
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(shutil.rmtree, pipeline.get_workspace_filepath('Nov', UploadTest.YEAR, create=False), ignore_errors=True)
+
+    def start_ingest(self, run_id):
+        # the monitoring stage is ready once its three files are uploaded, its "stage process" runs until it is stopped
+        uvr_filepath = pipeline.get_workspace_filepath('Nov', UploadTest.YEAR)
+        streaming_ingest = ingest.StreamingIngest(
+            'Nov', UploadTest.YEAR, run_id, uvr_filepath, views.get_upload_context(uvr_filepath), views.store_upload,
+            [sys.executable, '-c', 'import time; time.sleep(60)'], dict(os.environ)
+        )
+        for index, filename in enumerate(self.MONITORING_UPLOADS):
+            part_filepath = os.path.join(uvr_filepath, f'.upload_{index}.part')
+            with open(part_filepath, 'w') as part_file:
+                part_file.write('workbook')
+            streaming_ingest.add_upload(part_filepath, filename)
+        self.assertTrue(streaming_ingest.is_running())
+        return streaming_ingest
+
+    def test_stage_process_is_stopped_when_cancelled(self):
+        streaming_ingest = self.start_ingest('run1')
+        run_registry.request_cancellation('run1')
+        streaming_ingest.wait()
+        self.assertEqual(streaming_ingest.stopped.status, Run.CANCELLED)
+        self.assertFalse(streaming_ingest.is_running())
+        self.assertEqual(sorted(os.listdir(streaming_ingest.uvr_filepath)), self.MONITORING_UPLOADS)
+
+    def test_stage_process_is_stopped_at_the_deadline(self):
+        streaming_ingest = self.start_ingest('run1')
+        with override_settings(UVR_RUN_TIMEOUT_SECONDS=1):
+            streaming_ingest.wait()
+        self.assertEqual(streaming_ingest.stopped.status, Run.TIMED_OUT)
+        self.assertFalse(streaming_ingest.is_running())
+
+    def test_upload_of_cancelled_run_is_stopped(self):
+        run_registry.request_cancellation('run1')
+        files = {f'file{index}': SimpleUploadedFile(filename, b'workbook') for index, filename in enumerate(self.MONITORING_UPLOADS)}
+        response = self.client.post(f'/user_verification/run_reports?month=Nov&year={UploadTest.YEAR}&run_id=run1', files)
+        self.assertEqual([response.status_code, response.json()['run_status']], [409, Run.CANCELLED])
+        self.assertEqual(Run.objects.get(run_id='run1').status, Run.CANCELLED)
+        self.assertEqual([filename for filename in os.listdir(pipeline.get_workspace_filepath('Nov', UploadTest.YEAR)) if filename.endswith('.part')], [])
+
+    def test_upload_is_cancelled_before_its_run_starts(self):
+        run_registry.start_ingest('run1')
+        response = self.client.post('/user_verification/cancel_run/run1')
+        self.assertEqual([response.status_code, response.json()['status']], [202, 'cancelling'])
+        self.assertTrue(run_registry.is_cancellation_requested('run1'))
+        run_registry.finish_ingest('run1')
+        self.assertFalse(run_registry.is_cancellation_requested('run1'))
+        self.assertEqual(self.client.post('/user_verification/cancel_run/run1').status_code, 404)
+
+    def test_streamed_upload_needs_the_csrf_header(self):
+        client = Client(enforce_csrf_checks=True)
+        files = {'file0': SimpleUploadedFile('Lewin Accounts.xlsx', b'workbook')}
+        path = f'/user_verification/run_reports?month=Nov&year={UploadTest.YEAR}&summary_only=1'
+        self.assertEqual(client.post(path, files).status_code, 403)
+        self.assertFalse(os.path.exists(os.path.join(pipeline.get_workspace_filepath('Nov', UploadTest.YEAR), 'Lewin Accounts.xlsx')))
+        client.get('/user_verification/')
+        csrf_token = client.cookies['csrftoken'].value
+        response = client.post(path, files, HTTP_X_CSRFTOKEN=csrf_token)
+        self.assertEqual([response.status_code, response.json()['lewinFileUploaded']], [200, True])
+
+
+class AccountIndexTest(StateDirTestMixin, TestCase):
+    def test_finished_runs_are_indexed(self):
+        with tempfile.TemporaryDirectory() as input_folder:
+            generate_input_files(input_folder, number_of_accounts=200, seed=7)
+            output = run_report_script(input_folder, 'pandas')
+            output_filepath = os.path.join(input_folder, 'output.zip')
+            pipeline.archive_reports(os.path.join(input_folder, 'processed_files'), output_filepath)
+            run_registry.finish_run(run_registry.start_run('run1', 'Nov', 2026, {}, 'run1'), Run.FINISHED, output_filepath)
+            call_command('uvr_index_accounts', '--run-id', 'run1', stdout=io.StringIO())
+            self.assertEqual(Run.objects.get(run_id='run1').index_status, Run.INDEXED)
+            # only the reports that changed are indexed again
+            self.assertEqual(account_index.index_output(output_filepath, 'Nov', 2026), 0)
+            self.assertEqual(account_index.index_output(output_filepath, 'Oct', 2026), len(output))
+        [header, row] = output['IT-AMS Access_Nov-2026.xlsx']['IT-AMS Roles'][:2]
+        [email, first_name, last_name] = [row[header.index(column)] for column in ['Email', 'First Name', 'Last Name']]
+        self.assertEqual(self.client.get('/user_verification/lookup_account', {'email': email}).status_code, 302)
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        accounts = self.client.get('/user_verification/lookup_account', {'email': f' {email.upper()}'}).json()['accounts']
+        it_ams_accounts = [account for account in accounts if account['report'] == 'IT-AMS Access_Nov-2026.xlsx']
+        self.assertEqual([[account['month'], account['run_id']] for account in it_ams_accounts], [['Nov', 'run1'], ['Oct', None]])
+        self.assertEqual(it_ams_accounts[0]['it_ams_access'], row[header.index('IT-AMS Access')] or '')
+        self.assertEqual(accounts[0]['month'], 'Nov')
+        for name in [first_name, f'{first_name} {last_name[:2]}'.lower(), last_name]:
+            accounts = self.client.get('/user_verification/lookup_account', {'name': name, 'limit': 500}).json()['accounts']
+            self.assertIn(email, [account['email'] for account in accounts], name)
+        self.assertEqual(self.client.get('/user_verification/lookup_account').status_code, 400)
+        self.assertEqual(self.client.get('/user_verification/lookup_account', {'name': last_name[:2]}).status_code, 400)
+        with self.assertRaises(CommandError):
+            call_command('uvr_index_accounts', '--run-id', 'run2')
+
+    def test_one_indexer_takes_the_queued_runs_and_records_them(self):
+        output_filepath = os.path.join(self.state_dir, 'output.zip')
+        with ZipFile(output_filepath, 'w') as archive:
+            wb = Workbook()
+            wb.active.append(['First Name', 'Last Name', 'Email'])
+            wb.active.append(['Ada', 'Lovelace', 'ada@example.com'])
+            report_file = io.BytesIO()
+            wb.save(report_file)
+            archive.writestr('IT-AMS Access_Nov-2026.xlsx', report_file.getvalue())
+        runs = [run_registry.start_run(run_id, 'Nov', 2026, {}, run_id) for run_id in ['run1', 'run2']]
+        for run in runs:
+            run_registry.finish_run(run, Run.FINISHED, output_filepath)
+        os.remove(Run.objects.get(run_id='run2').output_path) # evicted
+        # while an indexer runs, finished runs are only queued for it
+        self.assertTrue(account_index.lock_indexer('other'))
+        for run in runs:
+            pipeline.start_account_indexing(run)
+        self.assertEqual(account_index.index_pending_runs('indexer'), 0)
+        self.assertEqual([run.index_status for run in Run.objects.order_by('id')], [Run.INDEX_PENDING, Run.INDEX_PENDING])
+        # a run left in indexing by an indexer that died is indexed again once its lock expired
+        Run.objects.filter(run_id='run1').update(index_status=Run.INDEXING)
+        AccountIndexerLock.objects.update(expires_at=run_registry.get_database_time(-1))
+        self.assertFalse(account_index.is_indexer_running())
+        self.assertEqual(account_index.index_pending_runs('indexer'), 2)
+        [run1, run2] = [run_registry.serialize_run(run) for run in Run.objects.order_by('id')]
+        self.assertEqual([run1['index_status'], run1['index_error']], [Run.INDEXED, ''])
+        self.assertEqual(run2['index_status'], Run.INDEX_FAILED)
+        self.assertIn('removed', run2['index_error'])
+        self.assertEqual(AccountIndexerLock.objects.count(), 0)
+        self.assertEqual(list(IndexedAccount.objects.values_list('email', flat=True)), ['ada@example.com'])
+
+
+class RunLimitsTest(StateDirTestMixin, SimpleTestCase):
+    state_settings = {'UVR_RUN_TIMEOUT_SECONDS': 2}
+
+    def run_slow_script(self, run_id):
+        with self.assertRaises(pipeline.RunStopped) as stopped:
+            pipeline.run_report_script([sys.executable, '-c', 'import time; time.sleep(60)'], os.environ, run_id)
+        return stopped.exception.status
+
+    def test_run_is_stopped_at_its_deadline(self):
+        self.assertEqual(self.run_slow_script('run1'), Run.TIMED_OUT)
+
+    def test_run_is_stopped_when_cancelled(self):
+        run_registry.request_cancellation('run1')
+        self.assertEqual(self.run_slow_script('run1'), Run.CANCELLED)
+
+    @unittest.skipIf(pipeline.resource is None, 'runs are not resource limited on Windows')
+    @override_settings(UVR_RUN_CPU_SECONDS=30, UVR_RUN_MEMORY_BYTES=2 * 1024 * 1024 * 1024)
+    def test_script_starts_with_its_limits(self):
+        process = pipeline.start_report_script(
+            [sys.executable, '-c', 'import sys, resource; print(resource.getrlimit(resource.RLIMIT_CPU)[0], resource.getrlimit(resource.RLIMIT_DATA)[0], sys.argv[1])', 'argument'],
+            os.environ, subprocess.PIPE
+        )
+        [output, _] = process.communicate()
+        self.assertEqual(output.split(), [b'30', str(2 * 1024 * 1024 * 1024).encode(), b'argument'])
@@ -6,5 +6,14 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('run_reports', views.run_reports, name='run_reports'),
     path('get_download_status/<int:year>/<str:month>', views.get_download_status, name='get_download_status'),
-    path('get_processed_files/<int:year>/<str:month>', views.get_processed_user_verification_files, name='get_processed_files')
+    path('get_processed_files/<int:year>/<str:month>', views.get_processed_user_verification_files, name='get_processed_files'),
+    path('get_summary/<int:year>/<str:month>', views.get_summary, name='get_summary'),
+    path('run_progress/<int:year>/<str:month>', views.run_progress, name='run_progress'),
+    path('get_run_progress/<int:year>/<str:month>', views.get_run_progress, name='get_run_progress'),
+    path('get_run_history', views.get_run_history, name='get_run_history'),
+    path('get_run_history/<int:year>/<str:month>', views.get_run_history, name='get_run_history'),
+    path('lookup_account', views.lookup_account, name='lookup_account'),
+    path('cancel_run/<slug:run_id>', views.cancel_run, name='cancel_run'),
+    path('get_run_output/<slug:run_id>', views.get_run_output, name='get_run_output'),
+    path('get_run_profile/<slug:run_id>', views.get_run_profile, name='get_run_profile')
 ]
\ No newline at end of file
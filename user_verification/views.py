@@ -1,23 +1,344 @@
 import os
 import re
-import sys
-import shutil
+import copy
+import json
+import time
+import uuid
 import subprocess
 
 from zipfile import ZipFile
 from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse, Http404
+from django.http import HttpResponse, JsonResponse, Http404, StreamingHttpResponse, FileResponse, QueryDict
 from django.template import loader
-from django.views.decorators.csrf import ensure_csrf_cookie
+from django.conf import settings
+from django.db import IntegrityError
+from django.contrib.admin.views.decorators import staff_member_required
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt, csrf_protect
+from django.views.decorators.http import require_POST
+
+from . import account_index, ingest, job_queue, metrics, pipeline, progress, run_cache, run_registry
+from .models import Run
+
+# how long a single progress stream or long-poll request may hold a worker before the client has to reconnect
+PROGRESS_STREAM_TIMEOUT = 10 * 60
+PROGRESS_LONG_POLL_TIMEOUT = 25
 
 @ensure_csrf_cookie 
 def index(request):
-    context = {}
+    context = {'progress_stream': settings.UVR_PROGRESS_STREAM}
     return render(request, 'user_verification/index.html', context)
 
 
+@csrf_exempt
 def run_reports(request):
-    file_dict = request.FILES
+    # with month, year (and run_id) in the query string the files are ingested while the request body streams in,
+    # see ingest.py. The upload handlers have to be swapped before anything reads request.POST, so the csrf check
+    # runs on process_uploads instead of through the middleware
+    streaming_ingest = None
+    if request.method == 'POST' and 'month' in request.GET and 'year' in request.GET and is_csrf_header_valid(request):
+        run_parameters = get_run_parameters(request.GET)
+        if isinstance(run_parameters, JsonResponse):
+            return run_parameters
+        [month, year, run_id] = run_parameters
+        busy_response = lock_workspace(month, year, run_id)
+        if busy_response is not None:
+            return busy_response
+        try:
+            uvr_filepath = pipeline.get_workspace_filepath(month, year)
+            stored_uploads = get_stored_uploads(uvr_filepath)
+            command = env = None
+            if request.GET.get('summary_only') != '1':
+                progress_filepath = progress.start_run(year, month, run_id)
+                env = pipeline.get_report_env(progress_filepath)
+                # with the job queue on, the web process only stores the files and the stages all run in a uvr_worker
+                if not settings.UVR_JOB_QUEUE:
+                    command = pipeline.get_report_command(uvr_filepath, month, year)
+            streaming_ingest = ingest.StreamingIngest(
+                month, year, run_id, uvr_filepath, get_upload_context(uvr_filepath), store_upload, command, env
+            )
+            request.upload_handlers = [ingest.StreamingUploadHandler(request, streaming_ingest)]
+            run_registry.start_ingest(run_id)
+            return process_uploads(request, streaming_ingest, stored_uploads)
+        finally:
+            run_registry.finish_ingest(run_id)
+            run_registry.unlock_workspace(month, year, run_id)
+    return process_uploads(request)
+
+
+@csrf_protect
+def process_uploads(request, streaming_ingest=None, stored_uploads=None):
+    if streaming_ingest is not None:
+        request.POST # reads the body through StreamingUploadHandler
+        streaming_ingest.wait()
+        [month, year, run_id] = [streaming_ingest.month, streaming_ingest.year, streaming_ingest.run_id]
+        uvr_filepath = streaming_ingest.uvr_filepath
+        context = streaming_ingest.context
+        if streaming_ingest.stopped is not None:
+            # cancelled or past its deadline while the files were uploaded
+            stopped = streaming_ingest.stopped
+            progress.record_event(run_id, 'run_failed', status=stopped.status, error=str(stopped))
+            run = run_registry.start_run(run_id, month, year, run_cache.get_input_hashes(uvr_filepath), '')
+            run_registry.finish_run(run, stopped.status, events=[event for _, event in progress.read_events(run_id)])
+            return JsonResponse({'error': str(stopped), 'run_status': stopped.status}, status=409)
+        return run_uploads(request, month, year, run_id, uvr_filepath, context, stored_uploads, streaming_ingest)
+    run_parameters = get_run_parameters(request.POST)
+    if isinstance(run_parameters, JsonResponse):
+        return run_parameters
+    [month, year, run_id] = run_parameters
+    busy_response = lock_workspace(month, year, run_id)
+    if busy_response is not None:
+        return busy_response
+    try:
+        uvr_filepath = pipeline.get_workspace_filepath(month, year)
+        stored_uploads = get_stored_uploads(uvr_filepath)
+        context = get_upload_context(uvr_filepath)
+        for file in request.FILES.values():
+            context = store_upload(context, uvr_filepath, file, os.path.basename(file.name))
+        return run_uploads(request, month, year, run_id, uvr_filepath, context, stored_uploads)
+    finally:
+        run_registry.unlock_workspace(month, year, run_id)
+
+
+def lock_workspace(month, year, run_id):
+    # the error response while another upload or run has the month's workspace, see run_registry.lock_workspace
+    if not run_registry.lock_workspace(month, year, run_id):
+        return JsonResponse({'error': f'Files for {month} {year} are being uploaded or processed. Try again once that run has finished.'}, status=409)
+    if job_queue.has_active_job(month, year):
+        run_registry.unlock_workspace(month, year, run_id)
+        return JsonResponse({'error': f'A run for {month} {year} is queued or running. Try again once it has finished, or cancel it.'}, status=409)
+    return None
+
+
+def run_uploads(request, month, year, run_id, uvr_filepath, context, stored_uploads, streaming_ingest=None):
+    # runs the reports once the files of every report are in the month's workspace
+    pipeline.remove_expired_workspaces(settings.UVR_WORKSPACE_RETENTION_DAYS)
+    progress.remove_expired_progress_files(settings.UVR_WORKSPACE_RETENTION_DAYS)
+    context = get_required_uploads(context)
+    files_uploaded = all(context.values())
+    # the month's files count towards the required ones whoever uploaded them, the page lists the ones this upload
+    # didn't replace so they are not used unnoticed
+    context['earlier_uploads'] = get_earlier_uploads(uvr_filepath, stored_uploads)
+    # only admins (logged in through /admin) can have a run profiled, it is several times slower
+    profile = request.user.is_staff and (request.GET.get('profile') or request.POST.get('profile')) == '1'
+    if (request.GET.get('summary_only') or request.POST.get('summary_only')) == '1':
+        # only store the files, get_summary previews the reports and a later run_reports request without files
+        # generates them from the stored files
+        return JsonResponse(context)
+    if files_uploaded:
+        if streaming_ingest is None:
+            progress_filepath = progress.start_run(year, month, run_id)
+        else:
+            progress_filepath = progress.get_progress_filepath(run_id)
+        output_filepath = pipeline.get_output_filepath(month, year)
+        input_hashes = run_cache.get_input_hashes(uvr_filepath)
+        fingerprint = run_cache.get_input_fingerprint(input_hashes, month, year)
+        try:
+            run = run_registry.start_run(run_id, month, year, input_hashes, fingerprint)
+        except IntegrityError:
+            # the same run_id submitted twice at the same moment
+            return get_duplicate_run_response(Run.objects.get(run_id=run_id))
+        if not profile and run_cache.fetch_cached_output(fingerprint, output_filepath):
+            # the same inputs were already processed for this month, reuse that output instead of rerunning the reports
+            progress.record_event(run_id, 'run_finished', cached=True)
+            run_registry.finish_run(run, Run.CACHED, output_filepath)
+            pipeline.start_account_indexing(run)
+            return JsonResponse(context)
+        if settings.UVR_JOB_QUEUE:
+            # a uvr_worker process runs the reports, the client follows the run through its progress events
+            job_queue.enqueue(run, profile)
+            return JsonResponse(context, status=202)
+        try:
+            pipeline.run_pipeline(run, uvr_filepath, progress_filepath, profile)
+        except pipeline.RunStopped as e:
+            return JsonResponse({'error': str(e), 'run_status': e.status}, status=409)
+    return JsonResponse(context)
+
+
+def get_run_parameters(params):
+    # [month, year, run_id] of an upload, or the error response. All three end up in file paths
+    month = params.get('month', '')
+    year = params.get('year', '')
+    run_id = params.get('run_id') or uuid.uuid4().hex
+    if not re.fullmatch(r'\w{1,16}', month) or not re.fullmatch(r'\d{4}', year):
+        return JsonResponse({'error': 'Select the month and year of the reports.'}, status=400)
+    if not run_registry.is_valid_run_id(run_id):
+        return JsonResponse({'error': 'run_id must be 1 to 64 lowercase letters and digits.'}, status=400)
+    run = Run.objects.filter(run_id=run_id).first()
+    if run is not None:
+        return get_duplicate_run_response(run)
+    return [month, year, run_id]
+
+
+def get_duplicate_run_response(run):
+    return JsonResponse({'error': f'Run {run.run_id} was already submitted.', 'run': run_registry.serialize_run(run)}, status=409)
+
+
+def get_download_status(request, year, month):
+    json = {
+        'download_available': os.path.isfile(pipeline.get_output_filepath(month, year)),
+        'run_status': progress.get_run_status(year, month)
+    }
+    return JsonResponse(json)
+
+
+def get_summary(request, year, month):
+    # preview of the reports the files uploaded for the month would produce, in a second or two instead of minutes
+    uvr_filepath = pipeline.get_workspace_filepath(month, year, create=False)
+    if not os.path.isdir(uvr_filepath) or not any(get_upload_context(uvr_filepath).values()):
+        raise Http404(f'No files were uploaded for {month} {year}.')
+    try:
+        summary = pipeline.summarize_reports(uvr_filepath, month, year)
+    except subprocess.TimeoutExpired:
+        return JsonResponse({'error': f'The summary took longer than {pipeline.SUMMARY_TIMEOUT} seconds.'}, status=504)
+    except subprocess.CalledProcessError as e:
+        # e.g. a corrupt workbook, the last line of the traceback names the problem
+        error = e.stderr.decode('utf-8', 'replace').strip().splitlines()
+        return JsonResponse({'error': error[-1] if error else f'Report script exited with status {e.returncode}'}, status=422)
+    summary['files'] = get_required_uploads(get_upload_context(uvr_filepath))
+    return JsonResponse(summary)
+
+
+def get_progress_run_id(request, year, month):
+    # ?run_id=, or the month's latest run. The run id names the run's progress file
+    run_id = request.GET.get('run_id') or progress.get_latest_run_id(year, month)
+    if run_id is None:
+        return JsonResponse({'error': f'No run found for {month} {year}.'}, status=404)
+    if not run_registry.is_valid_run_id(run_id):
+        return JsonResponse({'error': 'run_id must be 1 to 64 lowercase letters and digits.'}, status=400)
+    return run_id
+
+
+def run_progress(request, year, month):
+    # server-sent events stream of the progress of run `run_id`, ends once the run finishes or fails
+    run_id = get_progress_run_id(request, year, month)
+    if isinstance(run_id, JsonResponse):
+        return run_id
+    try:
+        offset = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        offset = 0
+
+    def stream_events(offset):
+        yield 'retry: 2000\n\n'
+        deadline = time.monotonic() + PROGRESS_STREAM_TIMEOUT
+        while time.monotonic() < deadline:
+            events = progress.wait_for_events(run_id, offset, timeout=15)
+            if not events:
+                yield ': keep-alive\n\n'
+                continue
+            for offset, event in events:
+                yield f'id: {offset}\nevent: {event["event"]}\ndata: {json.dumps(event)}\n\n'
+                if event['event'] in progress.RUN_FINISHED_EVENTS:
+                    return
+
+    response = StreamingHttpResponse(stream_events(offset), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # stop nginx from buffering the stream
+    return response
+
+
+def get_run_progress(request, year, month):
+    # returns as soon as there are events after `offset`, waiting at most `timeout` seconds for them. The page polls
+    # with timeout=0 so it never holds a sync worker between events, see UVR_PROGRESS_STREAM
+    run_id = get_progress_run_id(request, year, month)
+    if isinstance(run_id, JsonResponse):
+        return run_id
+    try:
+        offset = int(request.GET.get('offset', 0))
+        timeout = min(float(request.GET.get('timeout', PROGRESS_LONG_POLL_TIMEOUT)), PROGRESS_LONG_POLL_TIMEOUT)
+    except ValueError:
+        return JsonResponse({'error': 'offset and timeout must be numbers'}, status=400)
+    events = progress.wait_for_events(run_id, offset, timeout=max(timeout, 0))
+    return JsonResponse({
+        'events': [event for _, event in events],
+        'offset': events[-1][0] if events else offset
+    })
+
+
+@staff_member_required
+def get_run_history(request, year=None, month=None):
+    # every run with its input hashes and archived output, so only for admins like the outputs themselves
+    runs = Run.objects.all()
+    if year is not None:
+        runs = runs.filter(year=year, month=month)
+    try:
+        limit = min(int(request.GET.get('limit', 50)), 500)
+    except ValueError:
+        limit = 50
+    return JsonResponse({'runs': [run_registry.serialize_run(run) for run in runs[:limit]]})
+
+
+@staff_member_required
+def lookup_account(request):
+    # the months, reports, regions, roles and IT-AMS access of an account (?email=) or of the accounts whose first or
+    # last name starts with ?name=, from the account index of every month's reports. Only for admins, and a name
+    # prefix has to be long enough that the accounts can't be listed a letter at a time
+    email = request.GET.get('email', '').strip()
+    name = request.GET.get('name', '').strip()
+    if not email and not name:
+        return JsonResponse({'error': 'Enter an email address or the start of a name.'}, status=400)
+    if not email and len(name) < account_index.NAME_PREFIX_MIN_LENGTH:
+        return JsonResponse({'error': f'Enter at least {account_index.NAME_PREFIX_MIN_LENGTH} letters of the name.'}, status=400)
+    try:
+        limit = min(int(request.GET.get('limit', 100)), 500)
+    except ValueError:
+        limit = 100
+    return JsonResponse({'accounts': [account_index.serialize_account(account) for account in account_index.lookup_accounts(email, name, limit)]})
+
+
+@staff_member_required
+def get_run_output(request, run_id):
+    run = Run.objects.filter(run_id=run_id).exclude(output_path='').first()
+    if run is None:
+        raise Http404(f'No archived output found for run {run_id}. It may have been removed to free up disk space.')
+    return FileResponse(open(run.output_path, 'rb'), as_attachment=True, filename=f'{run.month}_{run.year}_UVR_Output_{run.run_id}.zip')
+
+
+@staff_member_required
+def get_run_profile(request, run_id):
+    profile_filepath = run_registry.get_profile_filepath(run_id)
+    if not os.path.isfile(profile_filepath):
+        raise Http404(f'No profile found for run {run_id}. Runs are only profiled when an admin starts them with profile=1.')
+    return FileResponse(open(profile_filepath, 'rb'), as_attachment=True, filename=f'UVR_Profile_{run_id}.zip')
+
+
+@require_POST
+def cancel_run(request, run_id):
+    # stops a queued or running run, wherever it runs. The stages it finished are kept for the next run of the month
+    run = Run.objects.filter(run_id=run_id).first()
+    if run is None and run_registry.is_ingesting(run_id):
+        # its files are still being uploaded, StreamingIngest stops the stages it started and the upload
+        run_registry.request_cancellation(run_id)
+        return JsonResponse({'run_id': run_id, 'status': 'cancelling'}, status=202)
+    if run is None:
+        raise Http404(f'No run {run_id} found.')
+    if run.status not in [Run.QUEUED, Run.RUNNING]:
+        return JsonResponse({'run_id': run_id, 'status': run.status, 'error': f'The run already {run.status}.'}, status=409)
+    if job_queue.cancel_queued_job(run):
+        return JsonResponse({'run_id': run_id, 'status': Run.CANCELLED})
+    run_registry.request_cancellation(run_id)
+    return JsonResponse({'run_id': run_id, 'status': 'cancelling'}, status=202)
+
+
+def get_metrics(request):
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4')
+
+
+def get_processed_user_verification_files(request, year, month):
+    try:
+        with open(os.path.join('media', 'downloadable_resources', f'{month}_{year}_UVR_Output.zip'), 'rb') as uv_files:
+            response = HttpResponse(uv_files, headers={
+                'Content-Type': 'application/zip',
+                'Content-Disposition': f'attachment; filename="{month}_{year}_UVR_Output.zip"'
+            })
+    except FileNotFoundError:
+        raise Http404(f'{month} {year} user verification reports not found. Make sure reports were run for the corresponding month.')
+    return response
+
+
+# Helper functions
+def get_upload_context(uvr_filepath):
     context = {
         'rgnAllFileUploaded': False,
         'ogmFileUploaded': False,
@@ -40,66 +361,76 @@ def run_reports(request):
         'rgn11FileUploaded': False,
         'rgn12FileUploaded': False
     }
-    uvr_filepath = os.path.join('media', 'user_verification_files')
-    if os.path.isdir(uvr_filepath):
-        shutil.rmtree(uvr_filepath)
-        os.makedirs(uvr_filepath)
+    for filename in os.listdir(uvr_filepath):
+        if os.path.isfile(os.path.join(uvr_filepath, filename)):
+            [context, _] = check_upload(context, filename)
+    return context
+
+
+def get_required_uploads(context):
+    # with UVR_REGIONAL_FROM_RGNALL the regional reports are derived from RgnAll, the regional files are optional and
+    # only listed once they are uploaded
+    if not settings.UVR_REGIONAL_FROM_RGNALL:
+        return context
+    return {upload: uploaded for upload, uploaded in context.items() if uploaded or upload not in ingest.REGIONAL_UPLOADS}
+
+
+def store_upload(context, uvr_filepath, upload, filename):
+    # upload is an uploaded file, or the path of a file that StreamingUploadHandler already wrote to the workspace
+    if filename.endswith('.zip'):
+        with ZipFile(upload) as myzip:
+            for zipinfo in myzip.infolist():
+                zipinfo.filename = os.path.basename(zipinfo.filename)
+                [context, is_valid_file] = check_upload(context, zipinfo.filename)
+                if is_valid_file:
+                    remove_replaced_upload(uvr_filepath, zipinfo.filename)
+                    myzip.extract(zipinfo, uvr_filepath)
     else:
-        os.makedirs(uvr_filepath)
-
-    for file in file_dict.values():
-        if file.name.endswith('.zip'):
-            with ZipFile(file) as myzip:
-                for zipinfo in myzip.infolist():
-                    zipinfo.filename = os.path.basename(zipinfo.filename)
-                    [context, is_valid_file] = check_upload(context, zipinfo.filename)
-                    if is_valid_file:
-                        myzip.extract(zipinfo, uvr_filepath)
-        else:
-            [context, is_valid_file] = check_upload(context, file.name)
-            if is_valid_file:
-                with open(os.path.join(uvr_filepath, os.path.basename(file.name)), 'wb+') as destination:
-                    for chunk in file.chunks():
+        [context, is_valid_file] = check_upload(context, filename)
+        if is_valid_file:
+            remove_replaced_upload(uvr_filepath, filename)
+            if isinstance(upload, str):
+                os.replace(upload, os.path.join(uvr_filepath, filename))
+            else:
+                with open(os.path.join(uvr_filepath, filename), 'wb+') as destination:
+                    for chunk in upload.chunks():
                         destination.write(chunk)
-    if all(context.values()):
-        month = request.POST['month']
-        year = request.POST['year']
-        python_executable = sys.executable
-        if 'uwsgi' in sys.executable:
-            with open('hses_automation_app_uwsgi.ini', 'r') as conf:
-                for line in conf.readlines():
-                    if re.search(r'home\s*=', line):
-                        python_executable = os.path.join(line.replace('home', '', 1).replace('=', '').strip(), 'bin', 'python')
-        log = subprocess.check_output([python_executable, os.path.join('scripts', 'auto_user_verif.py'), uvr_filepath, month, year])
-        print('User Verification Log:')
-        print(log.decode('utf-8'))
-        shutil.make_archive(os.path.join('media', 'downloadable_resources', f'{month}_{year}_UVR_Output'), 'zip', os.path.join(uvr_filepath, 'processed_files'))
-    return JsonResponse(context)
+    return context
 
 
-def get_download_status(request, year, month):
-    json = {}
-    try:
-        with open(os.path.join('media', 'downloadable_resources', f'{month}_{year}_UVR_Output.zip'), 'rb') as uv_files:
-            json['download_available'] = True
-    except FileNotFoundError:
-        json['download_available'] = False
-    return JsonResponse(json)
+def is_csrf_header_valid(request):
+    # process_uploads does the complete csrf check once the body is read, this only keeps requests without a valid
+    # X-CSRFToken header from storing or processing anything while it streams in, they are read without streaming.
+    # The middleware's own check runs on a copy with an empty POST, so it only looks at the header and doesn't read the body
+    check_request = copy.copy(request)
+    check_request.POST = QueryDict()
+    return CsrfViewMiddleware(lambda request: None).process_view(check_request, None, (), {}) is None
 
 
-def get_processed_user_verification_files(request, year, month):
-    try:
-        with open(os.path.join('media', 'downloadable_resources', f'{month}_{year}_UVR_Output.zip'), 'rb') as uv_files:
-            response = HttpResponse(uv_files, headers={
-                'Content-Type': 'application/zip',
-                'Content-Disposition': f'attachment; filename="{month}_{year}_UVR_Output.zip"'
-            })
-    except FileNotFoundError:
-        raise Http404(f'{month} {year} user verification reports not found. Make sure reports were run for the corresponding month.')
-    return response
+def get_stored_uploads(uvr_filepath):
+    # {filename: modification time} of the files in the month's workspace
+    stored_uploads = {}
+    for filename in os.listdir(uvr_filepath):
+        filepath = os.path.join(uvr_filepath, filename)
+        if not filename.startswith('.') and os.path.isfile(filepath):
+            stored_uploads[filename] = os.stat(filepath).st_mtime_ns
+    return stored_uploads
+
+
+def get_earlier_uploads(uvr_filepath, stored_uploads):
+    # the stored files an upload left as they were
+    return sorted(filename for filename, modified in get_stored_uploads(uvr_filepath).items() if stored_uploads.get(filename) == modified)
+
+
+def remove_replaced_upload(uvr_filepath, filename):
+    # e.g. an earlier "Rgn05 HSES Accounts.xlsx" when "Rgn05 HSES Accounts (1).xlsx" is uploaded
+    [uploaded_kind, _] = check_upload({}, filename)
+    for existing_filename in os.listdir(uvr_filepath):
+        existing_filepath = os.path.join(uvr_filepath, existing_filename)
+        if os.path.isfile(existing_filepath) and check_upload({}, existing_filename)[0] == uploaded_kind:
+            os.remove(existing_filepath)
 
 
-# Helper functions
 def check_upload(context, filename):
     is_uvr_file = True
     if re.search('RgnAll HSES Accounts.*\.xlsx', filename):
@@ -28,7 +28,7 @@ module.exports = {
           {
             loader: 'file-loader',
             options: {
-              name: 'images/[name].[ext]',
+              name: 'images/[name].[contenthash:12].[ext]',
             }
           },
         ],